@@ -10,8 +10,11 @@ from .keyboards import barber_map_keyboard, location_request_keyboard
 from app.basic.keyboards import back_keyboard
 from app.states import ChangeLocation, EditAddress
 from app.client.utils import get_region_city_multilang
+from app.client.barber_directory import sync_barber_directory
+from app.identity import invalidate_identity
 
 import os
+from app.user_session import set_last_action
 
 barber_location = Router()
 
@@ -40,7 +43,7 @@ async def get_location(message: Message, state: FSMContext):
             )
         ).scalar_one_or_none()
 
-    await redis_pool.set(f"user:{message.from_user.id}:last_action", "barber_location")
+    await set_last_action(redis_pool, message.from_user.id, "barber_location")
 
     if barber and barber.latitude and barber.longitude:
         await message.answer_venue(
@@ -69,7 +72,7 @@ async def ask_for_location(message: Message, state: FSMContext):
         ).scalar_one_or_none()
 
     lang = (user.lang if user else "uz")
-    await redis_pool.set(f"user:{message.from_user.id}:last_action", "barber_location_change")
+    await set_last_action(redis_pool, message.from_user.id, "barber_location_change")
 
     text = "✏️ Joylashuvni o'zgartirish" if lang == "uz" else "✏️ Изменить локацию"
     await message.answer(text, reply_markup=location_request_keyboard(lang))
@@ -97,18 +100,24 @@ async def save_barber_location(message: Message, state: FSMContext):
         ).scalar_one_or_none()
 
         # 🔹 call the new Yandex-backed function
-        country, region, city = await get_region_city_multilang(session, latitude, longitude)
+        country, region, city = await get_region_city_multilang(
+            session, latitude, longitude, redis=message.bot.redis
+        )
 
-        # Save on user
-        user.country_id = country.id
-        user.region_id = region.id
-        user.city_id = city.id
+        # Save on user (unresolved point → keep the previous city, coordinates are still saved)
+        old_city_id = user.city_id
+        if country and region and city:
+            user.country_id = country.id
+            user.region_id = region.id
+            user.city_id = city.id
 
         # Save on barber
         barber.latitude = latitude
         barber.longitude = longitude
 
         await session.commit()
+        await invalidate_identity(message.bot.redis, message.from_user.id)
+        await sync_barber_directory(session, message.bot.redis, user_id=user.id, old_city_id=old_city_id)
 
         await message.answer(
             "✅ Joylashuv saqlandi!" if user.lang == "uz" else "✅ Локация сохранена!",
@@ -15,7 +15,9 @@ from .security import verify_barber_token
 from aiogram.filters import CommandStart
 from aiogram.filters.command import CommandObject
 from app.client.keyboards import barber_menu
-from app.basic.task_sysnc_user import sync_client_to_django
+from app.outbox.sync import enqueue_client_sync
+from app.identity import invalidate_identity
+from app.user_session import set_last_action
 
 barber_qr_route = Router()
 
@@ -102,6 +104,7 @@ async def start_from_qr(message: Message, command: CommandObject):
         username=from_user.username,
         lang_code=from_user.language_code,
     )
+    await invalidate_identity(redis_pool, from_user.id)
 
     # Load target barber
     async with AsyncSessionLocal() as session:
@@ -121,10 +124,8 @@ async def start_from_qr(message: Message, command: CommandObject):
         barber_surname = barber.user.surname if barber.user else ""
         barber_score = barber.score or "—"
 
-    # Optional: breadcrumb in Redis
-    if hasattr(message.bot, "redis") and message.bot.redis:
-        await message.bot.redis.set(f"user:{user.telegram_id}:last_action", "barber_profile")
-    await redis_pool.set(f"user:{user.telegram_id}:last_action", "barber_profile")
+    # breadcrumb for "⬅️ back"
+    await set_last_action(redis_pool, user.telegram_id, "barber_profile")
     lang = user.lang or normalize_lang(from_user.language_code)
     text = "Siz tanlagan barber:" if lang == "uz" else "Вы выбрали барбера:"
     await message.answer(
@@ -182,7 +183,8 @@ async def get_or_create_user_and_client(
             except IntegrityError:
                 await session.rollback()
                 client = (await session.execute(select(Client).where(Client.user_id == user.id).limit(1))).scalar_one()
-        sync_client_to_django.delay(
+        enqueue_client_sync(
+            session,
             telegram_id=tg_id,
             first_name=user.name,
             last_name=user.surname,
@@ -1,7 +1,7 @@
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery
-from sqlalchemy import select, and_
+from sqlalchemy import select
 
 from datetime import datetime, timedelta, time
 
@@ -13,10 +13,17 @@ from app.barber.models import (
 from app.client.models import ClientRequest, ClientRequestService
 from .keyboards import build_barber_services_self_kb
 
-from app.barber.barber_requests.utils import recalc_schedule_stats
 
 from app.db import AsyncSessionLocal
+from app.query_budget import query_budget
 from app.barber.schedule.callback_data import SchedPickSlotCBForBarber
+from sqlalchemy.exc import IntegrityError
+from app.barber.schedule.availability import (
+    get_day_availability, invalidate_availability, minutes_to_time, ACTIVE_STATUSES,
+    is_slot_conflict, slot_taken_text,
+)
+from app.barber.schedule.day_summary import invalidate_day_summaries, summary_ref
+from app.user_session import clear_session, load_session, update_session
 
 barber_request_router = Router()
 
@@ -28,8 +35,7 @@ async def on_client_slot_picked(callback: CallbackQuery, callback_data: SchedPic
     picked_hm = callback_data.hm  # "HHMM" -> e.g., "1530"
     # Normalize and store chosen time/day in redis (or state)
     redis = callback.bot.redis
-    await redis.set(f"user:{callback.from_user.id}:picked_day", picked_day)
-    await redis.set(f"user:{callback.from_user.id}:picked_hm", picked_hm)
+    await update_session(redis, callback.from_user.id, picked_day=picked_day, picked_hm=picked_hm)
 
     # Reset selected services (fresh picking after time)
     await state.update_data(selected_services=[])
@@ -135,6 +141,7 @@ async def toggle_service_callback(callback: CallbackQuery, state: FSMContext):
 
 
 @barber_request_router.callback_query(F.data == "barber_confirm_services")
+@query_budget(12)
 async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     selected_ids = data.get("selected_services", [])
@@ -147,8 +154,8 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
         return
 
     redis = callback.bot.redis
-    picked_day = await redis.get(f"user:{callback.from_user.id}:picked_day")  # "YYYY-MM-DD"
-    picked_hm = await redis.get(f"user:{callback.from_user.id}:picked_hm")  # "HHMM"
+    picked = await load_session(redis, callback.from_user.id, "picked_day", "picked_hm")
+    picked_day, picked_hm = picked.picked_day, picked.picked_hm  # "YYYY-MM-DD", "HHMM"
 
     if not picked_day or not picked_hm:
         # Safety: user somehow reached here without picking a time
@@ -242,35 +249,22 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
             await callback.message.answer(msg)
             return
 
-        # Check overlap within this schedule
-        conflict = (
-            await session.execute(
-                select(ClientRequest).where(
-                    ClientRequest.barber_schedule_id == barber_schedule.id,
-                    ClientRequest.status != "deny",
-                    # ClientRequest.client_id != client.id,
-                    and_(ClientRequest.from_time < end_dt, ClientRequest.to_time > start_dt)
-                ).limit(1)
-            )
-        ).scalar_one_or_none()
+        # Check overlap within this schedule (pending + accepted)
+        avail = await get_day_availability(session, redis, barber_schedule.id)
+        start_min = start_dt.hour * 60 + start_dt.minute
+        conflict = avail is not None and not avail.is_free(
+            start_min, start_min + total_duration, statuses=ACTIVE_STATUSES
+        )
 
         if conflict:
             # Show busy ranges and stop
-            client_requests = (
-                await session.execute(
-                    select(ClientRequest).where(
-                        ClientRequest.barber_schedule_id == barber_schedule.id,
-
-                        # ClientRequest.client_id != client.id
-                    )
-                )
-            ).scalars().all()
+            busy_ranges = avail.busy_ranges()
 
             await callback.message.answer("❌ Bu vaqt band!" if lang == "uz" else "❌ Это время уже занято!")
-            if client_requests:
+            if busy_ranges:
                 times_text = "\n".join(
-                    f"{cr.from_time.strftime('%H:%M')} - {cr.to_time.strftime('%H:%M')}"
-                    for cr in client_requests if cr.from_time and cr.to_time
+                    f"{minutes_to_time(st):%H:%M} - {minutes_to_time(en):%H:%M}"
+                    for st, en in busy_ranges
                 )
                 msg2 = (
                     f"📅 {sched_day.strftime('%d.%m.%Y')}\n⛔ Band vaqtlar:\n{times_text}"
@@ -310,27 +304,27 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
             status="accept",
         )
         session.add(client_request_add)
-        await session.flush()
-
-        # Add service lines
-        for s in services:
-            exists = (
-                await session.execute(
-                    select(ClientRequestService).where(
-                        ClientRequestService.client_request_id == client_request_add.id,
-                        ClientRequestService.barber_service_id == s.id,
-                    ).limit(1)
-                )
-            ).scalar_one_or_none()
-            if not exists:
-                session.add(ClientRequestService(
-                    client_request_id=client_request_add.id,
-                    barber_service_id=s.id,
-                    duration=s.duration
-                ))
+        try:
+            await session.flush()
+        except IntegrityError as e:
+            # a client booked an overlapping slot after our availability check
+            if not is_slot_conflict(e):
+                raise
+            await invalidate_availability(redis, barber_schedule.id)  # before rollback expires it
+            await session.rollback()
+            await callback.message.answer(slot_taken_text(lang))
+            return
+
+        # Add service lines (the request is new: nothing to de-duplicate against)
+        session.add_all([
+            ClientRequestService(client_request_id=client_request_add.id, barber_service_id=s.id,
+                                 duration=s.duration, price=s.price)
+            for s in services
+        ])
 
         await session.commit()
-        await recalc_schedule_stats(session, barber_schedule.id)
+        await invalidate_availability(redis, barber_schedule.id)
+        await invalidate_day_summaries(redis, summary_ref(client_request_add))
     msg = (
         f"✅ Siz tanlagan vaqt: {start_dt.strftime('%H:%M')} - {end_dt.strftime('%H:%M')}.\n"
         f"🕒 Umumiy davomiylik: {total_duration} daqiqa\n"
@@ -346,5 +340,4 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
 
     # cleanup
     await state.clear()
-    await redis.delete(f"user:{callback.from_user.id}:picked_day")
-    await redis.delete(f"user:{callback.from_user.id}:picked_hm")
+    await clear_session(redis, callback.from_user.id, "picked_day", "picked_hm")
@@ -5,13 +5,16 @@ from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 from sqlalchemy import and_, or_, func, cast, Date, select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.exc import IntegrityError
+from app.loaders import loader
 from .utils import check_time_conflict
-from app.barber.models import Barber, BarberService, BarberSchedule
-from app.client.models import Client, ClientRequest, ClientRequestService
+from app.barber.models import Barber, BarberSchedule
+from app.client.models import Client, ClientRequest
 from app.db import AsyncSessionLocal  # ← ensure correct import path
 from app.user.models import User
-from .utils import _t, _send_requests_page, recalc_schedule_stats, _notify_client_about_request
+from .utils import _t, _send_requests_page, _notify_client_about_request
+from app.barber.schedule.availability import invalidate_availability, is_slot_conflict, slot_taken_text
+from app.barber.schedule.day_summary import invalidate_day_summaries, summary_ref
 
 barber_requests = Router()
 
@@ -111,12 +114,7 @@ async def handle_request_action(call: CallbackQuery):
         # 🔒 Use SELECT FOR UPDATE to lock the row
         cr = await session.get(
             ClientRequest, req_id,
-            options=[
-                selectinload(ClientRequest.services)
-                .selectinload(ClientRequestService.barber_service)
-                .selectinload(BarberService.service),
-                selectinload(ClientRequest.client),
-            ],
+            options=loader("request_render"),
             with_for_update=True  # ✅ Lock the row during transaction
         )
 
@@ -137,19 +135,23 @@ async def handle_request_action(call: CallbackQuery):
 
                 if has_conflict:
                     await call.answer(
-                        "❌ Bu vaqt oralig'i band! Boshqa so'rov allaqachon qabul qilingan.",
+                        "❌ Bu vaqt oralig'i boshqa so'rov bilan band!",
                         show_alert=True
                     )
                     return
 
             # No conflict, proceed with acceptance
             cr.status = "accept"
-
-            # Recalculate schedule totals
-            if cr.barber_schedule_id:
-                await recalc_schedule_stats(session, cr.barber_schedule_id)
-
-            await session.commit()
+            try:
+                await session.commit()  # schedule totals follow via the flush hook
+            except IntegrityError as e:
+                if not is_slot_conflict(e):
+                    raise
+                await session.rollback()
+                await call.answer(slot_taken_text("uz"), show_alert=True)
+                return
+            await invalidate_availability(call.bot.redis, cr.barber_schedule_id)
+            await invalidate_day_summaries(call.bot.redis, summary_ref(cr))
 
             try:
                 await call.message.edit_reply_markup()
@@ -162,12 +164,9 @@ async def handle_request_action(call: CallbackQuery):
 
         elif action == "deny":
             cr.status = "deny"
-
-            # Recalculate schedule totals
-            if cr.barber_schedule_id:
-                await recalc_schedule_stats(session, cr.barber_schedule_id)
-
             await session.commit()
+            await invalidate_availability(call.bot.redis, cr.barber_schedule_id)
+            await invalidate_day_summaries(call.bot.redis, summary_ref(cr))
 
             try:
                 await call.message.edit_reply_markup()
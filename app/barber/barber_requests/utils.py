@@ -1,15 +1,16 @@
-from sqlalchemy import and_, or_, func, cast, Date, select
+from sqlalchemy import select
 from datetime import date
 from typing import Optional
 from aiogram.types import Message, CallbackQuery
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from sqlalchemy import and_, or_, func, cast, Date
-from sqlalchemy.orm import selectinload
-from sqlalchemy.sql import distinct
-from app.barber.models import Barber, BarberService, BarberSchedule
-from app.client.models import Client, ClientRequest, ClientRequestService
+from sqlalchemy import or_, func
+from app.loaders import loader
+from app.barber.models import Barber
+from app.client.models import ClientRequest
 from app.db import AsyncSessionLocal  # ← ensure correct import path
 from app.user.models import User
+from app.notifier import get_notifier
+from app.barber.schedule.availability import ACTIVE_STATUSES
 from app.barber.keyboards import (
     request_row_kb,
     build_profile_button
@@ -64,24 +65,16 @@ def _nav_row_kb(status: str, page: int, has_prev: bool, has_next: bool, lang: st
 async def _build_requests_query(status: str, barber_id: int):
     now = datetime.now()
     today = date.today()
+    # range on (barber_id, status, day); pending ones must also not have started yet
     base = select(ClientRequest).where(
         ClientRequest.barber_id == barber_id,
         ClientRequest.status == status,
+        ClientRequest.day >= today,
     )
     if status == "pending":
-        base = base.where(or_(
-            and_(ClientRequest.from_time.is_not(None), ClientRequest.from_time >= now),
-            and_(ClientRequest.from_time.is_(None), cast(ClientRequest.date, Date) >= today),
-        ))
-    else:
-        base = base.where(cast(ClientRequest.date, Date) >= today)
+        base = base.where(or_(ClientRequest.from_time.is_(None), ClientRequest.from_time >= now))
 
-    return base.order_by(func.coalesce(ClientRequest.from_time, ClientRequest.date).asc()).options(
-        selectinload(ClientRequest.services)
-        .selectinload(ClientRequestService.barber_service)
-        .selectinload(BarberService.service),
-        selectinload(ClientRequest.client).selectinload(Client.user),
-    )
+    return base.order_by(func.coalesce(ClientRequest.from_time, ClientRequest.date).asc()).options(*loader("request_render"))
 
 
 async def _count_requests(session, q):
@@ -153,7 +146,8 @@ async def _send_requests_page(message: Message, barber_id: int, lang: str, statu
                 bs = getattr(crs, "barber_service", None)
                 svc = getattr(bs, "service", None) if bs else None
 
-                price = getattr(bs, "price", 0) if bs and (bs.price is not None) else 0
+                price = crs.price if crs.price is not None else (
+                    bs.price if bs is not None and bs.price is not None else 0)
                 total_price += price
 
                 dur_mins = (
@@ -276,10 +270,7 @@ async def _notify_client_about_request(bot, session, cr):
             f"⏭️ Пожалуйста, выберите другое время."
         )
 
-    try:
-        await bot.send_message(client_user.telegram_id, text)
-    except Exception:
-        pass
+    await get_notifier(bot).send(client_user.telegram_id, text)
 
 
 def _fmt_duration(mins: Optional[int]) -> str:
@@ -336,39 +327,6 @@ def _t(key: str, lang: str) -> str:
     return vocab[key]
 
 
-async def recalc_schedule_stats(session: AsyncSessionLocal, schedule_id: int) -> None:
-    # 1) Number of accepted client requests for this schedule
-    n_clients_q = (
-        select(func.count(distinct(ClientRequest.id)))
-        .where(
-            ClientRequest.barber_schedule_id == schedule_id,
-            ClientRequest.status == "accept",
-        )
-    )
-    n_clients = (await session.execute(n_clients_q)).scalar_one() or 0
-
-    # 2) Total income: sum of service prices for accepted requests on this schedule
-    #    client_requests_services -> barber_services (price)
-    total_income_q = (
-        select(func.coalesce(func.sum(BarberService.price), 0))
-        .select_from(ClientRequestService)
-        .join(ClientRequest, ClientRequestService.client_request_id == ClientRequest.id)
-        .join(BarberService, ClientRequestService.barber_service_id == BarberService.id)
-        .where(
-            ClientRequest.barber_schedule_id == schedule_id,
-            ClientRequest.status == "accept",
-        )
-    )
-    total_income = (await session.execute(total_income_q)).scalar_one() or 0
-
-    # 3) Persist on the schedule row
-    schedule: BarberSchedule = await session.get(BarberSchedule, schedule_id)
-    if schedule:
-        schedule.n_clients = int(n_clients)
-        schedule.total_income = int(total_income)
-        await session.commit()
-
-
 async def check_time_conflict(
         session: AsyncSessionLocal,
         barber_id: int,
@@ -377,33 +335,16 @@ async def check_time_conflict(
         exclude_request_id: int = None
 ) -> bool:
     """
-    Check if there's any accepted request that overlaps with the given time range.
+    Check if there's any pending or accepted request that overlaps with the given time range,
+    i.e. anything the no-overlap exclusion constraint would reject on commit.
     Returns True if conflict exists, False otherwise.
     """
-    query = select(ClientRequest).where(
-        and_(
-            ClientRequest.barber_id == barber_id,
-            ClientRequest.status == "accept",
-            # Check for time overlap: new request overlaps with existing ones
-            or_(
-                # New request starts during existing booking
-                and_(
-                    ClientRequest.from_time <= from_time,
-                    ClientRequest.to_time > from_time
-                ),
-                # New request ends during existing booking
-                and_(
-                    ClientRequest.from_time < to_time,
-                    ClientRequest.to_time >= to_time
-                ),
-                # New request completely contains existing booking
-                and_(
-                    ClientRequest.from_time >= from_time,
-                    ClientRequest.to_time <= to_time
-                )
-            )
-        )
-    )
+    # GiST-indexed: the slot column backs the no-overlap exclusion constraint
+    query = select(ClientRequest.id).where(
+        ClientRequest.barber_id == barber_id,
+        ClientRequest.status.in_(ACTIVE_STATUSES),
+        ClientRequest.slot.overlaps(func.tsrange(from_time, to_time, "[)")),
+    ).limit(1)
 
     if exclude_request_id:
         query = query.where(ClientRequest.id != exclude_request_id)
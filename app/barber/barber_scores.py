@@ -1,6 +1,5 @@
 from app.barber.models import BarberServiceScore
-from app.client.models import Client
-from app.barber.models import Barber, BarberService
+from app.barber.models import Barber
 from app.user.models import User
 from app.db import AsyncSessionLocal
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
@@ -9,8 +8,9 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 from sqlalchemy import select
 from zoneinfo import ZoneInfo
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, and_
 from sqlalchemy.orm import selectinload
+from app.loaders import loader
 
 barber_scores = Router()
 
@@ -99,30 +99,11 @@ def _cr_date_time(score):
 
 
 # ---------- DB helpers ----------
-async def _count_scores(session, barber_id):
-    q = select(func.count(BarberServiceScore.id)).where(
-        and_(BarberServiceScore.barber_id == barber_id, BarberServiceScore.score.isnot(None))
-    )
-    return int((await session.execute(q)).scalar() or 0)
-
-
-async def _avg_score(session, barber_id):
-    q = select(func.avg(BarberServiceScore.score)).where(
-        and_(BarberServiceScore.barber_id == barber_id, BarberServiceScore.score.isnot(None))
-    )
-    val = (await session.execute(q)).scalar()
-    return float(val or 0.0)
-
-
 async def _page_scores(session, barber_id, page, page_size):
     offset = max(0, (page - 1) * page_size)
     q = (
         select(BarberServiceScore)
-        .options(
-            selectinload(BarberServiceScore.client).selectinload(Client.user),
-            selectinload(BarberServiceScore.barber_service).selectinload(BarberService.service),
-            selectinload(BarberServiceScore.client_request),
-        )
+        .options(*loader("score_list"))
         .where(and_(BarberServiceScore.barber_id == barber_id, BarberServiceScore.score.isnot(None)))
         .order_by(BarberServiceScore.id.desc())
         .limit(page_size)
@@ -189,8 +170,9 @@ async def _send_scores_target(message_or_call, barber_id, page):
                 await message_or_call.answer(text, show_alert=True)
             return
 
-        total = await _count_scores(session, barber_id)
-        avg = await _avg_score(session, barber_id)
+        # maintained aggregates (app/barber/ratings.py) instead of COUNT/AVG over all reviews
+        total = int(barber.score_count or 0)
+        avg = (barber.score_sum or 0) / total if total else 0.0
         total_pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
         page = max(1, min(page, total_pages))
 
@@ -5,7 +5,7 @@ from sqlalchemy import select, and_
 from app.db import AsyncSessionLocal  # ← ensure correct import path
 from app.user.models import User
 from app.barber.models import Barber, BarberService
-from app.service.models import Service
+from app.refdata import refdata
 from .keyboards import (
     barber_services_keyboard,
     barber_service_menu_keyboard,
@@ -15,6 +15,7 @@ from .keyboards import (
 )
 from app.basic.keyboards import back_keyboard
 from app.states import BarberServiceStates, DurationStates
+from app.user_session import clear_session, set_last_action
 
 barber_service = Router()
 
@@ -36,7 +37,7 @@ async def add_service(message: Message, state: FSMContext):
                 "❌ Foydalanuvchi topilmadi." if message.from_user.language_code == "uz" else "❌ Пользователь не найден.")
             return
 
-        await redis_pool.set(f"user:{user_obj.telegram_id}:last_action", "add_service")
+        await set_last_action(redis_pool, user_obj.telegram_id, "add_service")
         lang = user_obj.lang or "uz"
 
         # barber
@@ -48,9 +49,7 @@ async def add_service(message: Message, state: FSMContext):
         if not barber:
             await message.answer("Sartarosh topilmadi." if lang == "uz" else "Парикмахер не найден.")
             return
-        services_result = (await session.execute(
-            select(Service).where(Service.disabled.is_(False))
-        )).scalars().all()
+        services_result = await refdata.services()
 
         # barber services
         barber_services_result = (
@@ -96,7 +95,7 @@ async def handle_toggle_service(callback_query: CallbackQuery):
             await callback_query.answer("❌ Barber not found", show_alert=True)
             return
 
-        await redis_pool.set(f"user:{user.telegram_id}:last_action", "barber_service")
+        await set_last_action(redis_pool, user.telegram_id, "barber_service")
 
         # find existing BarberService
         bs = (
@@ -121,9 +120,7 @@ async def handle_toggle_service(callback_query: CallbackQuery):
         await session.commit()
 
         # refresh lists for keyboard
-        all_services = (await session.execute(
-            select(Service).where(Service.disabled.is_(False))
-        )).scalars().all()
+        all_services = await refdata.services()
 
         barber_services = (
             await session.execute(
@@ -166,7 +163,7 @@ async def handle_service_click(callback_query: CallbackQuery):
         barber.selected_service = service_id
         await session.commit()
 
-        await redis_pool.set(f"user:{user.telegram_id}:last_action", "service_profile")
+        await set_last_action(redis_pool, user.telegram_id, "service_profile")
 
         lang = user.lang or "uz"
 
@@ -271,7 +268,7 @@ async def receive_price(message: Message, state: FSMContext):
             reply_markup=barber_services_keyboard(services, user.lang or "uz"),
         )
         await state.clear()
-        await redis_pool.delete(f"user:{user.telegram_id}:service_id")
+        await clear_session(redis_pool, user.telegram_id, "service_id")
 
 
 @barber_service.message(F.text.in_(["🗑 Xizmatni o'chirish", "🗑 Удалить услугу"]))
@@ -342,7 +339,7 @@ async def remove_service(message: Message, state: FSMContext):
             "Xizmatlaringiz ro'yxati:" if lang == "uz" else "Ваши услуги:",
             reply_markup=barber_services_keyboard(services, lang),
         )
-        await redis_pool.delete(f"user:{user.telegram_id}:service_id")
+        await clear_session(redis_pool, user.telegram_id, "service_id")
 
 
 @barber_service.message(F.text.in_(["⏱ Davomiylikni belgilash", "⏱ Установить длительность"]))
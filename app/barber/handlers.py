@@ -11,6 +11,7 @@ from .keyboards import (
     barber_service_menu_keyboard,
     barber_info_keyboard,
 )
+from app.user_session import set_last_action
 
 barber_router = Router()
 
@@ -33,7 +34,7 @@ async def show_services(message: Message, state: FSMContext):
                 "Foydalanuvchi topilmadi." if message.from_user.language_code == "uz" else "Пользователь не найден.")
             return
 
-        await redis_pool.set(f"user:{user_obj.telegram_id}:last_action", "barber_services")
+        await set_last_action(redis_pool, user_obj.telegram_id, "barber_services")
         lang = user_obj.lang or "uz"
 
         # barber
@@ -85,7 +86,7 @@ async def show_info(message: Message):
                 "Foydalanuvchi topilmadi." if message.from_user.language_code == "uz" else "Пользователь не найден.")
             return
 
-        await redis_pool.set(f"user:{user_obj.telegram_id}:last_action", "barber_info")
+        await set_last_action(redis_pool, user_obj.telegram_id, "barber_info")
 
         lang = user_obj.lang or "uz"
         text = "Shaxsiy ma'lumotlar:" if lang == "uz" else "Личные данные:"
@@ -1,6 +1,6 @@
-from sqlalchemy import Integer, String, ForeignKey, BigInteger, DateTime, Float, Boolean
+from sqlalchemy import Integer, String, ForeignKey, BigInteger, DateTime, Float, Boolean, UniqueConstraint, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from app.db import Base
+from app.db import Base, LAZY
 from typing import Optional
 from datetime import datetime
 from app.service.models import Service
@@ -16,65 +16,79 @@ class Barber(Base):
     start_time: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     end_time: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     score: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # running rating aggregates (app/barber/ratings.py); score = round(score_sum / score_count)
+    score_sum: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
+    score_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     img: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     midnight_price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     user = relationship("app.user.models.User", back_populates="barber", lazy="selectin")
-    services = relationship("BarberService", back_populates="barber", lazy="selectin")
+    services = relationship("BarberService", back_populates="barber", lazy=LAZY)
     description: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     address: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     resume: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     latitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     longitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     location_title: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
-    requests = relationship("ClientRequest", back_populates="barber", lazy="selectin")
-    schedule = relationship("BarberSchedule", back_populates="barber", lazy="selectin")
+    requests = relationship("ClientRequest", back_populates="barber", lazy=LAZY)
+    schedule = relationship("BarberSchedule", back_populates="barber", lazy=LAZY)
     selected_service: Mapped[int] = mapped_column(BigInteger, nullable=True)
-    working_days = relationship("BarberWorkingDays", back_populates="barber", lazy="selectin",
+    working_days = relationship("BarberWorkingDays", back_populates="barber", lazy=LAZY,
                                 order_by="BarberWorkingDays.id")
-    scores = relationship("BarberServiceScore", back_populates="barber", lazy="selectin")
-    clients = relationship("ClientBarbers", back_populates="barber", lazy="selectin")
+    scores = relationship("BarberServiceScore", back_populates="barber", lazy=LAZY)
+    clients = relationship("ClientBarbers", back_populates="barber", lazy=LAZY)
     selected_schedule_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
 
 
 class BarberService(Base):
     __tablename__ = "barber_services"
+    __table_args__ = (Index("ix_barber_services_barber", "barber_id"),)
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     barber_id: Mapped[int] = mapped_column(ForeignKey("barbers.id"))
     service_id: Mapped[int] = mapped_column(ForeignKey("services.id"))
     price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     duration: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
-    barber = relationship("Barber", back_populates="services", lazy="selectin")
-    scores = relationship("BarberServiceScore", back_populates="barber_service", lazy="selectin")
-    requests_services = relationship("ClientRequestService", back_populates="barber_service", lazy="selectin")
+    barber = relationship("Barber", back_populates="services", lazy=LAZY)
+    scores = relationship("BarberServiceScore", back_populates="barber_service", lazy=LAZY)
+    requests_services = relationship("ClientRequestService", back_populates="barber_service", lazy=LAZY)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=True)
     service = relationship("Service", back_populates="barber_service", lazy="selectin")
+    score_sum: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
+    score_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
 
 class BarberServiceScore(Base):
     __tablename__ = "barber_service_scores"
+    __table_args__ = (
+        # a barber's scores page, newest first
+        Index("ix_barber_service_scores_barber", "barber_id", "id", postgresql_where=text("score IS NOT NULL")),
+        Index("ix_barber_service_scores_request", "client_request_id"),
+    )
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     barber_service_id: Mapped[int] = mapped_column(ForeignKey("barber_services.id"))
     client_id: Mapped[int] = mapped_column(ForeignKey("client.id"))
     score: Mapped[int] = mapped_column(Integer, nullable=True)
     client_request_id: Mapped[int] = mapped_column(ForeignKey("client_requests.id"))
     comment: Mapped[str] = mapped_column(String(255), nullable=True)
-    client_request = relationship("ClientRequest", back_populates="scores", lazy="selectin")
-    client = relationship("Client", back_populates="scores", lazy="selectin")
-    barber_service = relationship("BarberService", back_populates="scores", lazy="selectin")
+    client_request = relationship("ClientRequest", back_populates="scores", lazy=LAZY)
+    client = relationship("Client", back_populates="scores", lazy=LAZY)
+    barber_service = relationship("BarberService", back_populates="scores", lazy=LAZY)
     barber_id: Mapped[int] = mapped_column(ForeignKey("barbers.id"), nullable=True)
-    barber = relationship("Barber", back_populates="scores", lazy="selectin")
+    barber = relationship("Barber", back_populates="scores", lazy=LAZY)
 
 
 class BarberSchedule(Base):
     __tablename__ = "barber_schedule"
+    __table_args__ = (
+        UniqueConstraint("barber_id", "day", name="uq_barber_schedule_barber_day"),
+    )
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     day: Mapped[Optional[DateTime]] = mapped_column(DateTime, nullable=True)
     barber_id: Mapped[int] = mapped_column(ForeignKey("barbers.id"))
     n_clients: Mapped[int] = mapped_column(Integer, nullable=True)
     total_income: Mapped[BigInteger] = mapped_column(BigInteger, nullable=True)
-    barber = relationship("Barber", back_populates="schedule", lazy="selectin")
-    details = relationship("BarberScheduleDetail", back_populates="barber_schedule", lazy="selectin")
-    requests = relationship("ClientRequest", back_populates="barber_schedule", lazy="selectin")
+    barber = relationship("Barber", back_populates="schedule", lazy=LAZY)
+    details = relationship("BarberScheduleDetail", back_populates="barber_schedule", lazy=LAZY)
+    requests = relationship("ClientRequest", back_populates="barber_schedule", lazy=LAZY)
     name_uz: Mapped[str] = mapped_column(String(50), nullable=True)
     name_ru: Mapped[str] = mapped_column(String(50), nullable=True)
 
@@ -86,8 +100,8 @@ class BarberScheduleDetail(Base):
     from_time: Mapped[Optional[DateTime]] = mapped_column(DateTime, nullable=True)
     to_time: Mapped[Optional[DateTime]] = mapped_column(DateTime, nullable=True)
     client_request_id: Mapped[int] = mapped_column(ForeignKey("client_requests.id"))
-    barber_schedule = relationship("BarberSchedule", back_populates="details", lazy="selectin")
-    client_request = relationship("ClientRequest", back_populates="schedule_details", lazy="selectin")
+    barber_schedule = relationship("BarberSchedule", back_populates="details", lazy=LAZY)
+    client_request = relationship("ClientRequest", back_populates="schedule_details", lazy=LAZY)
 
 
 class BarberWorkingDays(Base):
@@ -96,5 +110,5 @@ class BarberWorkingDays(Base):
     barber_id: Mapped[int] = mapped_column(ForeignKey("barbers.id"))
     name_uz: Mapped[str] = mapped_column(String(50), nullable=True)
     name_ru: Mapped[str] = mapped_column(String(50), nullable=True)
-    barber = relationship("Barber", back_populates="working_days", lazy="selectin")
+    barber = relationship("Barber", back_populates="working_days", lazy=LAZY)
     is_working: Mapped[bool] = mapped_column(default=False)
@@ -9,6 +9,7 @@ from app.basic.keyboards import back_keyboard
 from app.states import FileUpload
 from app.db import AsyncSessionLocal
 import os
+from app.user_session import set_last_action
 
 barber_photo_router = Router()
 
@@ -34,7 +35,7 @@ async def show_resume(message: Message):
         ).scalar_one_or_none()
 
         text = "Profil rasmi:" if user_obj.lang == "uz" else "Фото профиля:"
-        await redis_pool.set(f"user:{user_obj.telegram_id}:last_action", "barber_photo")
+        await set_last_action(redis_pool, user_obj.telegram_id, "barber_photo")
 
         if barber and barber.img:
             img_path = os.path.abspath(barber.img)
@@ -73,7 +74,7 @@ async def edit_photo(message: Message, state: FSMContext):
         ).scalar_one_or_none()
         lang = user_obj.lang or "uz" if user_obj else "uz"
         if user_obj:
-            await redis_pool.set(f"user:{user_obj.telegram_id}:last_action", "barber_photo")
+            await set_last_action(redis_pool, user_obj.telegram_id, "barber_photo")
 
     text = (
         "📸 Iltimos, yangi profil rasmingizni yuboring.\n\n"
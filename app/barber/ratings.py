@@ -0,0 +1,133 @@
+"""
+Rating aggregates.
+
+Barber and BarberService carry score_sum / score_count, moved by one UPDATE per
+rating write (no read of earlier reviews), and Barber.score is derived from them
+in the same statement.
+
+Repair / backfill (recomputes from barber_service_scores):
+
+    python -m app.barber.ratings            # every barber
+    python -m app.barber.ratings 12 15      # only these barber ids
+"""
+import asyncio
+import logging
+import sys
+from typing import Iterable, Optional
+
+from sqlalchemy import select, update, func, case, cast, Numeric
+
+from app.barber.models import Barber, BarberService, BarberServiceScore
+
+logger = logging.getLogger(__name__)
+
+
+def _derived_score(sum_col, count_col):
+    return case(
+        (count_col > 0, func.round(cast(sum_col, Numeric) / count_col)),
+        else_=None,
+    )
+
+
+async def apply_score_delta(session, barber_id: Optional[int], barber_service_id: Optional[int],
+                            delta_sum: int, delta_count: int) -> None:
+    """
+    Move the aggregates by (delta_sum, delta_count) atomically in the caller's transaction:
+      new score       → (score, 1)
+      edited score    → (new - old, 0)
+      deleted score   → (-old, -1)
+    """
+    if barber_id:
+        new_sum = Barber.score_sum + delta_sum
+        new_count = Barber.score_count + delta_count
+        await session.execute(
+            update(Barber)
+            .where(Barber.id == barber_id)
+            .values(score_sum=new_sum, score_count=new_count, score=_derived_score(new_sum, new_count))
+            .execution_options(synchronize_session=False)
+        )
+    if barber_service_id:
+        await session.execute(
+            update(BarberService)
+            .where(BarberService.id == barber_service_id)
+            .values(
+                score_sum=BarberService.score_sum + delta_sum,
+                score_count=BarberService.score_count + delta_count,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def rebuild_rating_aggregates(session, barber_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute aggregates from barber_service_scores (all barbers or the given ids) in one transaction."""
+    barber_ids = list(barber_ids) if barber_ids else None
+
+    per_barber = (
+        select(
+            BarberServiceScore.barber_id.label("barber_id"),
+            func.coalesce(func.sum(BarberServiceScore.score), 0).label("s"),
+            func.count(BarberServiceScore.score).label("n"),
+        )
+        .where(BarberServiceScore.barber_id.is_not(None))
+        .group_by(BarberServiceScore.barber_id)
+        .subquery()
+    )
+    per_service = (
+        select(
+            BarberServiceScore.barber_service_id.label("bs_id"),
+            func.coalesce(func.sum(BarberServiceScore.score), 0).label("s"),
+            func.count(BarberServiceScore.score).label("n"),
+        )
+        .group_by(BarberServiceScore.barber_service_id)
+        .subquery()
+    )
+
+    # reset, then UPDATE … FROM the grouped scores (barbers without scores stay at zero)
+    reset_barbers = update(Barber).values(score_sum=0, score_count=0, score=None)
+    reset_services = update(BarberService).values(score_sum=0, score_count=0)
+    q_barbers = (
+        update(Barber)
+        .where(Barber.id == per_barber.c.barber_id)
+        .values(
+            score_sum=per_barber.c.s,
+            score_count=per_barber.c.n,
+            score=_derived_score(per_barber.c.s, per_barber.c.n),
+        )
+    )
+    q_services = (
+        update(BarberService)
+        .where(BarberService.id == per_service.c.bs_id)
+        .values(score_sum=per_service.c.s, score_count=per_service.c.n)
+    )
+
+    if barber_ids:
+        reset_barbers = reset_barbers.where(Barber.id.in_(barber_ids))
+        reset_services = reset_services.where(BarberService.barber_id.in_(barber_ids))
+        q_barbers = q_barbers.where(Barber.id.in_(barber_ids))
+        q_services = q_services.where(BarberService.barber_id.in_(barber_ids))
+
+    for q in (reset_barbers, reset_services):
+        await session.execute(q.execution_options(synchronize_session=False))
+    result = await session.execute(q_barbers.execution_options(synchronize_session=False))
+    await session.execute(q_services.execution_options(synchronize_session=False))
+    await session.commit()
+    return result.rowcount or 0  # barbers that have scores
+
+
+async def _main(argv) -> None:
+    from app.db import AsyncSessionLocal, async_engine
+    import app.models  # noqa: F401  (configure mappers)
+
+    ids = [int(a) for a in argv] or None
+    try:
+        async with AsyncSessionLocal() as session:
+            touched = await rebuild_rating_aggregates(session, ids)
+        logger.info("rating aggregates rebuilt for %s barber(s)", touched)
+        print(f"rating aggregates rebuilt for {touched} barber(s)")
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
@@ -8,6 +8,7 @@ from .keyboards import resume_keyboard
 from app.states import FileUpload
 from app.db import AsyncSessionLocal
 import os
+from app.user_session import set_last_action
 
 barber_resume = Router()
 
@@ -35,7 +36,7 @@ async def show_resume(message: Message):
         lang = user_obj.lang or "uz"
         text = "Rezyume:" if lang == "uz" else "Резюме:"
 
-        await redis_pool.set(f"user:{user_obj.telegram_id}:last_action", "barber_resume")
+        await set_last_action(redis_pool, user_obj.telegram_id, "barber_resume")
 
         if barber_obj and barber_obj.resume:
             resume_path = os.path.abspath(barber_obj.resume)
@@ -0,0 +1,235 @@
+"""
+Slot availability engine.
+
+Every BarberSchedule row (one barber, one day) is summarised as a small Redis
+entry: the working windows and the booked intervals in minutes-of-day.
+Busy minutes are turned into an int bitmap (bit m = minute m is taken), so
+"is [a, b) free" is a single AND and a slot grid is O(slots).
+
+The entry is rebuilt from Postgres on a miss and dropped by every writer
+(new request, accept/deny, service edit, time change, cancel, working hours),
+so keyboard renders do not touch the database in steady state.
+"""
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.barber.models import BarberSchedule
+from app.client.models import ClientRequest, SLOT_EXCLUSION
+from app.barber.schedule.schedule_utils import _working_time_windows
+
+logger = logging.getLogger(__name__)
+
+AVAILABILITY_TTL = 24 * 60 * 60
+DAY_MINUTES = 24 * 60
+
+ACTIVE_STATUSES = ("pending", "accept")  # everything except "deny"
+ACCEPTED = ("accept",)
+
+
+def is_slot_conflict(exc: BaseException) -> bool:
+    """
+    True for the IntegrityError raised by the per-barber no-overlap constraint, i.e. another
+    pending/accepted booking took the time between our check and our commit.
+    """
+    orig = getattr(exc, "orig", None)
+    return getattr(orig, "sqlstate", None) == "23P01" or SLOT_EXCLUSION in str(exc)
+
+
+def slot_taken_text(lang: str) -> str:
+    return "❌ Это время уже занято!" if (lang or "").lower().startswith("ru") else "❌ Bu vaqt band!"
+
+
+def _availability_key(sched_id: int) -> str:
+    return f"avail:sched:{sched_id}"
+
+
+def _minute_of_day(t) -> int:
+    return t.hour * 60 + t.minute
+
+
+def _interval_mask(start: int, end: int) -> int:
+    start, end = max(0, start), min(DAY_MINUTES, end)
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+@dataclass
+class DayAvailability:
+    sched_id: int
+    barber_id: int
+    day: date
+    # [(start_min, end_min)] working windows, end exclusive
+    windows: List[Tuple[int, int]] = field(default_factory=list)
+    # [(start_min, end_min, status, client_id)] non-denied requests
+    intervals: List[Tuple[int, int, Optional[str], Optional[int]]] = field(default_factory=list)
+
+    def busy_mask(self, statuses: Iterable[str] = ACCEPTED, exclude_client_id: Optional[int] = None) -> int:
+        statuses = set(statuses)
+        mask = 0
+        for start, end, status, client_id in self.intervals:
+            if (status or "pending") not in statuses:
+                continue
+            if exclude_client_id is not None and client_id == exclude_client_id:
+                continue
+            mask |= _interval_mask(start, end)
+        return mask
+
+    def is_free(self, start: int, end: int, statuses: Iterable[str] = ACCEPTED,
+                exclude_client_id: Optional[int] = None, busy: Optional[int] = None) -> bool:
+        if busy is None:
+            busy = self.busy_mask(statuses, exclude_client_id)
+        return not (busy & _interval_mask(start, end))
+
+    def slot_grid(self, slot_minutes: int = 30, statuses: Iterable[str] = ACCEPTED
+                  ) -> List[Tuple[Tuple[int, int], List[Tuple[int, bool]]]]:
+        """[(window, [(slot_start_min, is_free), ...]), ...] — slots that finish inside the window."""
+        busy = self.busy_mask(statuses)
+        grid = []
+        for w_start, w_end in self.windows:
+            slots = []
+            cur = w_start
+            while cur + slot_minutes <= w_end:
+                slots.append((cur, not (busy & _interval_mask(cur, cur + slot_minutes))))
+                cur += slot_minutes
+            grid.append(((w_start, w_end), slots))
+        return grid
+
+    def free_slots(self, duration: int, step: int = 30, statuses: Iterable[str] = ACCEPTED,
+                   exclude_client_id: Optional[int] = None) -> List[int]:
+        """Start minutes where a booking of `duration` minutes fits entirely inside a window."""
+        busy = self.busy_mask(statuses, exclude_client_id)
+        starts = []
+        for w_start, w_end in self.windows:
+            cur = w_start
+            while cur + duration <= w_end:
+                if not (busy & _interval_mask(cur, cur + duration)):
+                    starts.append(cur)
+                cur += step
+        return starts
+
+    def busy_ranges(self, statuses: Iterable[str] = ACTIVE_STATUSES,
+                    exclude_client_id: Optional[int] = None) -> List[Tuple[int, int]]:
+        statuses = set(statuses)
+        return sorted(
+            (start, end) for start, end, status, client_id in self.intervals
+            if (status or "pending") in statuses
+            and (exclude_client_id is None or client_id != exclude_client_id)
+        )
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "sched_id": self.sched_id,
+            "barber_id": self.barber_id,
+            "day": self.day.isoformat(),
+            "windows": self.windows,
+            "intervals": self.intervals,
+        })
+
+    @classmethod
+    def from_json(cls, raw: str) -> "DayAvailability":
+        data = json.loads(raw)
+        return cls(
+            sched_id=data["sched_id"],
+            barber_id=data["barber_id"],
+            day=date.fromisoformat(data["day"]),
+            windows=[tuple(w) for w in data["windows"]],
+            intervals=[tuple(i) for i in data["intervals"]],
+        )
+
+
+def minutes_to_time(minutes: int) -> time:
+    minutes = max(0, min(minutes, DAY_MINUTES - 1))
+    return time(minutes // 60, minutes % 60)
+
+
+def minutes_to_dt(day: date, minutes: int) -> datetime:
+    return datetime.combine(day, time(0, 0)) + timedelta(minutes=minutes)
+
+
+async def _build_day_availability(session, sched: BarberSchedule) -> DayAvailability:
+    the_day = sched.day.date()
+    windows = await _working_time_windows(session, sched.barber_id, the_day)
+
+    rows = (await session.execute(
+        select(ClientRequest.from_time, ClientRequest.to_time, ClientRequest.status, ClientRequest.client_id)
+        .where(
+            ClientRequest.barber_schedule_id == sched.id,
+            ClientRequest.barber_id == sched.barber_id,
+            ClientRequest.status.is_distinct_from("deny"),
+            ClientRequest.from_time.is_not(None),
+            ClientRequest.to_time.is_not(None),
+        )
+    )).all()
+
+    intervals = []
+    for ft, tt, status, client_id in rows:
+        if not ft < tt:
+            continue
+        start = _minute_of_day(ft)
+        # bookings that run past midnight occupy the rest of the day
+        end = _minute_of_day(tt) if tt.date() == ft.date() else DAY_MINUTES
+        if start < end:
+            intervals.append((start, end, status, client_id))
+
+    return DayAvailability(
+        sched_id=sched.id,
+        barber_id=sched.barber_id,
+        day=the_day,
+        windows=[(_minute_of_day(ws), _minute_of_day(we)) for ws, we in sorted(windows) if we > ws],
+        intervals=intervals,
+    )
+
+
+async def get_day_availability(session, redis, sched_id: int,
+                               barber_id: Optional[int] = None) -> Optional[DayAvailability]:
+    """Cached availability for a schedule; None if the schedule is missing or belongs to another barber."""
+    avail = None
+    if redis is not None:
+        try:
+            raw = await redis.get(_availability_key(sched_id))
+            if raw:
+                avail = DayAvailability.from_json(raw)
+        except Exception as e:
+            logger.warning("availability cache read failed for %s: %s", sched_id, e)
+
+    if avail is None:
+        sched = await session.get(BarberSchedule, sched_id)
+        if not sched or not sched.day:
+            return None
+        avail = await _build_day_availability(session, sched)
+        if redis is not None:
+            try:
+                await redis.set(_availability_key(sched_id), avail.to_json(), ex=AVAILABILITY_TTL)
+            except Exception as e:
+                logger.warning("availability cache write failed for %s: %s", sched_id, e)
+
+    if barber_id is not None and avail.barber_id != barber_id:
+        return None
+    return avail
+
+
+async def invalidate_availability(redis, *sched_ids: Optional[int]) -> None:
+    keys = [_availability_key(sid) for sid in sched_ids if sid]
+    if redis is None or not keys:
+        return
+    try:
+        await redis.delete(*keys)
+    except Exception as e:
+        logger.warning("availability cache invalidate failed for %s: %s", keys, e)
+
+
+async def invalidate_barber_availability(session, redis, barber_id: int) -> None:
+    """Working hours/days changed → drop every upcoming schedule of the barber."""
+    if redis is None:
+        return
+    today = datetime.combine(datetime.now().date(), time(0, 0))
+    sched_ids = (await session.execute(
+        select(BarberSchedule.id).where(BarberSchedule.barber_id == barber_id, BarberSchedule.day >= today)
+    )).scalars().all()
+    await invalidate_availability(redis, *sched_ids)
@@ -1,6 +1,6 @@
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
-from sqlalchemy.orm import selectinload
+from app.loaders import loader
 from aiogram.types import (
     Message,
     CallbackQuery,
@@ -9,7 +9,6 @@ from aiogram.types import (
 )
 from sqlalchemy import and_, or_, func, cast, Date, select
 from app.client.models import ClientRequest
-from app.barber.barber_requests.utils import recalc_schedule_stats
 from datetime import timedelta, datetime
 from app.barber.schedule.callback_data import (
     SchedListCB,
@@ -26,6 +25,8 @@ from app.barber.barber_requests.utils import check_time_conflict
 from app.barber.models import BarberService, BarberSchedule
 from app.client.models import ClientRequestService
 from app.db import AsyncSessionLocal
+from app.identity import Identity
+from typing import Optional
 
 from app.barber.utils import (
     get_user_and_barber,
@@ -33,20 +34,17 @@ from app.barber.utils import (
     week_bounds,
 )
 from app.barber.schedule.schedule_utils import (
-    fetch_requests_for_day,
-    fetch_requests_for_schedule,
-    _sched_occupancy_stats,
     _fmt_money,
     render_request_block,
     calc_request_totals,
-    _fmt_duration_minutes,
-    _fmt_duration_minutes_ru,
-    _final_price,
     load_request_full,
-    recompute_schedule_totals,
-    _day_occupancy_stats,
     _parse_discount_strict
 )
+from sqlalchemy.exc import IntegrityError
+from app.barber.schedule.availability import invalidate_availability, is_slot_conflict, slot_taken_text
+from app.barber.schedule.day_summary import (
+    get_day_summary, invalidate_day_summaries, summary_ref, today_schedule_id, VIEW_TODAY,
+)
 from app.barber.schedule.schedule_keyboards import (
     kb_request_manage,
     kb_week_days,
@@ -60,12 +58,12 @@ barber_schedule = Router()
 
 
 @barber_schedule.message(F.text.in_(['📅 Jadvalim', '📅 Мое расписание']))
-async def get_requests(message: Message, state: FSMContext):
+async def get_requests(message: Message, state: FSMContext, identity: Optional[Identity] = None):
     telegram_id = message.from_user.id
 
     async with AsyncSessionLocal() as session:
-        user, barber, lang = await get_user_and_barber(session, telegram_id)
-        if not user:
+        who, barber, lang = await get_user_and_barber(session, telegram_id, identity)
+        if not who:
             await message.answer(
                 "❌ Пользователь не найден." if (lang or "").startswith("ru") else "❌ Foydalanuvchi topilmadi.")
             return
@@ -74,32 +72,11 @@ async def get_requests(message: Message, state: FSMContext):
             return
 
         today = datetime.now().date()
-        ru = (lang or "").startswith("ru")
-
-        todays_requests = await fetch_requests_for_day(session, barber.id, today)
-        if not todays_requests:
-            header = f"📅 {'Сегодня' if ru else 'Bugungi kun'}: {today:%Y-%m-%d}"
-            body = "На сегодня заявок нет." if ru else "Bugun uchun so‘rovlar yo‘q."
-            initial_text = f"{header}\n\n{body}"
-        else:
-            blocks = [render_request_block(cr, lang) for cr in todays_requests]
-            day_total_price = sum(_final_price(cr) for cr in todays_requests)
-            day_total_minutes = sum(calc_request_totals(cr)[1] for cr in todays_requests)
-            tm_txt = _fmt_duration_minutes_ru(day_total_minutes) if ru else _fmt_duration_minutes(day_total_minutes)
-
-            icon, pct, _, _ = await _day_occupancy_stats(session, barber.id, today)
-            pct_txt = f" {pct}%" if pct is not None else ""
-            header = f"{icon}{pct_txt} {'Сегодня' if ru else 'Bugungi kun'}: {today:%Y-%m-%d}"
-
-            unique_clients_today = len(
-                {getattr(cr, "client_id", None) for cr in todays_requests if getattr(cr, "client_id", None)})
-            clients_word = "клиентов" if ru else "mijoz"
-            footer = (
-                f"\n—\nИтого за день: {_fmt_money(day_total_price)} сум • 👥 {unique_clients_today} {clients_word} • ⏳ {tm_txt}"
-                if ru else
-                f"\n—\nKun bo‘yicha jami: {_fmt_money(day_total_price)} so‘m • 👥 {unique_clients_today} {clients_word} • ⏳ {tm_txt}"
-            )
-            initial_text = header + "\n\n" + "\n\n".join(blocks) + footer
+        today_sid = await today_schedule_id(session, barber.id, today)
+        summary = await get_day_summary(
+            session, message.bot.redis, barber.id, today_sid, today, lang, view=VIEW_TODAY
+        )
+        initial_text = summary.text
 
         curr_mon, _ = week_bounds(today)
         week_kb = await kb_week_days(session, barber.id, curr_mon, lang)
@@ -107,7 +84,7 @@ async def get_requests(message: Message, state: FSMContext):
 
 
 @barber_schedule.callback_query(F.data.startswith("sched:week:"))
-async def on_sched_week(cb: CallbackQuery, state: FSMContext):
+async def on_sched_week(cb: CallbackQuery, state: FSMContext, identity: Optional[Identity] = None):
     try:
         _, _, monday_str = cb.data.split(":", 2)
         monday = datetime.strptime(monday_str, "%Y-%m-%d").date()
@@ -116,7 +93,7 @@ async def on_sched_week(cb: CallbackQuery, state: FSMContext):
         return
 
     async with AsyncSessionLocal() as session:
-        user, barber, lang = await get_user_and_barber(session, cb.from_user.id)
+        who, barber, lang = await get_user_and_barber(session, cb.from_user.id, identity)
         if not barber:
             await cb.answer("Barber not found", show_alert=True)
             return
@@ -131,10 +108,10 @@ async def on_sched_week(cb: CallbackQuery, state: FSMContext):
 
 
 @barber_schedule.callback_query(DayBySidCB.filter())
-async def on_sched_day_by_sid(cb: CallbackQuery, callback_data: DayBySidCB, state: FSMContext):
+async def on_sched_day_by_sid(cb: CallbackQuery, callback_data: DayBySidCB, state: FSMContext, identity: Optional[Identity] = None):
     sched_id = int(callback_data.sid)
     async with AsyncSessionLocal() as session:
-        user, barber, lang = await get_user_and_barber(session, cb.from_user.id)
+        who, barber, lang = await get_user_and_barber(session, cb.from_user.id, identity)
         if not barber:
             await cb.answer("Barber not found", show_alert=True)
             return
@@ -148,35 +125,16 @@ async def on_sched_day_by_sid(cb: CallbackQuery, callback_data: DayBySidCB, stat
         the_day = sched.day.date()
         ru = (lang or "").startswith("ru")
 
-        icon, pct, _, _ = await _sched_occupancy_stats(session, barber.id, sched_id, the_day)
-
-        pct_txt = f" {pct}%" if pct is not None else ""
-        header = f"{icon}{pct_txt} {'День' if ru else 'Kun'}: {the_day:%Y-%m-%d}"
-        reqs = await fetch_requests_for_schedule(session, barber.id, sched_id)
-        if not reqs:
-            body = "На этот день заявок нет." if ru else "Bu kunda so‘rovlar yo‘q."
-            text = f"{header}\n\n{body}"
-        else:
-            blocks = [render_request_block(cr, lang) for cr in reqs]
-            total_price = sum(_final_price(cr) for cr in reqs)
-            total_minutes = sum(calc_request_totals(cr)[1] for cr in reqs)
-            unique_clients = len({getattr(cr, "client_id", None) for cr in reqs if getattr(cr, "client_id", None)})
-            tm_txt = _fmt_duration_minutes_ru(total_minutes) if ru else _fmt_duration_minutes(total_minutes)
-            clients_word = "клиентов" if ru else "mijoz"
-            footer = (
-                f"\n—\nИтого: {_fmt_money(total_price)} сум • 👥 {unique_clients} {clients_word} • ⏳ {tm_txt}"
-                if ru else
-                f"\n—\nJami: {_fmt_money(total_price)} so‘m • 👥 {unique_clients} {clients_word} • ⏳ {tm_txt}"
-            )
-            text = header + "\n\n" + "\n\n".join(blocks) + footer
+        summary = await get_day_summary(session, cb.bot.redis, barber.id, sched_id, the_day, lang)
+        text = summary.text
 
         # slot keyboard (30-minute slots) still date-based
-        slots_kb = await kb_day_slots_by_sched(session, barber.id, sched_id, slot_minutes=30)
+        slots_kb = await kb_day_slots_by_sched(session, barber.id, sched_id, slot_minutes=30, redis=cb.bot.redis)
 
         # add "Requests" opener using schedule id with pagination start page=1
         title_req = "Заявки" if ru else "So'rovlar"
         req_btn = InlineKeyboardButton(
-            text=f"📋 {title_req} ({len(reqs)})",
+            text=f"📋 {title_req} ({summary.n_requests})",
             callback_data=SchedListCB(sid=sched_id, page=1).pack()
         )
         slots_kb = InlineKeyboardMarkup(inline_keyboard=[[req_btn]] + list(slots_kb.inline_keyboard or []))
@@ -189,12 +147,12 @@ async def on_sched_day_by_sid(cb: CallbackQuery, callback_data: DayBySidCB, stat
 
 
 @barber_schedule.callback_query(SchedListCB.filter())
-async def on_req_list_by_sid(cb: CallbackQuery, callback_data: SchedListCB, state: FSMContext):
+async def on_req_list_by_sid(cb: CallbackQuery, callback_data: SchedListCB, state: FSMContext, identity: Optional[Identity] = None):
     sched_id = int(callback_data.sid)
     page = int(callback_data.page)
 
     async with AsyncSessionLocal() as session:
-        user, barber, lang = await get_user_and_barber(session, cb.from_user.id)
+        who, barber, lang = await get_user_and_barber(session, cb.from_user.id, identity)
         if not barber:
             await cb.answer("Barber not found", show_alert=True)
             return
@@ -209,13 +167,13 @@ async def on_req_list_by_sid(cb: CallbackQuery, callback_data: SchedListCB, stat
 
 # ---- OPEN REQUEST (ro:)
 @barber_schedule.callback_query(ReqOpenCB.filter())
-async def on_req_open(cb: CallbackQuery, callback_data: ReqOpenCB, state: FSMContext):
+async def on_req_open(cb: CallbackQuery, callback_data: ReqOpenCB, state: FSMContext, identity: Optional[Identity] = None):
     req_id = int(callback_data.req_id)
     sched_id = int(callback_data.sid)
     page = int(callback_data.page)
 
     async with AsyncSessionLocal() as session:
-        user, barber, lang = await get_user_and_barber(session, cb.from_user.id)
+        who, barber, lang = await get_user_and_barber(session, cb.from_user.id, identity)
         if not barber:
             await cb.answer("Barber not found", show_alert=True)
             return
@@ -238,7 +196,7 @@ async def on_req_open(cb: CallbackQuery, callback_data: ReqOpenCB, state: FSMCon
 # ---- STATUS CHANGE (rs:)
 # ---- Status handler that USES the parsed CallbackData ----
 @barber_schedule.callback_query(ReqStatusCB.filter())
-async def on_req_status(cb: CallbackQuery, callback_data: ReqStatusCB, state: FSMContext):
+async def on_req_status(cb: CallbackQuery, callback_data: ReqStatusCB, state: FSMContext, identity: Optional[Identity] = None):
     req_id = int(callback_data.req_id)
     sched_id = int(callback_data.sid)
     action = (callback_data.action or "").lower()
@@ -249,7 +207,7 @@ async def on_req_status(cb: CallbackQuery, callback_data: ReqStatusCB, state: FS
         return
 
     async with AsyncSessionLocal() as session:
-        user, barber, lang = await get_user_and_barber(session, cb.from_user.id)
+        who, barber, lang = await get_user_and_barber(session, cb.from_user.id, identity)
         if not barber:
             await cb.answer("Barber not found", show_alert=True)
             return
@@ -265,15 +223,7 @@ async def on_req_status(cb: CallbackQuery, callback_data: ReqStatusCB, state: FS
                     ClientRequest.barber_id == barber.id
                 )
             )
-            .options(
-                selectinload(ClientRequest.services)
-                .selectinload(ClientRequestService.barber_service)
-                .selectinload(BarberService.service),
-                selectinload(ClientRequest.client),
-                selectinload(ClientRequest.barber),
-                selectinload(ClientRequest.scores),
-                selectinload(ClientRequest.schedule_details),
-            )
+            .options(*loader("request_render"))
             .with_for_update()  # ✅ Lock the row
         )
 
@@ -330,23 +280,29 @@ async def on_req_status(cb: CallbackQuery, callback_data: ReqStatusCB, state: FS
 
                 if has_conflict:
                     msg = (
-                        "❌ Это время уже занято! Другой запрос уже принят."
+                        "❌ Это время уже занято другим запросом!"
                         if ru
-                        else "❌ Bu vaqt oralig'i band! Boshqa so'rov allaqachon qabul qilingan."
+                        else "❌ Bu vaqt oralig'i boshqa so'rov bilan band!"
                     )
                     await cb.answer(msg, show_alert=True)
                     return
 
         # Update status
         cr.status = "accept" if action == "accept" else "deny"
-        await session.flush()
-
-        # Recompute schedule aggregates and commit
-        await recalc_schedule_stats(session, sched_id)
-        await session.commit()
+        try:
+            await session.commit()  # schedule totals follow via the flush hook
+        except IntegrityError as e:
+            # a denied request brought back over a booking made since
+            if not is_slot_conflict(e):
+                raise
+            await session.rollback()
+            await cb.answer(slot_taken_text(lang), show_alert=True)
+            return
+        await invalidate_availability(cb.bot.redis, sched_id, cr.barber_schedule_id)
+        await invalidate_day_summaries(cb.bot.redis, summary_ref(cr))
 
-        # Reload cr to ensure all relationships are fresh after commit
-        await session.refresh(cr)
+        # Reload cr with its render shape (refresh() would drop the eager relationships)
+        cr = await load_request_full(session, barber.id, req_id)
 
         # Render updated view
         text = "🧾 " + render_request_block(cr, lang)
@@ -367,13 +323,13 @@ async def on_req_status(cb: CallbackQuery, callback_data: ReqStatusCB, state: FS
 
 
 @barber_schedule.callback_query(ReqDiscountCB.filter())
-async def on_req_discount(cb: CallbackQuery, callback_data: ReqDiscountCB, state: FSMContext):
+async def on_req_discount(cb: CallbackQuery, callback_data: ReqDiscountCB, state: FSMContext, identity: Optional[Identity] = None):
     req_id = int(callback_data.req_id)
     sched_id = int(callback_data.sid)
     page = int(callback_data.page)
 
     async with AsyncSessionLocal() as session:
-        user, barber, lang = await get_user_and_barber(session, cb.from_user.id)
+        who, barber, lang = await get_user_and_barber(session, cb.from_user.id, identity)
         if not barber:
             await cb.answer("Barber not found", show_alert=True)
             return
@@ -394,13 +350,13 @@ async def on_req_discount(cb: CallbackQuery, callback_data: ReqDiscountCB, state
 
 
 @barber_schedule.message(EditReqStates.waiting_for_discount)
-async def on_discount_input(message: Message, state: FSMContext):
+async def on_discount_input(message: Message, state: FSMContext, identity: Optional[Identity] = None):
     data = await state.get_data()
     req_id = int(data["discount_req_id"])
     sched_id = int(data["discount_sid"])
 
     async with AsyncSessionLocal() as session:
-        user, barber, lang = await get_user_and_barber(session, message.from_user.id)
+        who, barber, lang = await get_user_and_barber(session, message.from_user.id, identity)
         ru = _is_ru(lang)
         if not barber:
             await message.reply("Барбер не найден." if ru else "Sartarosh topilmadi.")
@@ -435,29 +391,17 @@ async def on_discount_input(message: Message, state: FSMContext):
             # keep FSM state so they can enter again
             return
 
-        # 3) Write discount & commit
+        # 3) Write discount & commit (schedule income follows via the flush hook)
         cr.discount = disc_amt
         await session.commit()
 
-        # 4) Recompute schedule totals (final prices) and client count
-        #    Use accepted requests attached to this schedule
-        reqs_sched = await fetch_requests_for_schedule(session, barber.id, sched_id)
-        total_income = sum(_final_price(r) for r in reqs_sched)
-        n_clients = len({getattr(r, "client_id", None) for r in reqs_sched if getattr(r, "client_id", None)})
-
-        sched = await session.get(BarberSchedule, sched_id)
-        if sched and sched.barber_id == barber.id:
-            sched.total_income = int(total_income)
-            sched.n_clients = int(n_clients)
-            await session.commit()
-
-        # 5) Reload request fully for rendering (avoid lazy loads)
+        # 4) Reload request fully for rendering (avoid lazy loads)
         cr = await load_request_full(session, barber.id, req_id)
 
         text = "🧾 " + render_request_block(cr, lang)
         kb = kb_request_manage(cr.id, sched_id, lang, getattr(cr, "status", None), page=1)
-        await recalc_schedule_stats(session, barber.id)
-        await session.commit()
+        # totals in the rendered day summary changed
+        await invalidate_day_summaries(message.bot.redis, summary_ref(cr))
 
     await state.clear()
     ok = "Скидка обновлена." if ru else "Chegirma yangilandi."
@@ -467,13 +411,13 @@ async def on_discount_input(message: Message, state: FSMContext):
 
 # ---- ADD SERVICE LIST (ra:)
 @barber_schedule.callback_query(ReqAddSvcCB.filter())
-async def on_req_addsvc(cb: CallbackQuery, callback_data: ReqAddSvcCB, state: FSMContext):
+async def on_req_addsvc(cb: CallbackQuery, callback_data: ReqAddSvcCB, state: FSMContext, identity: Optional[Identity] = None):
     req_id = int(callback_data.req_id)
     sched_id = int(callback_data.sid)
     page = int(callback_data.page)
 
     async with AsyncSessionLocal() as session:
-        user, barber, lang = await get_user_and_barber(session, cb.from_user.id)
+        who, barber, lang = await get_user_and_barber(session, cb.from_user.id, identity)
         if not barber:
             await cb.answer("Barber not found", show_alert=True)
             return
@@ -494,14 +438,14 @@ async def on_req_addsvc(cb: CallbackQuery, callback_data: ReqAddSvcCB, state: FS
 
 
 @barber_schedule.callback_query(ReqAddSvcPickCB.filter())
-async def on_req_addsvc_pick(cb: CallbackQuery, callback_data: ReqAddSvcPickCB, state: FSMContext):
+async def on_req_addsvc_pick(cb: CallbackQuery, callback_data: ReqAddSvcPickCB, state: FSMContext, identity: Optional[Identity] = None):
     req_id = int(callback_data.req_id)
     sched_id = int(callback_data.sid)
     bs_id = int(callback_data.bs_id)
     page = int(callback_data.page)
 
     async with AsyncSessionLocal() as session:
-        user, barber, lang = await get_user_and_barber(session, cb.from_user.id)
+        who, barber, lang = await get_user_and_barber(session, cb.from_user.id, identity)
         ru = _is_ru(lang)
         if not barber:
             await cb.answer("Barber not found", show_alert=True)
@@ -540,6 +484,7 @@ async def on_req_addsvc_pick(cb: CallbackQuery, callback_data: ReqAddSvcPickCB,
                 client_request_id=cr.id,
                 barber_service_id=bs.id,
                 duration=int(bs.duration),
+                price=int(bs.price),
                 status=True,
             ))
             action = "added"
@@ -585,9 +530,19 @@ async def on_req_addsvc_pick(cb: CallbackQuery, callback_data: ReqAddSvcPickCB,
             if total_minutes == 0:
                 cr.to_time = None
 
-        await recalc_schedule_stats(session, sched_id)
-
-        await session.commit()
+        req_sched_id = cr.barber_schedule_id
+        ref = summary_ref(cr)
+        try:
+            await session.commit()
+        except IntegrityError as e:
+            # the longer booking now overlaps another one
+            if not is_slot_conflict(e):
+                raise
+            await session.rollback()
+            await cb.answer(slot_taken_text(lang), show_alert=True)
+            return
+        await invalidate_availability(cb.bot.redis, sched_id, req_sched_id)
+        await invalidate_day_summaries(cb.bot.redis, ref)
 
         # Rebuild page keyboard
         kb = await kb_add_service_list(session, barber.id, req_id, sched_id, lang, page)
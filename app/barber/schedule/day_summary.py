@@ -0,0 +1,182 @@
+"""
+Rendered day summaries for the barber "My schedule" screens.
+
+The text of a day (occupancy header, one block per accepted request, totals
+footer) is cached in Redis under the same selection its rows come from:
+
+    daysum:sched:{sched_id}:{ru|uz}                 day view: requests of one schedule
+    daysum:day:{barber_id}:{YYYY-MM-DD}:{ru|uz}     today view: the barber's requests by date
+
+each holding {"text": ..., "n": <requests>}, so opening the same day again is
+one GET. Writers drop the entries a request shows up in with
+invalidate_day_summaries(redis, summary_ref(cr)) after committing; a request
+that moves passes the ref taken before the change too. Working hours/days
+changes drop every upcoming day of the barber (invalidate_barber_day_summaries).
+"""
+import json
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select
+
+from app.barber.models import BarberSchedule
+from app.barber.utils import _is_ru
+from app.barber.schedule.schedule_utils import (
+    fetch_requests_for_day,
+    fetch_requests_for_schedule,
+    _sched_occupancy_stats,
+    _day_occupancy_stats,
+    _fmt_money,
+    _fmt_duration_minutes,
+    _fmt_duration_minutes_ru,
+    calc_request_totals,
+    render_request_block,
+)
+
+logger = logging.getLogger(__name__)
+
+DAY_SUMMARY_TTL = 6 * 60 * 60  # safety net; writers invalidate
+VIEW_TODAY = "today"  # "📅 My schedule" (requests by date)
+VIEW_DAY = "day"  # a day picked from the week keyboard (requests by schedule)
+_VIEWS = (VIEW_TODAY, VIEW_DAY)
+_LANGS = ("ru", "uz")
+
+
+class DaySummary(NamedTuple):
+    text: str
+    n_requests: int
+
+
+class SummaryRef(NamedTuple):
+    """The cached summaries one request appears in: its schedule's day and its barber's date."""
+    barber_id: Optional[int]
+    sched_id: Optional[int]
+    day: Optional[date]
+
+
+def summary_ref(cr) -> SummaryRef:
+    when = cr.from_time or cr.date  # ClientRequest.day without loading the deferred column
+    return SummaryRef(cr.barber_id, cr.barber_schedule_id, when.date() if when else None)
+
+
+def _summary_key(view: str, ref: SummaryRef, lang: str) -> Optional[str]:
+    if view == VIEW_TODAY:
+        if ref.barber_id and ref.day:
+            return f"daysum:day:{ref.barber_id}:{ref.day:%Y-%m-%d}:{lang}"
+    elif ref.sched_id:
+        return f"daysum:sched:{ref.sched_id}:{lang}"
+    return None
+
+
+def day_summary_keys(*refs: SummaryRef) -> list:
+    """Every cached summary (both views, all languages) the refs appear in."""
+    keys = (_summary_key(v, ref, l) for ref in refs for v in _VIEWS for l in _LANGS)
+    return list(dict.fromkeys(k for k in keys if k))
+
+
+async def invalidate_day_summaries(redis, *refs: SummaryRef) -> None:
+    keys = day_summary_keys(*refs)
+    if redis is None or not keys:
+        return
+    try:
+        await redis.delete(*keys)
+    except Exception as e:
+        logger.warning("day summary cache invalidate failed for %s: %s", keys, e)
+
+
+async def invalidate_barber_day_summaries(session, redis, barber_id: int) -> None:
+    """Working hours/days changed → drop the summaries of every upcoming schedule of the barber."""
+    if redis is None:
+        return
+    today = datetime.combine(datetime.now().date(), time(0, 0))
+    rows = (await session.execute(
+        select(BarberSchedule.id, BarberSchedule.day)
+        .where(BarberSchedule.barber_id == barber_id, BarberSchedule.day >= today)
+    )).all()
+    await invalidate_day_summaries(redis, *(SummaryRef(barber_id, sid, day.date()) for sid, day in rows))
+
+
+async def today_schedule_id(session, barber_id: int, today: date) -> Optional[int]:
+    start = datetime.combine(today, time(0, 0))
+    return (await session.execute(
+        select(BarberSchedule.id)
+        .where(
+            BarberSchedule.barber_id == barber_id,
+            BarberSchedule.day >= start,
+            BarberSchedule.day < start + timedelta(days=1),
+        )
+        .limit(1)
+    )).scalar_one_or_none()
+
+
+async def get_day_summary(session, redis, barber_id: int, sched_id: Optional[int], the_day: date,
+                          lang: str, view: str = VIEW_DAY) -> DaySummary:
+    lang = "ru" if _is_ru(lang) else "uz"
+    # no schedule yet: not cached, creating one does not go through the writers below
+    key = _summary_key(view, SummaryRef(barber_id, sched_id, the_day), lang) if sched_id else None
+
+    if redis is not None and key:
+        try:
+            raw = await redis.get(key)
+            if raw:
+                data = json.loads(raw)
+                return DaySummary(data["text"], data["n"])
+        except Exception as e:
+            logger.warning("day summary cache read failed for %s: %s", key, e)
+
+    summary = await _render_day_summary(session, barber_id, sched_id, the_day, lang, view)
+    if redis is not None and key:
+        try:
+            await redis.set(key, json.dumps({"text": summary.text, "n": summary.n_requests}),
+                            ex=DAY_SUMMARY_TTL)
+        except Exception as e:
+            logger.warning("day summary cache write failed for %s: %s", key, e)
+    return summary
+
+
+async def _render_day_summary(session, barber_id: int, sched_id: Optional[int], the_day: date,
+                              lang: str, view: str) -> DaySummary:
+    ru = lang == "ru"
+    today_view = view == VIEW_TODAY
+    day_word = ("Сегодня" if ru else "Bugungi kun") if today_view else ("День" if ru else "Kun")
+
+    if today_view:
+        reqs = await fetch_requests_for_day(session, barber_id, the_day)
+        if not reqs:
+            body = "На сегодня заявок нет." if ru else "Bugun uchun so‘rovlar yo‘q."
+            return DaySummary(f"📅 {day_word}: {the_day:%Y-%m-%d}\n\n{body}", 0)
+        icon, pct, _, _ = await _day_occupancy_stats(session, barber_id, the_day)
+    else:
+        icon, pct, _, _ = await _sched_occupancy_stats(session, barber_id, sched_id, the_day)
+        reqs = await fetch_requests_for_schedule(session, barber_id, sched_id)
+
+    pct_txt = f" {pct}%" if pct is not None else ""
+    header = f"{icon}{pct_txt} {day_word}: {the_day:%Y-%m-%d}"
+    if not reqs:
+        body = "На этот день заявок нет." if ru else "Bu kunda so‘rovlar yo‘q."
+        return DaySummary(f"{header}\n\n{body}", 0)
+
+    # one pass: totals are computed once per request and reused by the block
+    blocks = []
+    total_price = 0
+    total_minutes = 0
+    clients = set()
+    for cr in reqs:
+        totals = calc_request_totals(cr)
+        subtotal, minutes = totals
+        total_price += max(subtotal - int(getattr(cr, "discount", 0) or 0), 0)
+        total_minutes += minutes
+        if getattr(cr, "client_id", None):
+            clients.add(cr.client_id)
+        blocks.append(render_request_block(cr, lang, totals=totals))
+
+    tm_txt = _fmt_duration_minutes_ru(total_minutes) if ru else _fmt_duration_minutes(total_minutes)
+    clients_word = "клиентов" if ru else "mijoz"
+    if today_view:
+        label = "Итого за день" if ru else "Kun bo‘yicha jami"
+    else:
+        label = "Итого" if ru else "Jami"
+    currency = "сум" if ru else "so‘m"
+    footer = f"\n—\n{label}: {_fmt_money(total_price)} {currency} • 👥 {len(clients)} {clients_word} • ⏳ {tm_txt}"
+    return DaySummary(header + "\n\n" + "\n\n".join(blocks) + footer, len(reqs))
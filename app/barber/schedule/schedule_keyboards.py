@@ -1,14 +1,14 @@
-from app.barber.models import BarberSchedule, BarberService, BarberWorkingDays
-from datetime import datetime, time, timedelta
-from typing import List, Optional, Tuple
+from app.barber.models import BarberService
+from datetime import timedelta
+from typing import List, Optional
 from app.client.models import ClientRequestService
 
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from app.barber.schedule.schedule_utils import _weekday_idx_from_name, _working_time_windows, \
-    fetch_requests_for_schedule, \
-    _service_name, _overlaps, _week_by_monday, _sched_occupancy_stats, _fmt_money, _req_title, \
-    _ensure_schedules_for_week, UZ_NAMES, RU_NAMES
+from app.barber.schedule.schedule_utils import fetch_requests_for_schedule, \
+    _service_name, _week_by_monday, occupancy_for_range, _fmt_money, _req_title, \
+    _ensure_schedules_for_week
 from app.barber.utils import _is_ru
+from app.barber.schedule.availability import get_day_availability, minutes_to_time
 
 from app.barber.schedule.callback_data import SchedPickSlotCBForBarber, ReqOpenCB, SchedListCB, ReqAddSvcPickCB, \
     ReqAddSvcCB, ReqStatusCB, \
@@ -24,38 +24,23 @@ async def kb_day_slots_by_sched(
         barber_id: int,
         sched_id: int,
         slot_minutes: int = 30,
+        redis=None,
 ) -> InlineKeyboardMarkup:
-    # Load schedule → get its calendar date for working windows
-    sched = await session.get(BarberSchedule, sched_id)
-    if not sched or sched.barber_id != barber_id or not sched.day:
+    # Working windows + busy minutes come from the availability cache
+    avail = await get_day_availability(session, redis, sched_id, barber_id)
+    if not avail:
         return InlineKeyboardMarkup(inline_keyboard=[[
             InlineKeyboardButton(text="⚪️ Off", callback_data="noop")
         ]])
 
-    the_day = sched.day.date()
+    the_day = avail.day
 
-    windows = await _working_time_windows(session, barber_id, the_day)
-
-    # ⬇️ IMPORTANT: requests by SCHEDULE, not by date
-    reqs = await fetch_requests_for_schedule(session, barber_id, sched_id)
-
-    # Build busy intervals using only HH:MM
-    busy: List[Tuple[time, time]] = []
-    for cr in reqs:
-        ft, tt = getattr(cr, "from_time", None), getattr(cr, "to_time", None)
-        if ft and tt and ft < tt:
-            busy.append((ft.time(), tt.time()))
     # Build slot buttons
     buttons: List[InlineKeyboardButton] = []
-    for (w_start, w_end) in windows:
-        cur = datetime.combine(the_day, w_start)
-        end_dt = datetime.combine(the_day, w_end)
-
+    for (w_start, w_end), slots in avail.slot_grid(slot_minutes):
         # clickable slots (e.g., 08:00..22:30 for 30-min slots)
-        while cur + timedelta(minutes=slot_minutes) <= end_dt:
-            s = cur.time()
-            e = (cur + timedelta(minutes=slot_minutes)).time()
-            free = all(not _overlaps(s, e, b1, b2) for (b1, b2) in busy)
+        for start_min, free in slots:
+            s = minutes_to_time(start_min)
             buttons.append(InlineKeyboardButton(
                 text=("🟢 " if free else "🔴 ") + s.strftime("%H:%M"),
                 callback_data=SchedPickSlotCBForBarber(
@@ -63,13 +48,10 @@ async def kb_day_slots_by_sched(
                     hm=s.strftime("%H%M"),
                 ).pack() if free else "noop",
             ))
-            cur += timedelta(minutes=slot_minutes)
 
-        # ⭐ Add an end tick (23:00) colored by the last slot's availability
-        last_start = (end_dt - timedelta(minutes=slot_minutes)).time()
-        last_free = all(not _overlaps(last_start, end_dt.time(), b1, b2) for (b1, b2) in busy)
+        # ⭐ Add an end tick (23:00)
         buttons.append(InlineKeyboardButton(
-            text="🔴 " + end_dt.strftime("%H:%M"),
+            text="🔴 " + minutes_to_time(w_end).strftime("%H:%M"),
             callback_data="noop",
         ))
 
@@ -96,25 +78,14 @@ async def kb_week_days(
     Week keyboard using BarberSchedule aggregates and schedule-id callbacks.
     Only shows working days (BarberWorkingDays.is_working=True).
     """
-    # working weekdays
-    wd_rows = (await session.execute(
-        select(BarberWorkingDays.name_uz, BarberWorkingDays.name_ru, BarberWorkingDays.is_working)
-        .where(BarberWorkingDays.barber_id == barber_id,
-               BarberWorkingDays.is_working.is_(True))
-    )).all()
-    working_idxs: set[int] = set()
-    for name_uz, name_ru, _ in wd_rows:
-        idx = _weekday_idx_from_name(name_uz) or _weekday_idx_from_name(name_ru)
-        if idx is not None:
-            working_idxs.add(idx)
-
     days = _week_by_monday(monday)
-    ru = (lang or "").lower().startswith("ru")
-    names = RU_NAMES if ru else UZ_NAMES
 
     # ensure schedule rows exist for the week so we can always use sid
     sched_map = await _ensure_schedules_for_week(session, barber_id, days)
 
+    # one aggregate query for the whole week (working flag + occupancy)
+    occ_by_sid = await occupancy_for_range(session, barber_id, days[0], days[-1])
+
     prev_mon = monday - timedelta(days=7)
     next_mon = monday + timedelta(days=7)
     kb_rows = [[
@@ -122,26 +93,17 @@ async def kb_week_days(
         InlineKeyboardButton(text="▶️", callback_data=f"sched:week:{next_mon:%Y-%m-%d}"),
     ]]
 
-    # inside kb_week_days(..):
-
     for d in days:
-        if d.weekday() not in working_idxs:
-            continue
-
         sched = sched_map.get(d)
-        sid = sched.id
-        n_clients = int(sched.n_clients or 0)
-        income = int(sched.total_income or 0)
-
-        # ⬇️ use schedule-based occupancy
-        icon, pct, _booked, _total = await _sched_occupancy_stats(session, barber_id, sid, d)
-        pct_txt = f" {pct}%" if pct is not None else ""
+        occ = occ_by_sid.get(sched.id) if sched else None
+        if not occ or occ.is_working is not True:
+            continue
 
-        idx = d.weekday()
-        btn_text = f"{icon}{pct_txt} {d:%m-%d} • 👥{n_clients} • 💰{_fmt_money(income)}"
+        pct_txt = f" {occ.pct}%" if occ.pct is not None else ""
+        btn_text = f"{occ.icon}{pct_txt} {d:%m-%d} • 👥{occ.n_clients} • 💰{_fmt_money(occ.total_income)}"
         kb_rows.append([InlineKeyboardButton(
             text=btn_text,
-            callback_data=DayBySidCB(sid=sid).pack()
+            callback_data=DayBySidCB(sid=sched.id).pack()
         )])
 
     return InlineKeyboardMarkup(inline_keyboard=kb_rows)
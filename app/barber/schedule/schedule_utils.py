@@ -1,17 +1,15 @@
 from datetime import date, datetime, time, timedelta
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, NamedTuple
 from app.barber.models import (
     Barber,
     BarberWorkingDays,
-    BarberService,
     BarberSchedule
 )
-from app.client.models import ClientRequest, ClientRequestService, Client
-from sqlalchemy import select, func, cast, Date, and_, or_, distinct
-from sqlalchemy.orm import selectinload
+from app.client.models import ClientRequest
+from sqlalchemy import select, func, cast, Integer, and_, or_, distinct, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.loaders import loader
 from app.barber.utils import _is_ru, _t, _fmt_d
-from sqlalchemy import and_, cast, Time
-from datetime import time as dtime
 
 _UZ2IDX = {
     "dushanba": 0, "seshanba": 1, "chorshanba": 2, "payshanba": 3,
@@ -37,50 +35,33 @@ async def fetch_requests_for_day(
 ) -> list["ClientRequest"]:
     """
     Fetch accepted requests for 'the_day'.
-    - Day filter uses DATE(...) = the_day.
-    - Time filter uses TIME(...) overlap with [hm_start, hm_end) OR any of 'windows'.
+    - Day filter is ClientRequest.day == the_day (from_time's date, else date's).
+    - Time filter is a minute-of-day overlap with [hm_start, hm_end) OR any of 'windows'.
       If both hm_* and windows are None -> no time-of-day filter (only date filter).
+    All predicates are plain comparisons on stored columns: one range scan of
+    (barber_id, status, day, from_minute).
     """
-
-    # ---- date filter (same as before)
-    day_filter = or_(
-        and_(
-            ClientRequest.from_time.is_not(None),
-            cast(ClientRequest.from_time, Date) == the_day,
-        ),
-        and_(
-            ClientRequest.from_time.is_(None),
-            ClientRequest.date.is_not(None),
-            cast(ClientRequest.date, Date) == the_day,
-        ),
-    )
-
-    # ---- time-of-day expressions (ignore Y/M/D)
-    ft_tm = cast(ClientRequest.from_time, Time)  # TIME(from_time)
-    tt_tm = cast(ClientRequest.to_time, Time)  # TIME(to_time)
-    dt_tm = cast(ClientRequest.date, Time)  # TIME(date) usually 00:00
-    zero_tm = dtime(0, 0)
-
     # Fallback "end" when to_time is NULL → treat as from_time (instant) else 00:00
-    eff_end = func.coalesce(tt_tm, ft_tm, zero_tm)
+    eff_end = func.coalesce(ClientRequest.to_minute, ClientRequest.from_minute, 0)
 
     # Build time filter(s) only if requested
     time_filter = None
     if windows and len(windows) > 0:
-        # overlap with ANY window: (ft < w_end) AND (eff_end > w_start)
+        # overlap with ANY window: (start < w_end) AND (end > w_start)
         per_window = [
-            and_(ft_tm < w_end, eff_end > w_start) for (w_start, w_end) in windows
+            and_(ClientRequest.from_minute < _hm_minutes(w_end), eff_end > _hm_minutes(w_start))
+            for (w_start, w_end) in windows
         ]
         time_filter = or_(*per_window)
 
     elif hm_start is not None and hm_end is not None:
-        time_filter = and_(ft_tm < hm_end, eff_end > hm_start)
+        time_filter = and_(ClientRequest.from_minute < _hm_minutes(hm_end), eff_end > _hm_minutes(hm_start))
 
     # Final WHERE parts
     where_parts = [
         ClientRequest.barber_id == barber_id,
         ClientRequest.status == "accept",
-        day_filter,
+        ClientRequest.day == the_day,
     ]
     if time_filter is not None:
         where_parts.append(time_filter)
@@ -88,45 +69,23 @@ async def fetch_requests_for_day(
     q = (
         select(ClientRequest)
         .where(*where_parts)
-        .options(
-            selectinload(ClientRequest.client).selectinload(Client.user),
-            selectinload(ClientRequest.services)
-            .selectinload(ClientRequestService.barber_service)
-            .selectinload(BarberService.service),
-        )
+        .options(*loader("request_render"))
         .order_by(
-            func.coalesce(ft_tm, dt_tm, zero_tm).asc(),  # order by HH:MM only
+            # all rows share the day, so timestamp order is HH:MM order
+            func.coalesce(ClientRequest.from_time, ClientRequest.date).asc(),
             ClientRequest.id.asc(),
         )
     )
     return (await session.execute(q)).scalars().all()
 
 
-async def _booked_minutes_for_schedule(
-        session, barber_id: int, sched_id: int, day: date
-) -> int:
-    # use schedule-scoped requests (already eager)
-    reqs = await fetch_requests_for_schedule(session, barber_id, sched_id)
-    windows = await _working_time_windows(session, barber_id, day)
-    total = 0
-    for cr in reqs:
-        ft, tt = getattr(cr, "from_time", None), getattr(cr, "to_time", None)
-        if not (ft and tt and ft < tt):
-            continue
-        ft_t, tt_t = ft.time(), tt.time()
-        for ws, we in windows:
-            total += _interval_overlap_minutes(ws, we, ft_t, tt_t)
-    return total
-
-
 async def _sched_occupancy_stats(
         session, barber_id: int, sched_id: int, day: date
 ) -> tuple[str, Optional[int], int, int]:
-    # working minutes come from the barber’s daily windows
-    total = await _total_work_minutes_for_day(session, barber_id, day)
-    booked = await _booked_minutes_for_schedule(session, barber_id, sched_id, day)
-    icon, pct = _occ_icon(booked, total)
-    return icon, pct, booked, total
+    occ = (await occupancy_for_range(session, barber_id, day, day)).get(sched_id)
+    if not occ:
+        return "⚪️", None, 0, 0
+    return occ.icon, occ.pct, occ.booked, occ.total
 
 
 async def _ensure_req_linked_to_sched(session, req: ClientRequest, sched_id: int) -> None:
@@ -136,32 +95,6 @@ async def _ensure_req_linked_to_sched(session, req: ClientRequest, sched_id: int
         await session.flush()  # no commit yet
 
 
-async def recompute_schedule_totals(session, barber_id: int, sched_id: int) -> None:
-    """
-    total_income = sum(max(sum(service.price) - discount, 0))
-    n_clients    = count(distinct client_id)
-    for all ACCEPTED requests on this schedule.
-    """
-    # read accepted requests with services
-    reqs = await fetch_requests_for_schedule(session, barber_id, sched_id)
-
-    total_income = 0
-    clients = set()
-    for r in reqs:
-        if getattr(r, "client_id", None):
-            clients.add(r.client_id)
-        total_income += _final_price(r)
-
-    n_clients = len(clients)
-
-    # update the schedule instance (no bulk UPDATE → no staleness)
-    sched = await session.get(BarberSchedule, sched_id)
-    if sched and sched.barber_id == barber_id:
-        sched.total_income = int(total_income)
-        sched.n_clients = int(n_clients)
-        await session.flush()  # keep in current tx
-
-
 def _weekday_idx_from_name(name: str) -> Optional[int]:
     if not name:
         return None
@@ -213,13 +146,13 @@ def calc_request_totals(cr) -> Tuple[int, int]:
     """
     Returns (subtotal_price, total_duration_minutes) for a request using its services.
     duration priority: ClientRequestService.duration -> BarberService.duration -> 0
-    price: BarberService.price -> 0
+    price: ClientRequestService.price (as booked) -> BarberService.price -> 0
     """
     total_price = 0
     total_minutes = 0
     for crs in (cr.services or []):
         bs = crs.barber_service
-        price = getattr(bs, "price", 0) or 0
+        price = crs.price if crs.price is not None else getattr(bs, "price", 0) or 0
         total_price += int(price)
         dur = crs.duration if (crs is not None and crs.duration is not None) else getattr(bs, "duration", 0) or 0
         total_minutes += int(dur)
@@ -265,7 +198,8 @@ def _parse_discount_strict(text: str, subtotal: int) -> tuple[Optional[int], Opt
 # =========================
 # Render request block
 # =========================
-def render_request_block(cr, lang: str) -> str:
+def render_request_block(cr, lang: str, totals: Optional[Tuple[int, int]] = None) -> str:
+    """`totals`: calc_request_totals(cr) if the caller already has it."""
     d = _fmt_d((cr.from_time or cr.date or datetime.now()).date())
     ft = _fmt_t(cr.from_time)
     tt = _fmt_t(cr.to_time)
@@ -289,7 +223,7 @@ def render_request_block(cr, lang: str) -> str:
         dur = crs.duration if (crs and crs.duration is not None) else getattr(bs, "duration", 0) or 0
         lines.append(f"   • {svc} — {_t(lang, f'{_fmt_money(price)} so‘m', f'{_fmt_money(price)} сум')} — ⏱ {dur} min")
 
-    subtotal, tm = calc_request_totals(cr)
+    subtotal, tm = totals if totals is not None else calc_request_totals(cr)
     tm_txt = _fmt_duration_minutes_ru(tm) if _is_ru(lang) else _fmt_duration_minutes(tm)
     disc = int(getattr(cr, "discount", 0) or 0)
     final = max(subtotal - disc, 0)
@@ -314,10 +248,6 @@ def _overlaps(a_start: time, a_end: time, b_start: time, b_end: time) -> bool:
     return (a_start < b_end) and (b_start < a_end)
 
 
-def _minutes_between(t1: time, t2: time) -> int:
-    return (t2.hour * 60 + t2.minute) - (t1.hour * 60 + t1.minute)
-
-
 async def _barber_daily_window_from_model(session, barber_id: int) -> List[Tuple[time, time]]:
     """
     Reads Barber.start_time / end_time and returns time-window(s) for a day.
@@ -359,31 +289,6 @@ async def _working_time_windows(session, barber_id: int, day: date) -> List[Tupl
     return win or []
 
 
-def _interval_overlap_minutes(a_start: time, a_end: time, b_start: time, b_end: time) -> int:
-    s_hm = max(a_start, b_start)
-    e_hm = min(a_end, b_end)
-    return max(0, (e_hm.hour * 60 + e_hm.minute) - (s_hm.hour * 60 + s_hm.minute))
-
-
-async def _booked_minutes_for_day(session, barber_id: int, day: date) -> int:
-    reqs = await fetch_requests_for_day(session, barber_id, day)  # status=True already in your query
-    windows = await _working_time_windows(session, barber_id, day)
-    total = 0
-    for cr in reqs:
-        ft, tt = getattr(cr, "from_time", None), getattr(cr, "to_time", None)
-        if not (ft and tt and ft < tt):
-            continue
-        ft_t, tt_t = ft.time(), tt.time()
-        for ws, we in windows:
-            total += _interval_overlap_minutes(ws, we, ft_t, tt_t)
-    return total
-
-
-async def _total_work_minutes_for_day(session, barber_id: int, day: date) -> int:
-    windows = await _working_time_windows(session, barber_id, day)
-    return sum(_minutes_between(ft, tt) for ft, tt in windows if ft < tt)
-
-
 def _occ_icon(booked: int, total: int) -> Tuple[str, Optional[int]]:
     if total <= 0:
         return "⚪️", None
@@ -396,10 +301,128 @@ def _occ_icon(booked: int, total: int) -> Tuple[str, Optional[int]]:
 
 
 async def _day_occupancy_stats(session, barber_id: int, day: date) -> Tuple[str, Optional[int], int, int]:
-    total = await _total_work_minutes_for_day(session, barber_id, day)
-    booked = await _booked_minutes_for_day(session, barber_id, day)
-    icon, pct = _occ_icon(booked, total)
-    return icon, pct, booked, total
+    for occ in (await occupancy_for_range(session, barber_id, day, day)).values():
+        return occ.icon, occ.pct, occ.booked, occ.total
+    return "⚪️", None, 0, 0
+
+
+class DayOccupancy(NamedTuple):
+    sched_id: int
+    day: date
+    is_working: Optional[bool]  # raw BarberWorkingDays.is_working (None → no row / not set)
+    n_clients: int
+    total_income: int
+    booked: int  # accepted minutes inside working windows
+    total: int  # working minutes
+    icon: str
+    pct: Optional[int]
+
+
+def _hm_minutes(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+
+def _mod_expr(col):
+    # minute-of-day of a timestamp (date part ignored)
+    return func.extract("hour", col) * 60 + func.extract("minute", col)
+
+
+def _overlap_expr(a_start, a_end, b_start, b_end):
+    return func.greatest(0, func.least(a_end, b_end) - func.greatest(a_start, b_start))
+
+
+def _window_minutes(st: Optional[datetime], et: Optional[datetime]) -> int:
+    # same windows as _barber_daily_window_from_model (overnight → two segments)
+    if not st or not et:
+        return 0
+    s_m, e_m = st.hour * 60 + st.minute, et.hour * 60 + et.minute
+    if s_m < e_m:
+        return e_m - s_m
+    if s_m > e_m:
+        return (23 * 60 + 59 - s_m) + e_m
+    return 0
+
+
+async def occupancy_for_range(session, barber_id: int, start: date, end: date) -> dict[int, DayOccupancy]:
+    """
+    Occupancy for every BarberSchedule of a barber in [start, end] (inclusive),
+    keyed by schedule id, in ONE aggregate statement:
+    working windows come from Barber.start_time/end_time + BarberWorkingDays,
+    booked minutes are the HH:MM overlap of accepted requests with those windows.
+    """
+    st_m = _mod_expr(Barber.start_time)
+    et_m = _mod_expr(Barber.end_time)
+    rs_m = ClientRequest.from_minute
+    re_m = ClientRequest.to_minute
+
+    booked_expr = case(
+        (st_m < et_m, _overlap_expr(rs_m, re_m, st_m, et_m)),
+        (st_m > et_m, _overlap_expr(rs_m, re_m, st_m, 23 * 60 + 59) + _overlap_expr(rs_m, re_m, 0, et_m)),
+        else_=0,
+    )
+
+    isodow = cast(func.extract("isodow", BarberSchedule.day), Integer)
+    is_working = (
+        select(BarberWorkingDays.is_working)
+        .where(
+            BarberWorkingDays.barber_id == BarberSchedule.barber_id,
+            (BarberWorkingDays.name_uz == case({i + 1: n for i, n in enumerate(UZ_NAMES)}, value=isodow))
+            | (BarberWorkingDays.name_ru == case({i + 1: n for i, n in enumerate(RU_NAMES)}, value=isodow)),
+        )
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    q = (
+        select(
+            BarberSchedule.id,
+            BarberSchedule.day,
+            BarberSchedule.n_clients,
+            BarberSchedule.total_income,
+            Barber.start_time,
+            Barber.end_time,
+            is_working.label("is_working"),
+            func.coalesce(func.sum(booked_expr), 0).label("booked"),
+        )
+        .join(Barber, Barber.id == BarberSchedule.barber_id)
+        .outerjoin(
+            ClientRequest,
+            and_(
+                ClientRequest.barber_schedule_id == BarberSchedule.id,
+                ClientRequest.barber_id == BarberSchedule.barber_id,
+                ClientRequest.status == "accept",
+                ClientRequest.from_time < ClientRequest.to_time,
+            ),
+        )
+        .where(
+            BarberSchedule.barber_id == barber_id,
+            BarberSchedule.day >= datetime.combine(start, time.min),
+            BarberSchedule.day < datetime.combine(end + timedelta(days=1), time.min),
+        )
+        .group_by(
+            BarberSchedule.id, BarberSchedule.day, BarberSchedule.n_clients, BarberSchedule.total_income,
+            Barber.start_time, Barber.end_time,
+        )
+    )
+
+    out: dict[int, DayOccupancy] = {}
+    for sid, day_dt, n_clients, income, st, et, working, booked in (await session.execute(q)).all():
+        off = working is False
+        total = 0 if off else _window_minutes(st, et)
+        booked = 0 if off else int(booked or 0)
+        icon, pct = _occ_icon(booked, total)
+        out[sid] = DayOccupancy(
+            sched_id=sid,
+            day=day_dt.date(),
+            is_working=working,
+            n_clients=int(n_clients or 0),
+            total_income=int(income or 0),
+            booked=booked,
+            total=total,
+            icon=icon,
+            pct=pct,
+        )
+    return out
 
 
 # =========================
@@ -409,14 +432,7 @@ async def load_request_full(session, barber_id: int, req_id: int) -> Optional[Cl
     q = (
         select(ClientRequest)
         .where(ClientRequest.id == req_id, ClientRequest.barber_id == barber_id)
-        .options(
-            selectinload(ClientRequest.client).selectinload(Client.user),
-            selectinload(ClientRequest.services)
-            .selectinload(ClientRequestService.barber_service)
-            .selectinload(BarberService.service),
-            # (optional safety) forbid any other lazy-loads:
-            # raiseload("*"),
-        )
+        .options(*loader("request_render"))
         .limit(1)
     )
     return (await session.execute(q)).scalars().first()
@@ -430,12 +446,7 @@ async def fetch_requests_for_schedule(session, barber_id: int, sched_id: int) ->
             ClientRequest.barber_schedule_id == sched_id,
             ClientRequest.status == "accept",
         )
-        .options(
-            selectinload(ClientRequest.client).selectinload(Client.user),
-            selectinload(ClientRequest.services)
-            .selectinload(ClientRequestService.barber_service)
-            .selectinload(BarberService.service),
-        )
+        .options(*loader("request_render"))
         .order_by(ClientRequest.from_time.asc(), ClientRequest.id.asc())
     )
     return (await session.execute(q)).scalars().all()
@@ -458,17 +469,24 @@ async def _ensure_schedules_for_week(session, barber_id: int, days: List[date])
     by_date: dict[date, BarberSchedule] = {s.day.date(): s for s in rows if s.day}
 
     # create missing schedule rows so we always have sid
+    # (ON CONFLICT: the nightly generator may insert the same day concurrently)
     to_create = [d for d in days if d not in by_date]
-    for d in to_create:
-        s = BarberSchedule(
-            barber_id=barber_id,
-            day=datetime.combine(d, time(0, 0)),
-            n_clients=0,
-            total_income=0,
-            name_uz=UZ_NAMES[d.weekday()],
-            name_ru=RU_NAMES[d.weekday()],
+    if to_create:
+        await session.execute(
+            pg_insert(BarberSchedule)
+            .values([
+                dict(
+                    barber_id=barber_id,
+                    day=datetime.combine(d, time(0, 0)),
+                    n_clients=0,
+                    total_income=0,
+                    name_uz=UZ_NAMES[d.weekday()],
+                    name_ru=RU_NAMES[d.weekday()],
+                )
+                for d in to_create
+            ])
+            .on_conflict_do_nothing(index_elements=["barber_id", "day"])
         )
-        session.add(s)
 
     if to_create:
         await session.commit()
@@ -0,0 +1,271 @@
+"""
+BarberSchedule.n_clients / total_income.
+
+One definition, kept incrementally:
+
+    n_clients    = distinct clients with an accepted request on the schedule
+    total_income = Σ max(Σ service line price − discount, 0) over those requests
+
+A flush hook keeps both in step. A request is touched when its status, discount
+or schedule changes, when it is deleted, or when a service line is added to /
+removed from it. Only those requests are read, before the flush (old state) and
+after it (new state); each schedule they leave or join gets one UPDATE in the
+same transaction that moves total_income by the difference and recounts
+n_clients (a client may hold several requests on one day, so that count cannot
+move by ±1). Handlers never recount a day.
+
+A line's price is the one stored on it at booking (ClientRequestService.price;
+BarberService.price only for lines that have none), so editing a price list
+leaves booked requests and their schedules alone.
+
+The hook sees ORM writes only: add/delete service lines through the session,
+not with Core DML.
+
+Repair / backfill (recomputes from client_requests):
+
+    python -m app.barber.schedule.totals            # every schedule
+    python -m app.barber.schedule.totals 12 15      # only these barber ids
+"""
+import asyncio
+import logging
+import sys
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy import event, inspect as orm_inspect, select, update, func, or_
+from sqlalchemy.orm import Session, attributes
+
+from app.barber.models import BarberSchedule, BarberService
+from app.client.models import ClientRequest, ClientRequestService
+
+logger = logging.getLogger(__name__)
+
+_TRACKED = ("status", "discount", "barber_schedule_id")
+_INFO_KEY = "schedule_totals"
+
+
+class _Contribution(NamedTuple):
+    sched_id: Optional[int]
+    n: int
+    income: int
+
+
+class _Pending(NamedTuple):
+    ids: set  # persistent requests touched by this flush
+    new: list  # objects whose request id is known only after the flush
+    before: Dict[int, _Contribution]
+
+
+def _contribution(sched_id, status, discount, subtotal) -> _Contribution:
+    if status != "accept" or not sched_id:
+        return _Contribution(sched_id, 0, 0)
+    return _Contribution(sched_id, 1, max(int(subtotal or 0) - int(discount or 0), 0))
+
+
+def _subtotal_col():
+    return func.coalesce(func.sum(func.coalesce(ClientRequestService.price, BarberService.price)), 0)
+
+
+def _distinct_clients(sched_id):
+    return (
+        select(func.count(func.distinct(ClientRequest.client_id)))
+        .where(ClientRequest.barber_schedule_id == sched_id, ClientRequest.status == "accept")
+        .scalar_subquery()
+    )
+
+
+def _with_services(q):
+    return (
+        q.outerjoin(ClientRequestService, ClientRequestService.client_request_id == ClientRequest.id)
+        .outerjoin(BarberService, BarberService.id == ClientRequestService.barber_service_id)
+        .group_by(ClientRequest.id)
+    )
+
+
+def _read_contributions(session, ids) -> Dict[int, _Contribution]:
+    if not ids:
+        return {}
+    q = _with_services(
+        select(
+            ClientRequest.id,
+            ClientRequest.barber_schedule_id,
+            ClientRequest.status,
+            ClientRequest.discount,
+            _subtotal_col(),
+        )
+        .where(ClientRequest.id.in_(ids))
+    )
+    # connection-level execute: no autoflush from inside the flush
+    return {
+        rid: _contribution(sid, status, discount, subtotal)
+        for rid, sid, status, discount, subtotal in session.connection().execute(q).all()
+    }
+
+
+def _history_ids(obj, attr: str) -> set:
+    hist = orm_inspect(obj).attrs[attr].history
+    return {v for v in (*hist.deleted, *hist.unchanged, *hist.added) if v}
+
+
+def _touched(session) -> _Pending:
+    ids, new = set(), []
+    for obj in session.new:
+        if isinstance(obj, ClientRequest):
+            new.append(obj)
+        elif isinstance(obj, ClientRequestService):
+            new.append(obj)
+            # a line added to an existing request: its old contribution counts too
+            parent = obj.__dict__.get("client_request")
+            rid = obj.client_request_id or getattr(parent, "id", None)
+            if rid:
+                ids.add(rid)
+    for obj in session.dirty:
+        if isinstance(obj, ClientRequest):
+            state = orm_inspect(obj)
+            if any(state.attrs[a].history.has_changes() for a in _TRACKED):
+                ids.add(obj.id)
+        elif isinstance(obj, ClientRequestService):
+            state = orm_inspect(obj)
+            if any(state.attrs[a].history.has_changes() for a in ("client_request_id", "barber_service_id")):
+                ids |= _history_ids(obj, "client_request_id")
+    for obj in session.deleted:
+        if isinstance(obj, ClientRequest):
+            ids.add(obj.id)
+        elif isinstance(obj, ClientRequestService) and obj.client_request_id:
+            ids.add(obj.client_request_id)
+    return _Pending(ids, new, {})
+
+
+@event.listens_for(Session, "before_flush")
+def _totals_before_flush(session, flush_context, instances) -> None:
+    pending = _touched(session)
+    # a flush that touches nothing relevant costs no query; a failed flush's entry is simply replaced
+    if not pending.ids and not pending.new:
+        session.info.pop(_INFO_KEY, None)
+        return
+    pending.before.update(_read_contributions(session, pending.ids))
+    session.info[_INFO_KEY] = pending
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _totals_after_flush(session, flush_context) -> None:
+    pending: Optional[_Pending] = session.info.pop(_INFO_KEY, None)
+    if pending is None:
+        return
+
+    ids = set(pending.ids)
+    for obj in pending.new:
+        rid = obj.id if isinstance(obj, ClientRequest) else obj.client_request_id
+        if rid:
+            ids.add(rid)
+    # a request created by this flush contributes only once accepted: a new pending booking costs no read
+    ids -= {obj.id for obj in pending.new if isinstance(obj, ClientRequest) and obj.status != "accept"}
+    after = _read_contributions(session, ids)
+
+    deltas: Dict[int, list] = {}
+    for contributions, sign in ((pending.before, -1), (after, 1)):
+        for c in contributions.values():
+            if c.sched_id and (c.n or c.income):
+                d = deltas.setdefault(c.sched_id, [0, 0])
+                d[0] += sign * c.n
+                d[1] += sign * c.income
+    apply_totals_deltas(session, deltas)
+
+
+def apply_totals_deltas(session, deltas: Dict[int, list]) -> None:
+    """
+    For each schedule with a (Δaccepted requests, Δtotal_income) change, in the session's transaction:
+    move total_income by the delta and recount n_clients.
+    """
+    conn = session.connection()
+    for sid in sorted(deltas):  # fixed lock order across concurrent transactions
+        dn, di = deltas[sid]
+        if not dn and not di:
+            continue
+        row = conn.execute(
+            update(BarberSchedule)
+            .where(BarberSchedule.id == sid)
+            .values(
+                n_clients=_distinct_clients(sid),
+                total_income=func.coalesce(BarberSchedule.total_income, 0) + di,
+            )
+            .returning(BarberSchedule.n_clients, BarberSchedule.total_income)
+        ).first()
+        # keep a loaded instance in step without expiring it (no lazy load on an async session)
+        obj = session.identity_map.get(session.identity_key(BarberSchedule, sid))
+        if row is not None and obj is not None:
+            attributes.set_committed_value(obj, "n_clients", row.n_clients)
+            attributes.set_committed_value(obj, "total_income", row.total_income)
+
+
+async def rebuild_schedule_totals(session, barber_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute counters from client_requests (all schedules or the given barbers' ones) in one
+    transaction. Only drifted rows are written; returns how many.
+    """
+    barber_ids = list(barber_ids) if barber_ids else None
+
+    per_request = (
+        select(
+            ClientRequest.barber_schedule_id.label("sid"),
+            ClientRequest.client_id,
+            func.greatest(_subtotal_col() - func.coalesce(ClientRequest.discount, 0), 0).label("final"),
+        )
+        .where(ClientRequest.status == "accept", ClientRequest.barber_schedule_id.is_not(None))
+    )
+    if barber_ids:
+        per_request = per_request.where(ClientRequest.barber_id.in_(barber_ids))
+    per_request = _with_services(per_request).subquery()
+    per_sched = (
+        select(
+            per_request.c.sid,
+            func.count(func.distinct(per_request.c.client_id)).label("n"),
+            func.coalesce(func.sum(per_request.c.final), 0).label("income"),
+        )
+        .group_by(per_request.c.sid)
+        .subquery()
+    )
+    target = (
+        select(
+            BarberSchedule.id.label("sid"),
+            func.coalesce(per_sched.c.n, 0).label("n"),
+            func.coalesce(per_sched.c.income, 0).label("income"),
+        )
+        .outerjoin(per_sched, per_sched.c.sid == BarberSchedule.id)
+    )
+    if barber_ids:
+        target = target.where(BarberSchedule.barber_id.in_(barber_ids))
+    target = target.subquery()
+
+    q = (
+        update(BarberSchedule)
+        .where(
+            BarberSchedule.id == target.c.sid,
+            or_(
+                BarberSchedule.n_clients.is_distinct_from(target.c.n),
+                BarberSchedule.total_income.is_distinct_from(target.c.income),
+            ),
+        )
+        .values(n_clients=target.c.n, total_income=target.c.income)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(q)
+    await session.commit()
+    return result.rowcount or 0
+
+
+async def _main(argv) -> None:
+    from app.db import AsyncSessionLocal, async_engine
+    import app.models  # noqa: F401  (configure mappers)
+
+    ids = [int(a) for a in argv] or None
+    try:
+        async with AsyncSessionLocal() as session:
+            fixed = await rebuild_schedule_totals(session, ids)
+        logger.info("schedule totals rebuilt, %s drifted row(s) fixed", fixed)
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
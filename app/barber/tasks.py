@@ -1,116 +1,164 @@
-import asyncio
-from datetime import datetime, timedelta
+import logging
+from datetime import datetime, time, timedelta
+from time import monotonic
 
-from sqlalchemy import select
+from sqlalchemy import select, func, cast, case, literal, literal_column, true, Date, Integer, String
+from sqlalchemy.dialects.postgresql import array as pg_array, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.celery_app import celery
 from app.barber.models import Barber, BarberSchedule
+from app.barber.schedule.totals import rebuild_schedule_totals
 from app.db import AsyncSessionLocal  # ✅ make sure this points to your async session factory
-from celery import shared_task
+from app.worker_runtime import run_async
 import os
-from typing import List, Dict, Any
-import requests
+from typing import List
 
 # Uzbek and Russian weekday names
 WEEKDAY_NAMES_UZ = ["Dushanba", "Seshanba", "Chorshanba", "Payshanba", "Juma", "Shanba", "Yakshanba"]
 WEEKDAY_NAMES_RU = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
-API = os.getenv("API", "http://127.0.0.1:8000").rstrip("/")
-LOCATION_PUSH_URL = os.getenv("LOCATION_PUSH_URL").lstrip("/")
-DJANGO_LOCATION_TOKEN = os.getenv("DJANGO_LOCATION_TOKEN", "")
+
+SCHEDULE_HORIZON_DAYS = int(os.getenv("SCHEDULE_HORIZON_DAYS", "40"))
+SCHEDULE_CHUNK_SIZE = int(os.getenv("SCHEDULE_CHUNK_SIZE", "1000"))  # barbers per INSERT … SELECT
+
+log = logging.getLogger(__name__)
 
 
 @celery.task(name='app.tasks.create_barber_schedule', ignore_result=True)
 def create_barber_schedule():
-    """Celery entrypoint — keep it sync; run the async job on a fresh loop."""
-    asyncio.run(_create_barber_schedule())
+    """Celery entrypoint — keep it sync; run the async job on the worker's loop."""
+    run_async(_create_barber_schedule())
 
 
 async def _create_barber_schedule():
-    today = datetime.now().date()
-    days_ahead = 40
-
-    # open session explicitly so we can close & dispose before leaving the loop
-    session = AsyncSessionLocal()
-    engine = session.bind  # AsyncEngine
-
-    try:
-        async with session:
-            # Get all barbers
-            result = await session.execute(select(Barber))
-            barbers = result.scalars().all()
-
-            for barber in barbers:
-                for offset in range(days_ahead):
-                    schedule_date = today + timedelta(days=offset)
-                    weekday_index = schedule_date.weekday()  # 0=Mon..6=Sun
-
-                    # Prevent duplicates
-                    exists = (
-                        await session.execute(
-                            select(BarberSchedule.id).where(
-                                BarberSchedule.barber_id == barber.id,
-                                BarberSchedule.day == schedule_date,
-                            )
-                        )
-                    ).scalar_one_or_none()
-                    if exists:
-                        continue
-
-                    session.add(
-                        BarberSchedule(
-                            barber_id=barber.id,
-                            day=schedule_date,
-                            name_uz=WEEKDAY_NAMES_UZ[weekday_index],
-                            name_ru=WEEKDAY_NAMES_RU[weekday_index],
-                        )
-                    )
-
+    today = datetime.combine(datetime.now().date(), time.min)
+    horizon_end = today + timedelta(days=SCHEDULE_HORIZON_DAYS - 1)
+
+    started = monotonic()
+    inserted = 0
+    chunks = 0
+    async with AsyncSessionLocal() as session:
+        last_id = 0
+        while True:
+            # keyset-paginate barber ids; one INSERT … SELECT per chunk
+            ids = (await session.execute(
+                select(Barber.id)
+                .where(Barber.id > last_id)
+                .order_by(Barber.id)
+                .limit(SCHEDULE_CHUNK_SIZE)
+            )).scalars().all()
+            if not ids:
+                break
+
+            result = await session.execute(_schedule_horizon_insert(ids[0], ids[-1], today, horizon_end))
             await session.commit()
 
-    except Exception:
-        # rollback while loop is alive so asyncpg can do its thing
-        try:
-            await session.rollback()
-        finally:
-            # re-raise so Celery backoff/etc. still works (optional)
-            raise
-    finally:
-        # 1) close the session inside the running loop
-        try:
-            await session.close()
-        finally:
-            # 2) dispose the engine (drops pooled conns) before loop ends
-            if engine is not None:
-                try:
-                    await engine.dispose()
-                except Exception:
-                    # swallow dispose errors to avoid masking the original
-                    pass
-
-
-def _headers() -> Dict[str, str]:
-    h = {"Content-Type": "application/json"}
-    if DJANGO_LOCATION_TOKEN:
-        h["Authorization"] = f"Token {DJANGO_LOCATION_TOKEN}"
-    return h
-
-
-@shared_task(name="sync_locations_to_django", bind=False, autoretry_for=(Exception,), retry_backoff=5,
-             retry_kwargs={"max_retries": 5})
-def sync_locations_to_django(items: List[Dict[str, Any]]) -> None:
+            inserted += max(result.rowcount or 0, 0)
+            chunks += 1
+            last_id = ids[-1]
+
+            elapsed = monotonic() - started
+            log.info(
+                "create_barber_schedule: chunk %s (barbers %s..%s) total=%s rows, %.0f rows/s",
+                chunks, ids[0], ids[-1], inserted, inserted / elapsed if elapsed > 0 else 0.0,
+            )
+
+    elapsed = monotonic() - started
+    log.info(
+        "create_barber_schedule: %s rows in %s chunks, %.2fs (%.0f rows/s), horizon %s..%s",
+        inserted, chunks, elapsed, inserted / elapsed if elapsed > 0 else 0.0,
+        today.date(), horizon_end.date(),
+    )
+    return inserted
+
+
+@celery.task(name='app.tasks.reconcile_schedule_totals', ignore_result=True)
+def reconcile_schedule_totals():
+    """Nightly repair of BarberSchedule.n_clients / total_income (the flush hook keeps them live)."""
+    run_async(_reconcile_schedule_totals())
+
+
+async def _reconcile_schedule_totals():
+    started = monotonic()
+    fixed = 0
+    async with AsyncSessionLocal() as session:
+        last_id = 0
+        while True:
+            ids = (await session.execute(
+                select(Barber.id)
+                .where(Barber.id > last_id)
+                .order_by(Barber.id)
+                .limit(SCHEDULE_CHUNK_SIZE)
+            )).scalars().all()
+            if not ids:
+                break
+            fixed += await rebuild_schedule_totals(session, ids)  # commits per chunk
+            last_id = ids[-1]
+
+    log.info("reconcile_schedule_totals: %s drifted row(s) fixed in %.2fs", fixed, monotonic() - started)
+    return fixed
+
+
+def _weekday_names_array(names: List[str]):
+    # typed elements so the ARRAY is varchar[] rather than unknown[] for asyncpg
+    return pg_array([cast(literal(n), String) for n in names])
+
+
+def _schedule_horizon_insert(first_id: int, last_id: int, today: datetime, horizon_end: datetime):
     """
-    items: list of dicts with keys:
-      country_uz, country_ru, country_en (optional)
-      region_uz, region_ru, region_en (optional)
-      city_uz,   city_ru,   city_en   (optional)
+    INSERT … SELECT generate_series … ON CONFLICT DO NOTHING for barbers [first_id, last_id].
+
+    Per barber only the uncovered tail of the horizon is generated: if the rows in
+    [today, horizon_end] are contiguous from today, the series starts the day after
+    the last one (a daily run touches one day per barber); if there is a gap
+    (or nothing yet) it starts at today and the unique (barber_id, day) constraint
+    skips what already exists.
     """
-    url = f"{API}/{LOCATION_PUSH_URL}"
-    r = requests.post(url, json=items, headers=_headers(), timeout=30)
-    # log non-200s; don't raise to avoid celery hard-fail storms
-    if r.status_code != 200:
-        try:
-            body = r.text[:500]
-        except Exception:
-            body = "<no body>"
-        print(f"[sync_locations_to_django] POST {url} -> {r.status_code} {body}")
+    covered = (
+        select(
+            BarberSchedule.barber_id.label("barber_id"),
+            func.max(BarberSchedule.day).label("last_day"),
+            func.count().label("n_days"),
+        )
+        .where(
+            BarberSchedule.barber_id.between(first_id, last_id),
+            BarberSchedule.day >= today,
+            BarberSchedule.day <= horizon_end,
+        )
+        .group_by(BarberSchedule.barber_id)
+        .subquery("covered")
+    )
+
+    contiguous = covered.c.n_days == cast(covered.c.last_day, Date) - today.date() + 1
+    one_day = literal_column("interval '1 day'")
+    series_start = case(
+        (contiguous, covered.c.last_day + one_day),
+        else_=today,
+    )
+    series = (
+        func.generate_series(series_start, horizon_end, one_day)
+        .table_valued("day")
+        .lateral("d")
+    )
+
+    isodow = cast(func.extract("isodow", series.c.day), Integer)  # 1=Mon..7=Sun
+    rows = (
+        select(
+            Barber.id,
+            series.c.day,
+            _weekday_names_array(WEEKDAY_NAMES_UZ)[isodow],
+            _weekday_names_array(WEEKDAY_NAMES_RU)[isodow],
+            literal_column("0"),
+            literal_column("0"),
+        )
+        .select_from(Barber)
+        .outerjoin(covered, covered.c.barber_id == Barber.id)
+        .join(series, true())
+        .where(Barber.id.between(first_id, last_id))
+    )
+
+    return (
+        pg_insert(BarberSchedule)
+        .from_select(["barber_id", "day", "name_uz", "name_ru", "n_clients", "total_income"], rows)
+        .on_conflict_do_nothing(index_elements=["barber_id", "day"])
+    )
@@ -2,9 +2,13 @@ from sqlalchemy import select, func
 from app.barber.models import BarberWorkingDays, Barber, BarberService, BarberSchedule
 from datetime import date
 from app.user.models import User
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union
 from datetime import datetime, time, timedelta
 from app.client.models import Client, ClientRequest, ClientRequestService
+
+if TYPE_CHECKING:
+    # app.identity configures the mappers on import, before app.models has loaded them all
+    from app.identity import Identity
 from sqlalchemy.orm import selectinload
 from sqlalchemy import select, func, cast, Date, and_, or_, distinct
 
@@ -89,7 +93,18 @@ def week_bounds(today: date) -> Tuple[date, date]:
     return monday, sunday
 
 
-async def get_user_and_barber(session, telegram_id: int) -> Tuple[Optional["User"], Optional["Barber"], str]:
+async def get_user_and_barber(
+        session, telegram_id: int, identity: Optional["Identity"] = None,
+) -> Tuple[Optional[Union[User, "Identity"]], Optional[Barber], str]:
+    """
+    Returns (who, barber, lang); `who` is None for an unknown telegram id.
+    With `identity` (injected by IdentityMiddleware) the user lookup is skipped and the
+    barber is a primary-key get; `who` is then the Identity itself, not a User.
+    """
+    if identity is not None:
+        barber = await session.get(Barber, identity.barber_id) if identity.barber_id else None
+        return identity, barber, identity.lang
+
     user = (
         await session.execute(select(User).where(User.telegram_id == telegram_id))
     ).scalar_one_or_none()
@@ -10,6 +10,8 @@ from app.user.models import User
 from .keyboards import barber_working_days_keyboard
 from app.db import AsyncSessionLocal
 from .utils import seed_weekdays
+from app.barber.schedule.availability import invalidate_barber_availability
+from app.barber.schedule.day_summary import invalidate_barber_day_summaries
 
 barber_working_days_route = Router()
 
@@ -75,6 +77,8 @@ async def toggle_working_day(callback: CallbackQuery):
         # ✅ Toggle status
         day.is_working = not day.is_working
         await session.commit()
+        await invalidate_barber_availability(session, callback.bot.redis, day.barber_id)
+        await invalidate_barber_day_summaries(session, callback.bot.redis, day.barber_id)
 
         # ✅ Reload days for keyboard
         days = (
@@ -9,6 +9,9 @@ from app.barber.models import Barber
 from app.user.models import User
 from .keyboards import working_time_keyboard
 from app.states import WorkingTime
+from app.barber.schedule.availability import invalidate_barber_availability
+from app.barber.schedule.day_summary import invalidate_barber_day_summaries
+from app.user_session import set_last_action
 
 barber_working_time = Router()
 
@@ -53,7 +56,7 @@ async def working_time(message: Message, state: FSMContext):
     )
 
     # save last action in redis
-    await redis_pool.set(f"user:{message.from_user.id}:last_action", "barber_working_time")
+    await set_last_action(redis_pool, message.from_user.id, "barber_working_time")
 
     text = (
         f"🕒 Ish vaqti:\n⏰ Boshlanishi: {start}\n⏰ Tugashi: {end}"
@@ -157,6 +160,8 @@ async def handle_end_time(message: Message, state: FSMContext):
         barber.start_time = datetime.combine(datetime.today(), start_time)
         barber.end_time = datetime.combine(datetime.today(), end_time)
         await session.commit()
+        await invalidate_barber_availability(session, message.bot.redis, barber.id)
+        await invalidate_barber_day_summaries(session, message.bot.redis, barber.id)
 
     start_str = start_time.strftime("%H:%M")
     end_str = end_time.strftime("%H:%M")
@@ -9,6 +9,8 @@ from app.client.models import Client
 from app.barber.models import Barber
 from .keyboards import client_main_menu, barber_main_menu, user_role_keyboard
 from app.states import LoginState
+from app.identity import Identity
+from typing import Optional
 
 commands_router = Router()
 
@@ -41,11 +43,14 @@ async def _get_role(session, user: User) -> str:
 
 
 @commands_router.message(F.text == "/profile")
-async def cmd_profile(message: Message):
-    async with AsyncSessionLocal() as session:
-        user = await _load_user(session, message.from_user.id)
-        lang = getattr(user, "lang", "uz") if user else "uz"
-        role = await _get_role(session, user) if user else "unknown"
+async def cmd_profile(message: Message, identity: Optional[Identity] = None):
+    if identity is not None:
+        lang, role = identity.lang, identity.role
+    else:
+        async with AsyncSessionLocal() as session:
+            user = await _load_user(session, message.from_user.id)
+            lang = getattr(user, "lang", "uz") if user else "uz"
+            role = await _get_role(session, user) if user else "unknown"
 
     if role == "barber":
         kb = barber_main_menu(lang)
@@ -78,6 +83,16 @@ HELP_RU = (
 )
 
 
+async def _user_lang(message: Message, identity: Optional[Identity]) -> Optional[str]:
+    """The sender's language, or None when they have no user row. Without an
+    identity (not registered, or resolution failed) the DB decides."""
+    if identity is not None:
+        return identity.lang
+    async with AsyncSessionLocal() as session:
+        user = await _load_user(session, message.from_user.id)
+    return (user.lang or "uz").lower() if user else None
+
+
 async def _get_lang(tg_id: int) -> str:
     async with AsyncSessionLocal() as session:
         user = (await session.execute(
@@ -87,41 +102,34 @@ async def _get_lang(tg_id: int) -> str:
 
 
 @commands_router.message(F.text == "/help")
-async def cmd_help(message: Message):
-    lang = await _get_lang(message.from_user.id)
+async def cmd_help(message: Message, identity: Optional[Identity] = None):
+    lang = identity.lang if identity else await _get_lang(message.from_user.id)
     text = HELP_RU if (lang or "").lower().startswith("ru") else HELP_UZ
     await message.answer(text, parse_mode="Markdown")
 
 
 @commands_router.message(F.text == "/exit")
-async def cmd_exit(message: Message, state: FSMContext):
+async def cmd_exit(message: Message, state: FSMContext, identity: Optional[Identity] = None):
     await state.clear()
-    async with AsyncSessionLocal() as session:  # read-only
-        res = await session.execute(select(User).where(User.telegram_id == message.from_user.id))
-        user = res.scalar_one_or_none()
+    lang = await _user_lang(message, identity)
+    if lang is None:
+        await message.answer("❌ Foydalanuvchi topilmadi. Iltimos, qayta /start bosing.")
+        return
 
-        if not user:
-            await message.answer("❌ Foydalanuvchi topilmadi. Iltimos, qayta /start bosing.")
-            return
+    text = ("Вы успешно вышли из системы"
+            if lang.startswith("ru")
+            else "Tizimdan muvaffaqiyatli chiqildingiz")
 
-        text = ("Вы успешно вышли из системы"
-                if (user.lang or "uz").startswith("ru")
-                else "Tizimdan muvaffaqiyatli chiqildingiz")
-
-        await message.answer(text, reply_markup=user_role_keyboard(user.lang))
+    await message.answer(text, reply_markup=user_role_keyboard(lang))
 
 
 @commands_router.message(F.text == "/barber")
-async def cmd_barber(message: Message, state: FSMContext):
-    tg_id = message.from_user.id
-    async with AsyncSessionLocal() as session:
-        res = await session.execute(select(User).where(User.telegram_id == tg_id))
-        user = res.scalar_one_or_none()
-        if not user:
-            await message.answer("❌ Foydalanuvchi topilmadi. Iltimos, qayta /start bosing.")
-            return
+async def cmd_barber(message: Message, state: FSMContext, identity: Optional[Identity] = None):
+    lang = await _user_lang(message, identity)
+    if lang is None:
+        await message.answer("❌ Foydalanuvchi topilmadi. Iltimos, qayta /start bosing.")
+        return
 
-        lang = (user.lang or "uz").lower()
     msg = "✂️ Вы выбрали роль парикмахера." if lang.startswith("ru") else "✂️ Siz sartarosh sifatida tanlandingiz."
     await message.answer(msg)
 
@@ -24,10 +24,13 @@ from app.barber.keyboards import (
     barber_info_keyboard, barber_map_keyboard
 )
 from app.client.keyboards import location_keyboard, barber_menu
-from .task_sysnc_user import _enqueue_user_sync, sync_client_to_django
+from app.outbox.sync import enqueue_user_sync, enqueue_client_sync
 from app.redis_client import redis_client
 from app.client.models import Client
 from app.db import AsyncSessionLocal
+from app.identity import invalidate_identity
+from app.client.barber_directory import sync_barber_directory
+from app.user_session import get_last_action, set_last_action
 
 router = Router()
 
@@ -54,7 +57,7 @@ async def set_language(message: Message):
         user = await session.execute(select(User).where(User.telegram_id == tg_id))
         user = user.scalar_one_or_none()
 
-    await redis_pool.set(f"user:{tg_id}:last_action", "waiting_for_username")
+    await set_last_action(redis_pool, tg_id, "waiting_for_username")
     await message.answer(
         "Iltimos, tilni tanlang / Пожалуйста, выберите язык:",
         reply_markup=language_keyboard
@@ -114,22 +117,23 @@ async def choose_language(message: Message, state: FSMContext):
 
                 reply_markup = client_main_menu(lang_code)
                 text = None  # we'll send welcome text below
+
+            # platform sync goes out with this transaction's commit
+            role_for_django = "barber" if getattr(user, "user_type", None) == "barber" else "user"
+            enqueue_user_sync(session, {
+                "telegram_id": message.from_user.id,
+                "first_name": message.from_user.first_name,
+                "last_name": message.from_user.last_name,
+                "role": role_for_django,
+                "username": message.from_user.username or str(message.from_user.id),
+            })
+    await invalidate_identity(message.bot.redis, message.from_user.id)
     welcome_text = TEXTS[lang_code]["welcome"]
     if text:
         await message.answer(text, reply_markup=reply_markup)
     else:
         await message.answer(welcome_text, parse_mode="HTML", reply_markup=reply_markup)
 
-    # enqueue sync AFTER commit
-    role_for_django = "barber" if getattr(user, "user_type", None) == "barber" else "user"
-    await _enqueue_user_sync({
-        "telegram_id": message.from_user.id,
-        "first_name": message.from_user.first_name,
-        "last_name": message.from_user.last_name,
-        "role": role_for_django,
-        "username": message.from_user.username or str(message.from_user.id),
-    })
-
 
 
 ROLE_MAP = {
@@ -158,7 +162,6 @@ async def handle_user_role_selection(message: Message, state: FSMContext):
         if role == "client":
             # set role
             user.user_type = "client"
-            await session.commit()
             # ensure Client exists
             exist_client_id = (
                 await session.execute(
@@ -169,12 +172,12 @@ async def handle_user_role_selection(message: Message, state: FSMContext):
             if exist_client_id is None:
                 client = Client(user_id=user.id)
                 session.add(client)
-                await session.commit()
                 await session.flush()  # ← gets PK from DB
                 client_id = client.id
             else:
                 client_id = exist_client_id
-            sync_client_to_django.delay(
+            enqueue_client_sync(
+                session,
                 telegram_id=tg_id,
                 first_name=user.name,
                 last_name=user.surname,
@@ -182,6 +185,8 @@ async def handle_user_role_selection(message: Message, state: FSMContext):
                 role="client",
                 client_id=client_id
             )
+            await session.commit()
+            await invalidate_identity(redis_pool, tg_id)
 
     # Replies after commit
     if role == "client":
@@ -198,7 +203,7 @@ async def handle_user_role_selection(message: Message, state: FSMContext):
         await message.answer(prompt, reply_markup=keyboard)
 
         # Keep last_action aligned with FSM
-        await redis_pool.set(f"user:{tg_id}:last_action", "waiting_for_username")
+        await set_last_action(redis_pool, tg_id, "waiting_for_username")
         await state.set_state(LoginState.waiting_for_username)
 
 
@@ -220,11 +225,7 @@ async def go_back(message: Message, state: FSMContext):
         is_ru = lang.startswith("ru")
 
         # --- Read last_action from Redis and normalize
-        action = await redis_pool.get(f"user:{user.telegram_id}:last_action")
-        if isinstance(action, bytes):
-            action = action.decode("utf-8")
-        if action is None:
-            action = "root"
+        action = await get_last_action(redis_pool, user.telegram_id) or "root"
 
         keyboard = None
         if user.user_type == "barber":
@@ -256,17 +257,17 @@ async def go_back(message: Message, state: FSMContext):
                 )
 
                 keyboard = barber_service_menu_keyboard(lang)
-                await redis_pool.set(f"user:{user.telegram_id}:last_action", "barber_services")
+                await set_last_action(redis_pool, user.telegram_id, "barber_services")
 
             elif action == "barber_info":
                 keyboard = barber_main_menu(lang)
 
             elif action in {"barber_resume", "barber_photo", "barber_working_time", "barber_location"}:
-                await redis_pool.set(f"user:{user.telegram_id}:last_action", "barber_info")
+                await set_last_action(redis_pool, user.telegram_id, "barber_info")
                 keyboard = barber_info_keyboard(lang)
 
             elif action == "barber_location_change":
-                await redis_pool.set(f"user:{user.telegram_id}:last_action", "barber_location")
+                await set_last_action(redis_pool, user.telegram_id, "barber_location")
                 keyboard = barber_map_keyboard(lang)
 
             else:
@@ -277,11 +278,11 @@ async def go_back(message: Message, state: FSMContext):
                 keyboard = client_main_menu(lang)
 
             elif action == "barber_schedule":
-                await redis_pool.set(f"user:{user.telegram_id}:last_action", "barber_profile")
+                await set_last_action(redis_pool, user.telegram_id, "barber_profile")
                 keyboard = barber_menu(lang)
 
             elif action == "request_profile":
-                await redis_pool.set(f"user:{user.telegram_id}:last_action", "barber_schedule")
+                await set_last_action(redis_pool, user.telegram_id, "barber_schedule")
                 keyboard = barber_menu(lang)
 
             else:
@@ -401,5 +402,8 @@ async def get_password(message: Message, state: FSMContext):
             barber.user_id = user.id
             barber.login = username
             await session.commit()
+        # newly activated barber → list them in their city's directory
+        await sync_barber_directory(session, message.bot.redis, barber_id=barber.id)
+    await invalidate_identity(message.bot.redis, telegram_id)
     await state.clear()
     await message.answer(LOGIN_TEXT[lang]["welcome"], reply_markup=barber_main_menu(lang))
@@ -1,4 +1,5 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from app.keyboard_cache import static_keyboard
 
 language_keyboard = ReplyKeyboardMarkup(
     keyboard=[
@@ -52,6 +53,7 @@ def back_keyboard(lang: str) -> ReplyKeyboardMarkup:
     )
 
 
+@static_keyboard("barber_main_menu")
 def barber_main_menu(lang: str) -> ReplyKeyboardMarkup:
     texts = {
         "uz": [
@@ -86,6 +88,7 @@ def barber_main_menu(lang: str) -> ReplyKeyboardMarkup:
     )
 
 
+@static_keyboard("client_main_menu")
 def client_main_menu(lang: str) -> ReplyKeyboardMarkup:
     if lang == "ru":
         send_location_text = "📍 Отправить мою локацию"
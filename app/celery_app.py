@@ -31,7 +31,12 @@ celery.conf.beat_schedule = {
         "task": "app.client.tasks.notify_upcoming_requests",
         "schedule": timedelta(minutes=90),
         # 'schedule': crontab(minute='*'),
-    }
+    },
+    "reconcile-schedule-totals": {
+        "task": "app.tasks.reconcile_schedule_totals",
+        "schedule": crontab(minute=30, hour=4),
+    },
 }
 
 from app import tasks
+import app.worker_runtime  # noqa: E402,F401  (one event loop + warm pool per worker process)
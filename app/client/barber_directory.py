@@ -0,0 +1,128 @@
+"""
+Per-city ranked barber directory.
+
+Each city is a Redis sorted set  dir:city:{city_id}  (member = barber id,
+score = Barber.score, +inf while unscored: the order of ORDER BY score DESC),
+so the count is ZCARD and a page is one ZREVRANGE (O(log N + page)) no matter
+how deep the user pages. Names for the page are read by primary key.
+
+A city is built from Postgres on first use (dir:city:{id}:built marks it, so
+empty cities are cached too) and then kept current by sync_barber_directory()
+whenever a barber's score, city or login changes.
+"""
+import logging
+from math import ceil
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, desc
+
+from app.barber.models import Barber
+from app.user.models import User
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_TTL = 24 * 60 * 60  # safety net; writers keep the sets current
+
+
+def _dir_key(city_id: int) -> str:
+    return f"dir:city:{city_id}"
+
+
+def _built_key(city_id: int) -> str:
+    return f"dir:city:{city_id}:built"
+
+
+def _rank(score) -> float:
+    # unscored barbers go first, as ORDER BY score DESC (NULLS FIRST) always listed them
+    return float(score) if score is not None else float("inf")
+
+
+async def _ensure_city(session, redis, city_id: int) -> None:
+    if await redis.exists(_built_key(city_id)):
+        return
+    rows = (await session.execute(
+        select(Barber.id, Barber.score)
+        .join(User, Barber.user_id == User.id)
+        .where(User.city_id == city_id)
+    )).all()
+
+    pipe = redis.pipeline()
+    pipe.delete(_dir_key(city_id))
+    if rows:
+        pipe.zadd(_dir_key(city_id), {str(bid): _rank(score) for bid, score in rows})
+        pipe.expire(_dir_key(city_id), DIRECTORY_TTL)
+    pipe.set(_built_key(city_id), 1, ex=DIRECTORY_TTL)
+    await pipe.execute()
+
+
+async def _page_rows(session, ids: List[int]) -> List[Tuple[int, Optional[int], Optional[str], Optional[str]]]:
+    if not ids:
+        return []
+    rows = (await session.execute(
+        select(Barber.id, Barber.score, User.name, User.surname)
+        .join(User, Barber.user_id == User.id)
+        .where(Barber.id.in_(ids))
+    )).all()
+    by_id = {r[0]: r for r in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+async def directory_page(session, redis, city_id: int, page: int, page_size: int
+                         ) -> Tuple[list, int, int]:
+    """
+    Rows (barber_id, score, name, surname) for one page of a city, best score first.
+    Returns (rows, page, total_pages) with page clamped into range.
+    """
+    if redis is None:
+        return await _directory_page_sql(session, city_id, page, page_size)
+
+    try:
+        await _ensure_city(session, redis, city_id)
+        total = await redis.zcard(_dir_key(city_id))
+        total_pages = max(1, ceil(total / page_size))
+        page = max(1, min(page, total_pages))
+        start = (page - 1) * page_size
+        ids = [int(m) for m in await redis.zrevrange(_dir_key(city_id), start, start + page_size - 1)]
+    except Exception as e:
+        logger.warning("barber directory unavailable for city %s: %s", city_id, e)
+        return await _directory_page_sql(session, city_id, page, page_size)
+
+    return await _page_rows(session, ids), page, total_pages
+
+
+async def _directory_page_sql(session, city_id: int, page: int, page_size: int) -> Tuple[list, int, int]:
+    base = select(Barber.id).join(User, Barber.user_id == User.id).where(User.city_id == city_id)
+    total = len((await session.execute(base)).all())
+    total_pages = max(1, ceil(total / page_size))
+    page = max(1, min(page, total_pages))
+    rows = (await session.execute(
+        select(Barber.id, Barber.score, User.name, User.surname)
+        .join(User, Barber.user_id == User.id)
+        .where(User.city_id == city_id)
+        .order_by(desc(Barber.score))
+        .limit(page_size)
+        .offset((page - 1) * page_size)
+    )).all()
+    return rows, page, total_pages
+
+
+async def sync_barber_directory(session, redis, *, barber_id: Optional[int] = None,
+                                user_id: Optional[int] = None, old_city_id: Optional[int] = None) -> None:
+    """
+    Re-place one barber after a score / city / login change. Pass `old_city_id`
+    when the city moved. Cities that were never built are left to the lazy build.
+    """
+    if redis is None or (barber_id is None and user_id is None):
+        return
+    q = select(Barber.id, Barber.score, User.city_id).join(User, Barber.user_id == User.id)
+    q = q.where(Barber.id == barber_id) if barber_id is not None else q.where(User.id == user_id)
+    rows = (await session.execute(q)).all()
+
+    try:
+        for bid, score, city_id in rows:
+            if old_city_id and old_city_id != city_id:
+                await redis.zrem(_dir_key(old_city_id), str(bid))
+            if city_id and await redis.exists(_built_key(city_id)):
+                await redis.zadd(_dir_key(city_id), {str(bid): _rank(score)})
+    except Exception as e:
+        logger.warning("barber directory sync failed for barber=%s user=%s: %s", barber_id, user_id, e)
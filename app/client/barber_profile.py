@@ -3,6 +3,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, FSInputFile
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
+from app.loaders import loader
 from datetime import datetime, timedelta
 
 from app.states import LoginState, ChangeLocation
@@ -23,12 +24,15 @@ from app.region.models import Country, Region, City
 
 # import your async session factory
 from app.db import AsyncSessionLocal  # adjust path if needed
+from app.query_budget import query_budget
 from app.client.models import ClientBarbers
+from app.user_session import set_last_action
 
 barber_profile = Router()
 
 
 @barber_profile.message(F.text.in_(["✂️ Sartarosh haqida", "✂️ Информация о барбере"]))
+@query_budget(8)
 async def barber_profile_info(message: Message, state: FSMContext):
     tg_user = message.from_user
 
@@ -57,7 +61,7 @@ async def barber_profile_info(message: Message, state: FSMContext):
         barber = (
             await session.execute(
                 select(Barber)
-                .options(selectinload(Barber.user), selectinload(Barber.working_days))
+                .options(*loader("barber_card"))
                 .where(Barber.id == client.selected_barber)
                 .limit(1)
             )
@@ -239,7 +243,7 @@ async def barber_schedule(message: Message, state: FSMContext):
         if client.selected_barber:
             barber = (
                 await session.execute(
-                    select(Barber).where(Barber.id == client.selected_barber)
+                    select(Barber).options(*loader("barber_card")).where(Barber.id == client.selected_barber)
                 )
             ).scalar_one_or_none()
 
@@ -325,7 +329,7 @@ async def barber_day_selected(callback: CallbackQuery, state: FSMContext):
         schedule = (
             await session.execute(
                 select(BarberSchedule)
-                .options(selectinload(BarberSchedule.details))
+                .options(*loader("schedule_day"))
                 .where(BarberSchedule.id == sched_id)
                 .limit(1)
             )
@@ -342,11 +346,12 @@ async def barber_day_selected(callback: CallbackQuery, state: FSMContext):
             barber_id=schedule.barber_id,
             sched_id=sched_id,
             slot_minutes=30,
+            redis=callback.bot.redis,
         )
 
     # after the context exits, the session is closed cleanly
 
-    await redis_pool.set(f"user:{callback.from_user.id}:last_action", "barber_schedule")
+    await set_last_action(redis_pool, callback.from_user.id, "barber_schedule")
 
     client_kb = kb_with_client_back(base_kb, lang)
     day_str = schedule.day.strftime('%d.%m.%Y')
@@ -389,7 +394,7 @@ async def barber_back(callback: CallbackQuery, state: FSMContext):
         barber = (
             await session.execute(
                 select(Barber)
-                .options(selectinload(Barber.user))
+                .options(*loader("barber_card"))
                 .where(Barber.id == client.selected_barber)
                 .limit(1)
             )
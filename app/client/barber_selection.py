@@ -3,23 +3,23 @@ from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 
-from sqlalchemy import desc
 from sqlalchemy.orm import lazyload, selectinload
 
 from app.user.models import User
 from app.barber.models import Barber
 from app.client.models import Client
 
-from app.region.models import Region, City
-from math import ceil
 from .keyboards import (
-    make_barbers_keyboard_rows, create_regions_keyboard, _t,
-    create_cities_keyboard, create_back_to_cities_keyboard,
+    make_barbers_keyboard_rows, regions_keyboard, _t,
+    cities_keyboard, create_back_to_cities_keyboard,
     InlineKeyboardMarkup, barber_menu
 )
 
 from app.db import AsyncSessionLocal
 from sqlalchemy import select
+from .barber_directory import directory_page
+from app.refdata import refdata
+from app.user_session import set_last_action
 
 client_barber_selection = Router()
 PAGE_SIZE = 10
@@ -55,48 +55,28 @@ async def select_barber(message: Message, state: FSMContext):
 
         # If location missing → show regions
         if not region_id or not city_id:
-            regions = (await session.execute(select(Region).order_by(Region.id))).scalars().all()
             # if not regions:
             #     await message.answer(_t(lang, "❌ Регионов не найдено.", "❌ Hech qanday region topilmadi."))
             #     return
             await message.answer(
                 _t(lang, "Выберите регион:", "Regionni tanlang:"),
-                reply_markup=create_regions_keyboard(regions, lang)
+                reply_markup=await regions_keyboard(lang)
             )
             return
 
-        # Count & first page (columns-only)
-        total_ids = (await session.execute(
-            select(Barber.id)
-            .join(User, Barber.user_id == User.id)
-            .where(User.city_id == city_id)
-        )).all()
-        total_count = len(total_ids)
-        total_pages = max(1, ceil(total_count / PAGE_SIZE))
-
-        page = 1
+        # First page from the per-city ranked directory
+        rows, page, total_pages = await directory_page(session, redis_pool, city_id, 1, PAGE_SIZE)
         await state.update_data(barbers_page=page)
 
-        rows = (await session.execute(
-            select(Barber.id, Barber.score, User.name, User.surname)
-            .join(User, Barber.user_id == User.id)
-            .where(User.city_id == city_id)
-            .order_by(desc(Barber.score))
-            .limit(PAGE_SIZE)
-            .offset((page - 1) * PAGE_SIZE)
-        )).all()
-
-    await redis_pool.set(f"user:{tg_user_id}:last_action", "client_barber_selection")
+    await set_last_action(redis_pool, tg_user_id, "client_barber_selection")
 
     if not rows:
-        async with AsyncSessionLocal() as session:
-            regions = (await session.execute(select(Region).order_by(Region.id))).scalars().all()
         await message.answer(
             _t(lang, "😔 В вашем городе пока нет барберов.", "😔 Sizning shahringizda hozircha barber yo‘q.")
         )
         await message.answer(
             _t(lang, "Выберите регион:", "Regionni tanlang:"),
-            reply_markup=create_regions_keyboard(regions, lang)
+            reply_markup=await regions_keyboard(lang)
         )
         return
 
@@ -119,34 +99,17 @@ async def paginate_barbers(callback: CallbackQuery, state: FSMContext):
 
         if not city_id:
             # Fall back to regions if we can’t determine city
-            regions = (await session.execute(select(Region).order_by(Region.id))).scalars().all()
             await callback.message.edit_text(
                 _t(lang, "Выберите регион:", "Regionni tanlang:"),
-                reply_markup=create_regions_keyboard(regions, lang)
+                reply_markup=await regions_keyboard(lang)
             )
             await callback.answer()
             return
 
-        # Recompute total for the current scope (selected city or user city)
-        total_q = select(Barber.id).join(User, Barber.user_id == User.id).where(User.city_id == city_id)
-        total = (await session.execute(total_q)).all()
-        total_count = len(total)
-        total_pages = max(1, ceil(total_count / PAGE_SIZE))
-
-        page = max(1, min(new_page, total_pages))
+        # Page of the current scope (selected city or user city)
+        rows, page, total_pages = await directory_page(session, callback.bot.redis, city_id, new_page, PAGE_SIZE)
         await state.update_data(barbers_page=page)
 
-        # Page query using only required columns
-        stmt = (
-            select(Barber.id, Barber.score, User.name, User.surname)
-            .join(User, Barber.user_id == User.id)
-            .where(User.city_id == city_id)
-            .order_by(desc(Barber.score))
-            .limit(PAGE_SIZE)
-            .offset((page - 1) * PAGE_SIZE)
-        )
-        rows = (await session.execute(stmt)).all()
-
     kb = make_barbers_keyboard_rows(rows, lang, page, total_pages, include_filter_button=True)
     try:
         await callback.message.edit_reply_markup(reply_markup=kb)
@@ -166,7 +129,7 @@ async def open_filter(callback: CallbackQuery, state: FSMContext):
         user = (await session.execute(select(User).where(User.telegram_id == tg_user_id))).scalar_one_or_none()
         lang = getattr(user, "lang", "ru") if user else "ru"
 
-        regions = (await session.execute(select(Region).order_by(Region.id))).scalars().all()
+        regions = await refdata.regions()
         if not regions:
             await callback.answer(
                 _t(lang, "❌ Регионов не найдено.", "❌ Regionlar topilmadi."),
@@ -177,7 +140,7 @@ async def open_filter(callback: CallbackQuery, state: FSMContext):
         await state.update_data(selected_region_id=None, selected_city_id=None)
         await callback.message.edit_text(
             _t(lang, "Выберите регион:", "Regionni tanlang:"),
-            reply_markup=create_regions_keyboard(regions, lang)
+            reply_markup=await regions_keyboard(lang)
         )
 
     await callback.answer()
@@ -192,9 +155,7 @@ async def handle_choose_region(callback: CallbackQuery, state: FSMContext):
         lang = getattr(user, "lang", "ru") if user else "ru"
 
         region_id = int(callback.data.split(":")[1])
-        cities = (await session.execute(
-            select(City).where(City.region_id == region_id).order_by(City.id)
-        )).scalars().all()
+        cities = await refdata.cities(region_id)
 
         if not cities:
             await callback.answer(
@@ -206,7 +167,7 @@ async def handle_choose_region(callback: CallbackQuery, state: FSMContext):
         await state.update_data(selected_region_id=region_id, selected_city_id=None)
         await callback.message.edit_text(
             _t(lang, "Выберите город:", "Shaharni tanlang:"),
-            reply_markup=create_cities_keyboard(cities, lang)
+            reply_markup=await cities_keyboard(region_id, lang)
         )
 
     await callback.answer()
@@ -223,26 +184,10 @@ async def handle_choose_city(callback: CallbackQuery, state: FSMContext):
         city_id = int(callback.data.split(":")[1])
         await state.update_data(selected_city_id=city_id)
 
-        # Count for pagination in this city
-        total_q = select(Barber.id).join(User, Barber.user_id == User.id).where(User.city_id == city_id)
-        total = (await session.execute(total_q)).all()
-        total_count = len(total)
-        total_pages = max(1, ceil(total_count / PAGE_SIZE))
-
-        page = 1
+        # First page of this city
+        rows, page, total_pages = await directory_page(session, callback.bot.redis, city_id, 1, PAGE_SIZE)
         await state.update_data(barbers_page=page)
 
-        # Fetch current page (columns only)
-        stmt = (
-            select(Barber.id, Barber.score, User.name, User.surname)
-            .join(User, Barber.user_id == User.id)
-            .where(User.city_id == city_id)
-            .order_by(desc(Barber.score))
-            .limit(PAGE_SIZE)
-            .offset((page - 1) * PAGE_SIZE)
-        )
-        rows = (await session.execute(stmt)).all()
-
         if not rows:
             await callback.message.edit_text(
                 _t(lang, "😔 В этом городе пока нет барберов.", "😔 Bu shaharda hozircha barber yo‘q."),
@@ -271,12 +216,10 @@ async def back_to_regions(callback: CallbackQuery, state: FSMContext):
         user = (await session.execute(select(User).where(User.telegram_id == tg_user_id))).scalar_one_or_none()
         lang = getattr(user, "lang", "ru") if user else "ru"
 
-        regions = (await session.execute(select(Region).order_by(Region.id))).scalars().all()
-
         await state.update_data(selected_region_id=None, selected_city_id=None)
         await callback.message.edit_text(
             _t(lang, "Выберите регион:", "Regionni tanlang:"),
-            reply_markup=create_regions_keyboard(regions, lang)
+            reply_markup=await regions_keyboard(lang)
         )
 
     await callback.answer()
@@ -295,21 +238,16 @@ async def back_to_cities(callback: CallbackQuery, state: FSMContext):
 
         if not region_id:
             # fallback to regions
-            regions = (await session.execute(select(Region).order_by(Region.id))).scalars().all()
             await callback.message.edit_text(
                 _t(lang, "Выберите регион:", "Regionni tanlang:"),
-                reply_markup=create_regions_keyboard(regions, lang)
+                reply_markup=await regions_keyboard(lang)
             )
             await callback.answer()
             return
 
-        cities = (await session.execute(
-            select(City).where(City.region_id == region_id).order_by(City.id)
-        )).scalars().all()
-
         await callback.message.edit_text(
             _t(lang, "Выберите город:", "Shaharni tanlang:"),
-            reply_markup=create_cities_keyboard(cities, lang)
+            reply_markup=await cities_keyboard(region_id, lang)
         )
 
     await callback.answer()
@@ -325,10 +263,9 @@ async def back_root(callback: CallbackQuery, state: FSMContext):
 
         # Use user's city if available
         if not user or not user.region_id or not user.city_id:
-            regions = (await session.execute(select(Region).order_by(Region.id))).scalars().all()
             await callback.message.edit_text(
                 _t(lang, "Выберите регион:", "Regionni tanlang:"),
-                reply_markup=create_regions_keyboard(regions, lang)
+                reply_markup=await regions_keyboard(lang)
             )
             await callback.answer()
             return
@@ -338,31 +275,14 @@ async def back_root(callback: CallbackQuery, state: FSMContext):
         # Reset selected city in state to user's city context
         await state.update_data(selected_city_id=None)
 
-        # Count for pagination
-        total_q = select(Barber.id).join(User, Barber.user_id == User.id).where(User.city_id == city_id)
-        total = (await session.execute(total_q)).all()
-        total_count = len(total)
-        total_pages = max(1, ceil(total_count / PAGE_SIZE))
-
-        page = 1
+        # First page of this city
+        rows, page, total_pages = await directory_page(session, callback.bot.redis, city_id, 1, PAGE_SIZE)
         await state.update_data(barbers_page=page)
 
-        # Fetch first page (columns only)
-        stmt = (
-            select(Barber.id, Barber.score, User.name, User.surname)
-            .join(User, Barber.user_id == User.id)
-            .where(User.city_id == city_id)
-            .order_by(desc(Barber.score))
-            .limit(PAGE_SIZE)
-            .offset((page - 1) * PAGE_SIZE)
-        )
-        rows = (await session.execute(stmt)).all()
-
         if not rows:
-            regions = (await session.execute(select(Region).order_by(Region.id))).scalars().all()
             await callback.message.edit_text(
                 _t(lang, "Выберите регион:", "Regionni tanlang:"),
-                reply_markup=create_regions_keyboard(regions, lang)
+                reply_markup=await regions_keyboard(lang)
             )
             await callback.answer()
             return
@@ -417,7 +337,7 @@ async def handle_barber_selection(callback: CallbackQuery, state: FSMContext):
         lang = user.lang or "ru"
 
     # Redis + reply (outside DB session)
-    await redis_pool.set(f"user:{user.telegram_id}:last_action", "barber_profile")
+    await set_last_action(redis_pool, user.telegram_id, "barber_profile")
 
     text = "Siz tanlagan barber:" if lang == "uz" else "Вы выбрали барбера:"
     await callback.message.answer(
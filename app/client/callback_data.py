@@ -8,4 +8,7 @@ class SchedPickSlotCBClient(CallbackData, prefix="sp", sep="|"):  # 👈 sep cha
 
 class SchedPickSlotCBClientEdit(CallbackData, prefix="sched_edit"):
     day: str   # "YYYY-MM-DD"
-    hm: str    # "HHMM"
\ No newline at end of file
+    hm: str    # "HHMM"
+
+class MyRequestsPageCB(CallbackData, prefix="myreq"):
+    page: int
@@ -6,11 +6,14 @@ from sqlalchemy import select
 # ✅ make sure you import your async session factory
 # e.g., from app.core.db import AsyncSessionLocal
 from app.db import AsyncSessionLocal
+from app.identity import invalidate_identity
 
 from app.states import ChangeLocation
 from app.user.models import User
 from .keyboards import location_keyboard
 from .utils import get_region_city_multilang  # async version: (session, lat, lon) -> (Country, Region, City)
+from .barber_directory import sync_barber_directory
+from app.user_session import set_last_action
 
 client_basic = Router()
 
@@ -36,9 +39,10 @@ async def send_location(message: Message, state: FSMContext):
 
         tg_user.user_type = "client"
         await session.commit()
+    await invalidate_identity(redis_pool, message.from_user.id)
 
     # store last action in Redis (async)
-    await redis_pool.set(f"user:{message.from_user.id}:last_action", "client_location")
+    await set_last_action(redis_pool, message.from_user.id, "client_location")
 
     await message.answer(
         ".",
@@ -68,17 +72,20 @@ async def save_client_location(message: Message, state: FSMContext):
             )
             return
 
-        # 🔹 Reverse-geocode via Yandex (UZ/RU) and upsert Country/Region/City
-        print(lat, lon)
-        country, region, city = await get_region_city_multilang(session, lat, lon)
+        # 🔹 Reverse-geocode via Yandex (UZ/RU) and upsert Country/Region/City (geohash-cached)
+        country, region, city = await get_region_city_multilang(session, lat, lon, redis=message.bot.redis)
 
         # Save location if found
         if city and region and country:
+            old_city_id = tg_user.city_id
             tg_user.country_id = country.id
             tg_user.region_id = region.id
             tg_user.city_id = city.id
 
             await session.commit()
+            await invalidate_identity(message.bot.redis, message.from_user.id)
+            # a barber's own user row moves them between city directories too
+            await sync_barber_directory(session, message.bot.redis, user_id=tg_user.id, old_city_id=old_city_id)
 
             lang = (tg_user.lang or "uz").lower()
             city_name = city.name_uz if lang == "uz" else city.name_ru
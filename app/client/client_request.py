@@ -1,8 +1,9 @@
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
-from sqlalchemy import select, or_, and_
-from datetime import datetime, timedelta, time
+from sqlalchemy import select, or_
+from sqlalchemy.orm import aliased, contains_eager, joinedload
+from datetime import datetime, timedelta
 from app.user.models import User
 from app.barber.models import (
     Barber, BarberService, BarberSchedule
@@ -13,7 +14,16 @@ from .keyboards import build_barber_services_kb
 
 # your async session factory
 from app.db import AsyncSessionLocal  # ensure this import path is correct
+from app.query_budget import query_budget
+from app.notifier import get_notifier
 from .callback_data import SchedPickSlotCBClient
+from sqlalchemy.exc import IntegrityError
+from app.barber.schedule.availability import (
+    get_day_availability, invalidate_availability, minutes_to_time, ACTIVE_STATUSES,
+    is_slot_conflict, slot_taken_text,
+)
+from app.barber.schedule.day_summary import invalidate_day_summaries, summary_ref
+from app.user_session import clear_session, load_session, update_session
 
 client_request_router = Router()
 
@@ -25,8 +35,7 @@ async def on_client_slot_picked(callback: CallbackQuery, callback_data: SchedPic
     picked_hm = callback_data.hm  # "HHMM" -> e.g., "1530"
     # Normalize and store chosen time/day in redis (or state)
     redis = callback.bot.redis
-    await redis.set(f"user:{callback.from_user.id}:picked_day", picked_day)
-    await redis.set(f"user:{callback.from_user.id}:picked_hm", picked_hm)
+    await update_session(redis, callback.from_user.id, picked_day=picked_day, picked_hm=picked_hm)
 
     # Reset selected services (fresh picking after time)
     await state.update_data(selected_services=[])
@@ -136,6 +145,9 @@ async def toggle_service_callback(callback: CallbackQuery, state: FSMContext):
 
 
 @client_request_router.callback_query(F.data == "confirm_services")
+# 2 reads (user/client/barber/schedule, services) + 2 INSERTs (request, service lines) = 4;
+# a cold availability cache adds 3 (working day, working hours, the schedule's requests)
+@query_budget(7)
 async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     selected_ids = data.get("selected_services", [])
@@ -148,8 +160,8 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
         return
 
     redis = callback.bot.redis
-    picked_day = await redis.get(f"user:{callback.from_user.id}:picked_day")  # "YYYY-MM-DD"
-    picked_hm = await redis.get(f"user:{callback.from_user.id}:picked_hm")  # "HHMM"
+    picked = await load_session(redis, callback.from_user.id, "picked_day", "picked_hm")
+    picked_day, picked_hm = picked.picked_day, picked.picked_hm  # "YYYY-MM-DD", "HHMM"
 
     if not picked_day or not picked_hm:
         # Safety: user somehow reached here without picking a time
@@ -166,41 +178,35 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
     start_dt = datetime.combine(day_date, start_time)
 
     async with AsyncSessionLocal() as session:
-        # user & client
-        user = (
+        # user, client, the selected barber (+ their user, for the notification) and schedule: one statement
+        barber_user_t = aliased(User)
+        row = (
             await session.execute(
-                select(User).where(User.telegram_id == callback.from_user.id)
+                select(User, Client, Barber, barber_user_t, BarberSchedule)
+                .outerjoin(Client, Client.user_id == User.id)
+                .outerjoin(Barber, Barber.id == Client.selected_barber)
+                .outerjoin(barber_user_t, barber_user_t.id == Barber.user_id)
+                .outerjoin(BarberSchedule, BarberSchedule.id == Client.selected_schedule_id)
+                .where(User.telegram_id == callback.from_user.id)
+                .options(contains_eager(Client.user), contains_eager(Barber.user.of_type(barber_user_t)))
+                .limit(1)
             )
-        ).scalar_one_or_none()
-        if not user:
+        ).first()
+        if not row:
             await callback.message.answer("❌ User not found.")
             return
+        user, client, barber, barber_user, barber_schedule = row
 
-        client = (
-            await session.execute(
-                select(Client).where(Client.user_id == user.id)
-            )
-        ).scalar_one_or_none()
         if not client or not client.selected_barber:
             await callback.message.answer("❌ Barber not selected.")
             return
 
-        barber = (
-            await session.execute(
-                select(Barber).where(Barber.id == client.selected_barber)
-            )
-        ).scalar_one_or_none()
         if not barber or not barber.start_time or not barber.end_time:
             text = "❌ Barberning ish vaqti topilmadi." if lang == "uz" else "❌ Рабочее время барбера не найдено."
             await callback.message.answer(text)
             return
 
         # schedule (must match user's last selected schedule)
-        barber_schedule = (
-            await session.execute(
-                select(BarberSchedule).where(BarberSchedule.id == client.selected_schedule_id)
-            )
-        ).scalar_one_or_none()
         if not barber_schedule:
             await callback.message.answer("❌ Jadval topilmadi." if lang == "uz" else "❌ Расписание не найдено.")
             return
@@ -230,7 +236,9 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
         # Load selected services and compute totals
         services = (
             await session.execute(
-                select(BarberService).where(BarberService.id.in_(selected_ids))
+                select(BarberService)
+                .options(joinedload(BarberService.service))
+                .where(BarberService.id.in_(selected_ids))
             )
         ).scalars().all()
         total_duration = sum(s.duration or 0 for s in services)
@@ -252,34 +260,23 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
             await callback.message.answer(msg)
             return
 
-        # Check overlap within this schedule
-        conflict = (
-            await session.execute(
-                select(ClientRequest).where(
-                    ClientRequest.barber_schedule_id == barber_schedule.id,
-                    ClientRequest.status != "deny",
-                    ClientRequest.client_id != client.id,
-                    and_(ClientRequest.from_time < end_dt, ClientRequest.to_time > start_dt)
-                ).limit(1)
-            )
-        ).scalar_one_or_none()
+        # Check overlap within this schedule (pending + accepted of other clients)
+        avail = await get_day_availability(session, redis, barber_schedule.id)
+        start_min = start_dt.hour * 60 + start_dt.minute
+        conflict = avail is not None and not avail.is_free(
+            start_min, start_min + total_duration,
+            statuses=ACTIVE_STATUSES, exclude_client_id=client.id,
+        )
 
         if conflict:
             # Show busy ranges and stop
-            client_requests = (
-                await session.execute(
-                    select(ClientRequest).where(
-                        ClientRequest.barber_schedule_id == barber_schedule.id,
-                        ClientRequest.client_id != client.id
-                    )
-                )
-            ).scalars().all()
+            busy_ranges = avail.busy_ranges(exclude_client_id=client.id)
 
             await callback.message.answer("❌ Bu vaqt band!" if lang == "uz" else "❌ Это время уже занято!")
-            if client_requests:
+            if busy_ranges:
                 times_text = "\n".join(
-                    f"{cr.from_time.strftime('%H:%M')} - {cr.to_time.strftime('%H:%M')}"
-                    for cr in client_requests if cr.from_time and cr.to_time
+                    f"{minutes_to_time(st):%H:%M} - {minutes_to_time(en):%H:%M}"
+                    for st, en in busy_ranges
                 )
                 msg2 = (
                     f"📅 {sched_day.strftime('%d.%m.%Y')}\n⛔ Band vaqtlar:\n{times_text}"
@@ -289,27 +286,7 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
                 await callback.message.answer(msg2)
             return
 
-        # Prevent duplicate future request for same day/schedule
-        existing_for_today = (
-            await session.execute(
-                select(ClientRequest).where(
-                    ClientRequest.barber_schedule_id == barber_schedule.id,
-                    ClientRequest.barber_id == barber.id,
-                    ClientRequest.client_id == client.id,
-                    ClientRequest.date >= datetime.combine(day_date, time.min),
-                    ClientRequest.date <= datetime.combine(day_date, time.max),
-                    ClientRequest.from_time > now,
-                ).limit(1)
-            )
-        ).scalar_one_or_none()
-
-        # if existing_for_today:
-        #     text = "⚠️ Siz allaqachon so'rov yubordingiz" if lang == "uz" else "⚠️ Вы уже отправляли заявку"
-        #     await callback.message.answer(text)
-        #     await state.clear()
-        #     return
-
-        # Create request
+        # Create the request with its service lines: one flush, two INSERTs
         client_request_add = ClientRequest(
             client_id=client.id,
             barber_id=barber.id,
@@ -319,39 +296,25 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
             to_time=end_dt,
         )
         session.add(client_request_add)
-        await session.flush()
-
-        # Add service lines
-        for s in services:
-            exists = (
-                await session.execute(
-                    select(ClientRequestService).where(
-                        ClientRequestService.client_request_id == client_request_add.id,
-                        ClientRequestService.barber_service_id == s.id,
-                    ).limit(1)
-                )
-            ).scalar_one_or_none()
-            if not exists:
-                session.add(ClientRequestService(
-                    client_request_id=client_request_add.id,
-                    barber_service_id=s.id,
-                    duration=s.duration
-                ))
-
-        await session.commit()
+        session.add_all([
+            ClientRequestService(client_request=client_request_add, barber_service_id=s.id,
+                                 duration=s.duration, price=s.price)
+            for s in services
+        ])
+        try:
+            await session.commit()
+        except IntegrityError as e:
+            # someone booked an overlapping slot after our availability check
+            if not is_slot_conflict(e):
+                raise
+            await invalidate_availability(redis, barber_schedule.id)  # before rollback expires it
+            await session.rollback()
+            await callback.message.answer(slot_taken_text(lang))
+            return
+        await invalidate_availability(redis, barber_schedule.id)
+        await invalidate_day_summaries(redis, summary_ref(client_request_add))
         # --- Notify the barber that a new request arrived (UZ/RU) ---
-        # 1) Load barber's user to get telegram_id and language
-        barber_user = (
-            await session.execute(
-                select(User).where(User.id == barber.user_id)
-            )
-        ).scalar_one_or_none()
-
-        client_user = (
-            await session.execute(
-                select(User).where(User.id == client.user_id)
-            )
-        ).scalar_one_or_none()
+        client_user = user
 
         # Safety checks
         if barber_user and getattr(barber_user, "telegram_id", None):
@@ -422,16 +385,12 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
 
             barber_kb = InlineKeyboardMarkup(inline_keyboard=kb_rows)
 
-            # 6) Send the message to the barber
-            try:
-                await callback.bot.send_message(
-                    chat_id=barber_user.telegram_id,
-                    text=msg_for_barber,
-                    reply_markup=barber_kb
-                )
-            except Exception as e:
-                # You might want to log this
-                print("Failed to notify barber:", e)
+            # 6) Send the message to the barber (the dispatcher logs failed sends)
+            await get_notifier(callback.bot).send(
+                barber_user.telegram_id,
+                msg_for_barber,
+                reply_markup=barber_kb,
+            )
 
     # Feedback
     msg = (
@@ -449,5 +408,4 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
 
     # cleanup
     await state.clear()
-    await redis.delete(f"user:{callback.from_user.id}:picked_day")
-    await redis.delete(f"user:{callback.from_user.id}:picked_hm")
+    await clear_session(redis, callback.from_user.id, "picked_day", "picked_hm")
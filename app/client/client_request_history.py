@@ -3,23 +3,29 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
+from app.loaders import loader
+from collections import defaultdict
 from datetime import datetime
 
 from app.states import BookingState
 from app.user.models import User
-from app.barber.models import Barber, BarberService, BarberSchedule, BarberScheduleDetail, BarberServiceScore
+from app.barber.models import Barber, BarberSchedule, BarberScheduleDetail, BarberServiceScore
 from app.service.models import Service
 from app.client.models import Client, ClientRequest, ClientRequestService
 from .keyboards import create_score_keyboard, overall_skip_comment_kb
 from .utils import find_free_slots  # if you still use it elsewhere
+from .barber_directory import sync_barber_directory
+from app.barber.ratings import apply_score_delta
 
 from app.states import ScoreState
 from app.db import AsyncSessionLocal
+from app.query_budget import query_budget
 
 client_request_history_router = Router()
 
 
 @client_request_history_router.message(F.text.in_(["📊 Результаты заявок", "📊 So‘rovlar natijasi"]))
+@query_budget(14)
 async def client_request_history(message: Message, state: FSMContext):
     # lang heuristic from the button text; you might also prefer to read from User.lang
 
@@ -48,12 +54,7 @@ async def client_request_history(message: Message, state: FSMContext):
         # load completed requests, with required relations in one go
         requests_stmt = (
             select(ClientRequest)
-            .options(
-                selectinload(ClientRequest.barber).selectinload(Barber.user),
-                selectinload(ClientRequest.services)
-                .selectinload(ClientRequestService.barber_service)
-                .selectinload(BarberService.service),
-            )
+            .options(*loader("request_history"))
             .where(
                 ClientRequest.client_id == client.id,
                 ClientRequest.barber_id == client.selected_barber,
@@ -67,6 +68,22 @@ async def client_request_history(message: Message, state: FSMContext):
         if not client_requests:
             await message.answer("❌ So‘rovlar topilmadi." if lang == "uz" else "❌ Заявки не найдены.")
             return
+        # per-service scores of every listed request, in one query
+        scores_by_request = defaultdict(list)
+        scores = (
+            await session.execute(
+                select(BarberServiceScore)
+                .options(*loader("score_render"))
+                .where(
+                    BarberServiceScore.client_request_id.in_([r.id for r in client_requests]),
+                    BarberServiceScore.client_id == client.id,
+                )
+                .order_by(BarberServiceScore.id)
+            )
+        ).scalars().all()
+        for sc in scores:
+            scores_by_request[sc.client_request_id].append(sc)
+
         services_text, total_price, total_duration = "", 0, 0
         price_unit = "so'm" if lang == "uz" else "сум"
         min_unit = "min" if lang == "uz" else "мин"
@@ -84,23 +101,13 @@ async def client_request_history(message: Message, state: FSMContext):
                 if not service or not service.service:
                     continue
                 service_name = service.service.name_uz if lang == "uz" else service.service.name_ru
-                price = getattr(service, "price", 0) or 0
+                price = (s.price if s.price is not None else service.price) or 0  # as booked
                 duration = s.duration or getattr(service, "duration", 0) or 0
                 total_price += price
                 total_duration += duration
                 services_text += f"{service_name}: {price} so'm, {duration}min\n"
 
-            # per-service scores
-            existing_scores = (
-                await session.execute(
-                    select(BarberServiceScore)
-                    .options(selectinload(BarberServiceScore.barber_service))
-                    .where(
-                        BarberServiceScore.client_request_id == req.id,
-                        BarberServiceScore.client_id == client.id,
-                    )
-                )
-            ).scalars().all()
+            existing_scores = scores_by_request[req.id]
 
             score_text, total_score = "", 0
             if existing_scores:
@@ -192,33 +199,15 @@ async def handle_score(callback: CallbackQuery, state: FSMContext):
             barber_id=client_request.barber_id
         )
         session.add(new_score)
-        all_scores = (
-            await session.execute(
-                select(BarberServiceScore)
-                .where(
-                    BarberServiceScore.barber_id == client_request.barber_id,
-                )
-            )
-        )
-
-        overall_score = 0
-        all_scores = all_scores.scalars().all()
-        if all_scores:
-            all_scores = [s.score for s in all_scores]
-            overall_score = sum(all_scores) / len(all_scores)
-        barber = (
-            await session.execute(
-                select(Barber).where(Barber.id == client_request.barber_id)
-            ))
-        barber = barber.scalar_one_or_none()
-        if not barber:
+        if not client_request.barber_id or not await session.get(Barber, client_request.barber_id):
             await callback.answer("❌ Barber topilmadi.", show_alert=True)
             return
-        barber.score = overall_score
-        await session.commit()
-        # mark service as scored
+        # O(1): move the running aggregates instead of re-reading every review
+        await apply_score_delta(session, client_request.barber_id, service_id, score, 1)
+        # mark service as scored (same transaction as the score + aggregates)
         crs.status = True
         await session.commit()
+        await sync_barber_directory(session, callback.bot.redis, barber_id=client_request.barber_id)
 
         await callback.answer("✅ Ballingiz saqlandi!")
 
@@ -227,10 +216,7 @@ async def handle_score(callback: CallbackQuery, state: FSMContext):
             await session.execute(
                 select(ClientRequest)
                 .options(
-                    selectinload(ClientRequest.barber).selectinload(Barber.user),
-                    selectinload(ClientRequest.services)
-                    .selectinload(ClientRequestService.barber_service)
-                    .selectinload(BarberService.service),
+                    *loader("request_history"),
                     selectinload(ClientRequest.scores),  # so we can render fresh scores if needed
                 )
                 .where(ClientRequest.id == request_id)
@@ -252,7 +238,7 @@ async def handle_score(callback: CallbackQuery, state: FSMContext):
             if not service or not service.service:
                 continue
             service_name = service.service.name_uz if lang == "uz" else service.service.name_ru
-            price = getattr(service, "price", 0) or 0
+            price = (s.price if s.price is not None else service.price) or 0  # as booked
             duration = s.duration or getattr(service, "duration", 0) or 0
             total_price += price
             total_duration += duration
@@ -262,7 +248,7 @@ async def handle_score(callback: CallbackQuery, state: FSMContext):
         existing_scores = (
             await session.execute(
                 select(BarberServiceScore)
-                .options(selectinload(BarberServiceScore.barber_service).selectinload(BarberService.service))
+                .options(*loader("score_render"))
                 .where(
                     BarberServiceScore.client_request_id == req.id,
                     BarberServiceScore.client_id == client.id,
@@ -1,10 +1,16 @@
+import logging
+
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
-from sqlalchemy import select, and_
+from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timedelta, time
-from .callback_data import SchedPickSlotCBClientEdit
+from typing import Optional
+from aiogram.exceptions import TelegramBadRequest
+from .callback_data import SchedPickSlotCBClientEdit, MyRequestsPageCB
+from .my_requests import load_my_requests_page, render_my_requests, my_requests_keyboard
+from app.identity import Identity, get_identity
 from app.states import BookingState
 from app.user.models import User
 from app.barber.models import (
@@ -19,112 +25,68 @@ from .keyboards import (
 
 # ✅ your async session factory
 from app.db import AsyncSessionLocal  # ensure the import path is correct
+from app.query_budget import query_budget
+from sqlalchemy.exc import IntegrityError
+from app.barber.schedule.availability import (
+    get_day_availability, invalidate_availability, ACCEPTED, is_slot_conflict, slot_taken_text
+)
+from app.barber.schedule.day_summary import invalidate_day_summaries, summary_ref
+from app.user_session import set_last_action, update_session
+
+logger = logging.getLogger(__name__)
 
 client_request_info_router = Router()
 
 
 @client_request_info_router.message(F.text.in_(["📋 So‘rovlarim", '📋 Мои заявки']))
-async def my_requests(message: Message, state: FSMContext):
+@query_budget(3)
+async def my_requests(message: Message, state: FSMContext, identity: Optional[Identity] = None):
     async with AsyncSessionLocal() as session:
-        tg_user = (
-            await session.execute(
-                select(User).where(User.telegram_id == message.from_user.id)
-            )
-        ).scalar_one_or_none()
-        if not tg_user:
+        if identity is None:
+            identity = await get_identity(message.bot.redis, message.from_user.id, session)
+        if not identity:
             await message.answer(
                 "❌ Пользователь не найден." if getattr(message.from_user, "lang",
                                                        "uz") != "uz" else "❌ Foydalanuvchi topilmadi."
             )
             return
-
-        client = (
-            await session.execute(
-                select(Client).where(Client.user_id == tg_user.id)
-            )
-        ).scalar_one_or_none()
-        if not client:
-            await message.answer("❌ Клиент не найден." if tg_user.lang != "uz" else "❌ Klient topilmadi.")
+        lang = identity.lang
+        if not identity.client_id:
+            await message.answer("❌ Клиент не найден." if lang != "uz" else "❌ Klient topilmadi.")
             return
 
-        # safe range for "today and after" if ClientRequest.date is TIMESTAMP
-        today = datetime.now().date()
-        start_of_today = datetime.combine(today, time.min)
+        data = await load_my_requests_page(session, identity.client_id)
 
-        client_requests = (
-            await session.execute(
-                select(ClientRequest)
-                .where(
-                    ClientRequest.client_id == client.id,
-                    ClientRequest.date >= start_of_today,
-                    ClientRequest.status == "pending",
-                )
-                .order_by(ClientRequest.date.desc())
-            )
-        ).scalars().all()
-
-        lang = tg_user.lang
-        if not client_requests:
-            msg = "📋 Sizda hali so'rovlar yo'q." if lang == "uz" else "📋 У вас пока нет заявок."
-            await message.answer(msg)
-            return
-
-        for cr in client_requests:
-            barber = (
-                await session.execute(
-                    select(Barber)
-                    .options(selectinload(Barber.user))
-                    .where(Barber.id == cr.barber_id)
-                )
-            ).scalar_one_or_none()
+    if not data.rows:
+        msg = "📋 Sizda hali so'rovlar yo'q." if lang == "uz" else "📋 У вас пока нет заявок."
+        await message.answer(msg)
+        return
+    await message.answer(render_my_requests(data, lang), reply_markup=my_requests_keyboard(data, lang))
 
-            cr_services = (
-                await session.execute(
-                    select(ClientRequestService)
-                    .where(ClientRequestService.client_request_id == cr.id)
-                    .order_by(ClientRequestService.barber_service_id)
-                )
-            ).scalars().all()
 
-            # Build services text and total price
-            services_text = ""
-            total_price = 0
-            for crs in cr_services:
-                service = (
-                    await session.execute(
-                        select(BarberService)
-                        .options(selectinload(BarberService.service))
-                        .where(BarberService.id == crs.barber_service_id)
-                    )
-                ).scalar_one_or_none()
-                if not service:
-                    continue
-                total_price += service.price or 0
-                if lang == "uz":
-                    services_text += f"\n   ✂️ {service.service.name_uz} ({service.price} so'm, {service.duration} daqiqa)"
-                else:
-                    services_text += f"\n   ✂️ {service.service.name_ru} ({service.price} сум, {service.duration} мин.)"
-
-            if lang == "uz":
-                text = (
-                    f"✂️ Barber: {barber.user.name if barber and barber.user else ''} {barber.user.surname if barber and barber.user else ''}\n"
-                    f"📅 Sana: {cr.date.strftime('%d.%m.%Y')}\n"
-                    f"⏰ Vaqt: {cr.from_time.strftime('%H:%M')} - {cr.to_time.strftime('%H:%M')}\n"
-                    f"📌 Holat: {'✅ Tasdiqlangan' if cr.status == 'accept' else '❌ Rad etilgan' if cr.status == 'deny' else '⏳ Kutilmoqda'}\n"
-                    f"🧾 Xizmatlar:{services_text}\n"
-                    f"💰 Umumiy narx: {total_price} so'm"
-                )
-            else:
-                text = (
-                    f"✂️ Барбер: {barber.user.name if barber and barber.user else ''} {barber.user.surname if barber and barber.user else ''}\n"
-                    f"📅 Дата: {cr.date.strftime('%d.%m.%Y')}\n"
-                    f"⏰ Время: {cr.from_time.strftime('%H:%M')} - {cr.to_time.strftime('%H:%M')}\n"
-                    f"📌 Статус: {'✅ Подтверждено' if cr.status == 'accept' else '❌ Отклонено' if cr.status == 'deny' else '⏳ В ожидании'}\n"
-                    f"🧾 Услуги:{services_text}\n"
-                    f"💰 Общая сумма: {total_price} сум"
-                )
+@client_request_info_router.callback_query(MyRequestsPageCB.filter())
+@query_budget(3)
+async def my_requests_page(callback: CallbackQuery, callback_data: MyRequestsPageCB,
+                           identity: Optional[Identity] = None):
+    async with AsyncSessionLocal() as session:
+        if identity is None:
+            identity = await get_identity(callback.bot.redis, callback.from_user.id, session)
+        if not identity or not identity.client_id:
+            await callback.answer("❌ Xatolik yuz berdi", show_alert=True)
+            return
+        data = await load_my_requests_page(session, identity.client_id, callback_data.page)
 
-            await message.answer(text, reply_markup=client_request_keyboard(cr, lang))
+    lang = identity.lang
+    if not data.rows:
+        text = "📋 Sizda hali so'rovlar yo'q." if lang == "uz" else "📋 У вас пока нет заявок."
+        markup = None
+    else:
+        text, markup = render_my_requests(data, lang), my_requests_keyboard(data, lang)
+    try:
+        await callback.message.edit_text(text, reply_markup=markup)
+    except TelegramBadRequest:
+        pass  # "message is not modified"
+    await callback.answer()
 
 
 @client_request_info_router.callback_query(F.data.startswith("req_feedback:"))
@@ -218,7 +180,7 @@ async def show_request_details(callback: CallbackQuery, state: FSMContext):
         await session.commit()
 
         await state.update_data(request_id=request_id)
-        await redis_pool.set(f"user:{user.telegram_id}:last_action", "request_profile")
+        await set_last_action(redis_pool, user.telegram_id, "request_profile")
 
     text = "✏️ So‘rovni tahrirlash:" if user.lang == "uz" else "✏️ Редактировать заявку:"
     await callback.message.answer(text, reply_markup=edit_request_keyboard(user.lang))
@@ -399,7 +361,8 @@ async def toggle_service_callback(callback: CallbackQuery, state: FSMContext):
                     .order_by(BarberService.service_id)
                 )
             ).scalars().all()
-    print(lang)
+    logger.debug("edit services of request %s: %s selected, lang=%s", client.selected_request_id if client else None,
+                 len(selected_ids), lang)
     kb = build_barber_edit_services_kb(barber_services, lang, selected_ids)
     text = "👇 Xizmatlarni tanlang:" if lang == "uz" else "👇 Выберите услугу:"
     await callback.message.edit_text(text, reply_markup=kb)
@@ -435,23 +398,23 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
             .where(BarberService.id.in_(selected_ids))
         )).scalars().all()
 
-        await redis_pool.set(
-            f"user:{callback.from_user.id}:selected_services",
-            ",".join(map(str, selected_ids))
-        )
+        await update_session(redis_pool, callback.from_user.id, selected_services=",".join(map(str, selected_ids)))
 
-        # Clear old services (use DELETE directly)
-        await session.execute(
-            ClientRequestService.__table__.delete().where(
+        # Clear old services (ORM deletes, so schedule totals follow)
+        old_rows = (await session.execute(
+            select(ClientRequestService).where(
                 ClientRequestService.client_request_id == client.selected_request_id
             )
-        )
+        )).scalars().all()
+        for row in old_rows:
+            await session.delete(row)
 
         # Add new services
         for srv in services:
             session.add(ClientRequestService(
                 client_request_id=client.selected_request_id,
-                barber_service_id=srv.id
+                barber_service_id=srv.id,
+                price=srv.price,
             ))
 
         # ⬇️ NEW: recompute total duration and update request end time
@@ -476,7 +439,20 @@ async def confirm_services_callback(callback: CallbackQuery, state: FSMContext):
             # cr.total_minutes = total_duration
             # cr.total_price = sum((srv.price or 0) for srv in services)
 
-        await session.commit()
+        sched_id = cr.barber_schedule_id if cr else None
+        try:
+            await session.commit()
+        except IntegrityError as e:
+            # the longer booking now overlaps someone else's
+            if not is_slot_conflict(e):
+                raise
+            await session.rollback()
+            await callback.message.answer(slot_taken_text(lang))
+            await callback.answer()
+            return
+        if cr:
+            await invalidate_availability(redis_pool, sched_id)
+            await invalidate_day_summaries(redis_pool, summary_ref(cr))
 
     # Build UI text
     if lang == "uz":
@@ -527,6 +503,7 @@ async def change_time(message: Message):
             barber_id=client_request.barber_id,
             sched_id=client_request.barber_schedule_id,
             slot_minutes=30,
+            redis=message.bot.redis,
         )
 
     txt = "🕒 Yangi vaqtni tanlang:" if lang == "uz" else "🕒 Выберите новое время:"
@@ -624,16 +601,11 @@ async def on_client_pick_slot(call: CallbackQuery, callback_data: SchedPickSlotC
             return
 
         # conflicts: accepted requests on the same schedule, others only
-        conflict = (await session.execute(
-            select(ClientRequest)
-            .where(
-                ClientRequest.barber_schedule_id == barber_schedule.id,
-                ClientRequest.status == "accept",
-                ClientRequest.client_id != client.id,
-                and_(ClientRequest.from_time < end_dt, ClientRequest.to_time > start_dt)
-            )
-            .limit(1)
-        )).scalar_one_or_none()
+        avail = await get_day_availability(session, call.bot.redis, barber_schedule.id)
+        start_min = start_dt.hour * 60 + start_dt.minute
+        conflict = avail is not None and not avail.is_free(
+            start_min, start_min + total_duration, statuses=ACCEPTED, exclude_client_id=client.id
+        )
 
         if conflict:
             await call.answer("❌ Bu vaqt band!" if lang == "uz" else "❌ Это время занято!", show_alert=True)
@@ -648,9 +620,21 @@ async def on_client_pick_slot(call: CallbackQuery, callback_data: SchedPickSlotC
             await call.answer("❌ So‘rov topilmadi." if lang == "uz" else "❌ Заявление не найдено.", show_alert=True)
             return
 
+        old_ref = summary_ref(client_request)
         client_request.from_time = start_dt
         client_request.to_time = end_dt
-        await session.commit()
+        sched_id = client_request.barber_schedule_id
+        try:
+            await session.commit()
+        except IntegrityError as e:
+            if not is_slot_conflict(e):
+                raise
+            await session.rollback()
+            await invalidate_availability(call.bot.redis, sched_id)
+            await call.answer(slot_taken_text(lang), show_alert=True)
+            return
+        await invalidate_availability(call.bot.redis, sched_id)
+        await invalidate_day_summaries(call.bot.redis, old_ref, summary_ref(client_request))
 
     # UX: confirm & remove keyboard
     txt_ok = ("✅ Vaqt o‘zgartirildi: "
@@ -723,6 +707,8 @@ async def cancel(message: Message, state: FSMContext):
 
         # 3) Commit once
         await session.commit()
+        await invalidate_availability(redis_pool, client_request.barber_schedule_id)
+        await invalidate_day_summaries(redis_pool, summary_ref(client_request))
 
         # cache what we need after session closes
         user_lang = user.lang if user else "uz"
@@ -732,5 +718,5 @@ async def cancel(message: Message, state: FSMContext):
     await state.clear()
     text = "✅ So'rov muvaffaqiyatli bekor qilindi." if user_lang == "uz" else "✅ Заявление успешно отменено."
     keyboard = barber_menu(user_lang)
-    await redis_pool.set(f"user:{user_tgid}:last_action", "barber_schedule")
+    await set_last_action(redis_pool, user_tgid, "barber_schedule")
     await message.answer(text, reply_markup=keyboard)
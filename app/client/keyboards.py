@@ -1,13 +1,16 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from app.barber.models import BarberSchedule
 from aiogram.types import CallbackQuery
-from app.barber.schedule.schedule_utils import _working_time_windows, _overlaps, fetch_requests_for_schedule
-from datetime import datetime, timedelta, time, date
-from typing import List, Tuple
+from app.barber.schedule.availability import get_day_availability, minutes_to_time
+from datetime import datetime, timedelta, time
+from typing import List
 from .callback_data import SchedPickSlotCBClient, SchedPickSlotCBClientEdit
 from typing import List, Optional
+from app.keyboard_cache import keyboard_cache, static_keyboard
+from app.refdata import refdata
 
+
+@static_keyboard("location")
 def location_keyboard(lang: str) -> ReplyKeyboardMarkup:
     if lang == "ru":
         location_text = "📍 Отправить мою локацию"
@@ -152,6 +155,20 @@ def create_cities_keyboard(cities, lang="ru"):
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+async def regions_keyboard(lang="ru") -> InlineKeyboardMarkup:
+    """Region picker built once per language and refdata snapshot."""
+    snap = await refdata.snapshot()
+    return keyboard_cache.get("regions", lang, snap.generation,
+                              lambda: create_regions_keyboard(snap.regions, lang))
+
+
+async def cities_keyboard(region_id: int, lang="ru") -> InlineKeyboardMarkup:
+    snap = await refdata.snapshot()
+    cities = snap.cities_by_region.get(region_id, ())
+    return keyboard_cache.get(("cities", region_id), lang, snap.generation,
+                              lambda: create_cities_keyboard(cities, lang))
+
+
 def create_back_to_cities_keyboard(lang="ru"):
     return InlineKeyboardMarkup(inline_keyboard=[[
         InlineKeyboardButton(
@@ -165,6 +182,7 @@ def create_back_to_cities_keyboard(lang="ru"):
     ]])
 
 
+@static_keyboard("barber_menu")
 def barber_menu(lang: str = "uz") -> ReplyKeyboardMarkup:
     ru = {
         "info": "✂️ Информация о барбере",
@@ -258,84 +276,47 @@ def kb_with_client_back(base_kb: InlineKeyboardMarkup, lang: str = "uz") -> Inli
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+def _client_slot_buttons(avail, slot_minutes: int, make_cb) -> List[InlineKeyboardButton]:
+    buttons: List[InlineKeyboardButton] = []
+    for (w_start, w_end), slots in avail.slot_grid(slot_minutes):
+        # clickable slots that FINISH <= window end
+        for start_min, is_free in slots:
+            s = minutes_to_time(start_min)
+            buttons.append(InlineKeyboardButton(
+                text=("🟢 " if is_free else "🔴 ") + s.strftime("%H:%M"),
+                callback_data=make_cb(
+                    day=avail.day.strftime("%Y-%m-%d"),
+                    hm=s.strftime("%H%M"),
+                ).pack() if is_free else "noop",
+            ))
+
+        # Finish tick — ALWAYS red & non-clickable (barber ends at w_end)
+        buttons.append(InlineKeyboardButton(
+            text="🔴 " + minutes_to_time(w_end).strftime("%H:%M"),
+            callback_data="noop",
+        ))
+    return buttons
+
+
 async def kb_day_slots_by_sched_client(
         session,
         barber_id: int,
         sched_id: int,
         slot_minutes: int = 30,
+        redis=None,
 ) -> InlineKeyboardMarkup:
     # Safety
     if slot_minutes <= 0:
         # fall back to 30 if misconfigured
         slot_minutes = 30
 
-    sched = await session.get(BarberSchedule, sched_id)
-    if not sched or sched.barber_id != barber_id or not sched.day:
+    avail = await get_day_availability(session, redis, sched_id, barber_id)
+    if not avail:
         return InlineKeyboardMarkup(inline_keyboard=[[
             InlineKeyboardButton(text="⚪️ Off", callback_data="noop")
         ]])
 
-    the_day: date = sched.day.date()
-    windows = await _working_time_windows(session, barber_id, the_day)
-    # normalize/sort and drop invalid windows
-    windows = [(ws, we) for (ws, we) in sorted(windows) if we > ws]
-
-    # Requests are tied to the SCHEDULE
-    reqs = await fetch_requests_for_schedule(session, barber_id, sched_id)
-    # Busy intervals (HH:MM only), then merge
-    busy: List[Tuple[time, time]] = []
-    for cr in reqs:
-        ft, tt = getattr(cr, "from_time", None), getattr(cr, "to_time", None)
-        if ft and tt:
-            st, en = (ft.time(), tt.time()) if hasattr(ft, "time") else (ft, tt)
-            if st < en:
-                busy.append((st, en))
-    busy.sort()
-    # merge overlaps to speed checks
-    merged: List[Tuple[time, time]] = []
-    for st, en in busy:
-        if not merged or st >= merged[-1][1]:
-            merged.append((st, en))
-        else:
-            # overlap → extend last
-            merged[-1] = (merged[-1][0], max(merged[-1][1], en))
-    busy = merged
-    now = datetime.now()
-    is_today = (the_day == now.date())
-
-    buttons: List[InlineKeyboardButton] = []
-
-    for (w_start, w_end) in windows:
-        cur = datetime.combine(the_day, w_start)
-        end_dt = datetime.combine(the_day, w_end)
-
-        # Build clickable slots that FINISH <= end_dt
-        step = timedelta(minutes=slot_minutes)
-        while cur + timedelta(minutes=slot_minutes) <= end_dt:
-            s = cur.time()
-            e = (cur + step).time()
-
-            # If today, don’t allow past starts
-            in_past = is_today and (cur <= now)
-
-            is_free = all(not _overlaps(s, e, b1, b2) for (b1, b2) in busy)
-            buttons.append(InlineKeyboardButton(
-                text=("🟢 " if is_free else "🔴 ") + s.strftime("%H:%M"),
-                callback_data=(
-                    SchedPickSlotCBClient(
-                        day=the_day.strftime("%Y-%m-%d"),
-                        hm=s.strftime("%H%M"),
-                    ).pack()
-                    if is_free else "noop"
-                ),
-            ))
-            cur += step
-
-        # Finish tick — ALWAYS red & non-clickable (barber ends at w_end)
-        buttons.append(InlineKeyboardButton(
-            text="🔴 " + end_dt.strftime("%H:%M"),
-            callback_data="noop",
-        ))
+    buttons = _client_slot_buttons(avail, slot_minutes, SchedPickSlotCBClient)
 
     # 3 per row; client back
     rows = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
@@ -351,83 +332,23 @@ async def kb_day_slots_by_sched_client_to_change(
         barber_id: int,
         sched_id: int,
         slot_minutes: int = 30,
+        redis=None,
 ) -> InlineKeyboardMarkup:
     # Safety
     if slot_minutes <= 0:
         # fall back to 30 if misconfigured
         slot_minutes = 30
 
-    sched = await session.get(BarberSchedule, sched_id)
-    if not sched or sched.barber_id != barber_id or not sched.day:
+    avail = await get_day_availability(session, redis, sched_id, barber_id)
+    if not avail:
         return InlineKeyboardMarkup(inline_keyboard=[[
             InlineKeyboardButton(text="⚪️ Off", callback_data="noop")
         ]])
 
-    the_day: date = sched.day.date()
-    windows = await _working_time_windows(session, barber_id, the_day)
-    # normalize/sort and drop invalid windows
-    windows = [(ws, we) for (ws, we) in sorted(windows) if we > ws]
-
-    # Requests are tied to the SCHEDULE
-    reqs = await fetch_requests_for_schedule(session, barber_id, sched_id)
-    # Busy intervals (HH:MM only), then merge
-    busy: List[Tuple[time, time]] = []
-    for cr in reqs:
-        ft, tt = getattr(cr, "from_time", None), getattr(cr, "to_time", None)
-        if ft and tt:
-            st, en = (ft.time(), tt.time()) if hasattr(ft, "time") else (ft, tt)
-            if st < en:
-                busy.append((st, en))
-    busy.sort()
-    # merge overlaps to speed checks
-    merged: List[Tuple[time, time]] = []
-    for st, en in busy:
-        if not merged or st >= merged[-1][1]:
-            merged.append((st, en))
-        else:
-            # overlap → extend last
-            merged[-1] = (merged[-1][0], max(merged[-1][1], en))
-    busy = merged
-    now = datetime.now()
-    is_today = (the_day == now.date())
-
-    buttons: List[InlineKeyboardButton] = []
-
-    for (w_start, w_end) in windows:
-        cur = datetime.combine(the_day, w_start)
-        end_dt = datetime.combine(the_day, w_end)
-
-        # Build clickable slots that FINISH <= end_dt
-        step = timedelta(minutes=slot_minutes)
-        while cur + timedelta(minutes=slot_minutes) <= end_dt:
-            s = cur.time()
-            e = (cur + step).time()
+    buttons = _client_slot_buttons(avail, slot_minutes, SchedPickSlotCBClientEdit)
 
-            # If today, don’t allow past starts
-            in_past = is_today and (cur <= now)
-
-            is_free = all(not _overlaps(s, e, b1, b2) for (b1, b2) in busy)
-            buttons.append(InlineKeyboardButton(
-                text=("🟢 " if is_free else "🔴 ") + s.strftime("%H:%M"),
-                callback_data=(
-                    SchedPickSlotCBClientEdit(
-                        day=the_day.strftime("%Y-%m-%d"),
-                        hm=s.strftime("%H%M"),
-                    ).pack()
-                    if is_free else "noop"
-                ),
-            ))
-            cur += step
-
-        # Finish tick — ALWAYS red & non-clickable (barber ends at w_end)
-        buttons.append(InlineKeyboardButton(
-            text="🔴 " + end_dt.strftime("%H:%M"),
-            callback_data="noop",
-        ))
-
-    # 3 per row; client back
+    # 3 per row
     rows = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
-    # rows.append([InlineKeyboardButton(text="⬅️ Back", callback_data="barber_back")])
 
     return InlineKeyboardMarkup(inline_keyboard=rows or [[
         InlineKeyboardButton(text="⚪️ Off", callback_data="barber_back")
@@ -1,9 +1,11 @@
-from app.db import Base
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, BigInteger
+from app.db import Base, LAZY
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, BigInteger, Computed, Index, text
+from sqlalchemy.dialects.postgresql import TSRANGE, ExcludeConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import Optional
+import datetime as dt
 from datetime import datetime
-from sqlalchemy import DateTime
+from sqlalchemy import Date, DateTime
 
 
 class Client(Base):
@@ -12,45 +14,96 @@ class Client(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     score: Mapped[int] = mapped_column(Integer, nullable=True)
     blocked: Mapped[bool] = mapped_column(Boolean, nullable=True)
-    requests = relationship("ClientRequest", back_populates="client", lazy="selectin")
-    scores = relationship("BarberServiceScore", back_populates="client", lazy="selectin")
+    requests = relationship("ClientRequest", back_populates="client", lazy=LAZY)
+    scores = relationship("BarberServiceScore", back_populates="client", lazy=LAZY)
     user = relationship("app.user.models.User", back_populates="client", uselist=False, lazy="selectin")
     selected_barber: Mapped[int] = mapped_column(BigInteger, nullable=True)
     selected_schedule_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
     selected_request_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
-    barbers = relationship("ClientBarbers", back_populates="client", lazy="selectin")
+    barbers = relationship("ClientBarbers", back_populates="client", lazy=LAZY)
+
+
+SLOT_EXCLUSION = "ex_client_requests_barber_slot"
+
+# the day a request belongs to: from_time's date, or `date` when no time was picked
+DAY_EXPR = "CAST(COALESCE(from_time, date) AS DATE)"
+
+
+def minute_expr(col: str) -> str:
+    """Minute of day (0..1439) of a TIMESTAMP column, seconds dropped."""
+    return f"CAST(EXTRACT(HOUR FROM {col}) * 60 + EXTRACT(MINUTE FROM {col}) AS INTEGER)"
 
 
 class ClientRequest(Base):
     __tablename__ = "client_requests"
+    __table_args__ = (
+        # one barber, no overlapping pending/accepted bookings (migration 0005)
+        ExcludeConstraint(
+            ("barber_id", "="), ("slot", "&&"),
+            name=SLOT_EXCLUSION,
+            using="gist",
+            where=text("status IN ('pending', 'accept')"),
+        ),
+        # hot-path indexes (migration 0006)
+        Index("ix_client_requests_barber_status_from", "barber_id", "status", "from_time"),
+        Index("ix_client_requests_sched_status", "barber_schedule_id", "status"),
+        Index("ix_client_requests_client_pending", "client_id", "date",
+              postgresql_where=text("status = 'pending'")),
+        # day / time-of-day lookups as range scans (migration 0007)
+        Index("ix_client_requests_barber_status_day", "barber_id", "status", "day", "from_minute"),
+        Index("ix_client_requests_reminder_due", "day", "from_minute",
+              postgresql_where=text("status = 'accept' AND reminder_sent_at IS NULL")),
+    )
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     client_id: Mapped[int] = mapped_column(ForeignKey("client.id"), nullable=True)
     barber_id: Mapped[int] = mapped_column(ForeignKey("barbers.id"))
     date: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     from_time: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     to_time: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
-    client = relationship("Client", back_populates="requests")
-    barber = relationship("Barber", back_populates="requests")
+    client = relationship("Client", back_populates="requests", lazy=LAZY)
+    barber = relationship("Barber", back_populates="requests", lazy=LAZY)
     status: Mapped[str] = mapped_column(String(255), nullable=True, default="pending")
     comment: Mapped[str] = mapped_column(String(255), nullable=True)
-    scores = relationship("BarberServiceScore", back_populates="client_request", lazy="selectin")
-    schedule_details = relationship("BarberScheduleDetail", back_populates="client_request", lazy="selectin")
-    services = relationship("ClientRequestService", back_populates="client_request", lazy="selectin")
+    scores = relationship("BarberServiceScore", back_populates="client_request", lazy=LAZY)
+    schedule_details = relationship("BarberScheduleDetail", back_populates="client_request", lazy=LAZY)
+    services = relationship("ClientRequestService", back_populates="client_request", lazy=LAZY)
     barber_schedule_id: Mapped[int] = mapped_column(ForeignKey("barber_schedule.id", ondelete="CASCADE"), nullable=True)
-    barber_schedule = relationship("BarberSchedule", back_populates="requests", lazy="selectin")
+    barber_schedule = relationship("BarberSchedule", back_populates="requests", lazy=LAZY)
     overall_score: Mapped[int] = mapped_column(Integer, nullable=True)
     discount: Mapped[int] = mapped_column(Integer, nullable=True)
-    reminder_sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    reminder_sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # both reminded
+    # per-recipient delivery of the reminder, so a retry only re-sends the part that failed (migration 0009)
+    client_reminded_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    barber_reminded_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # [from_time, to_time) maintained by Postgres; used for overlap checks only
+    slot = mapped_column(
+        TSRANGE,
+        Computed("CASE WHEN from_time < to_time THEN tsrange(from_time, to_time, '[)') END", persisted=True),
+        nullable=True,
+        deferred=True,
+    )
+    # business day and minute-of-day, maintained by Postgres; filter on these instead of casting
+    day: Mapped[Optional[dt.date]] = mapped_column(
+        Date, Computed(DAY_EXPR, persisted=True), nullable=True, deferred=True,
+    )
+    from_minute: Mapped[Optional[int]] = mapped_column(
+        Integer, Computed(minute_expr("from_time"), persisted=True), nullable=True, deferred=True,
+    )
+    to_minute: Mapped[Optional[int]] = mapped_column(
+        Integer, Computed(minute_expr("to_time"), persisted=True), nullable=True, deferred=True,
+    )
 
 
 class ClientRequestService(Base):
     __tablename__ = "client_requests_services"
+    __table_args__ = (Index("ix_client_requests_services_request", "client_request_id"),)
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     client_request_id: Mapped[int] = mapped_column(ForeignKey("client_requests.id"))
     barber_service_id: Mapped[int] = mapped_column(ForeignKey("barber_services.id"))
-    barber_service = relationship("BarberService", back_populates="requests_services")
+    barber_service = relationship("BarberService", back_populates="requests_services", lazy=LAZY)
     duration: Mapped[int] = mapped_column(Integer, nullable=True)
-    client_request = relationship("ClientRequest", back_populates="services")
+    price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # BarberService.price when booked
+    client_request = relationship("ClientRequest", back_populates="services", lazy=LAZY)
     status: Mapped[bool] = mapped_column(Boolean, nullable=True, default=False)
 
 
@@ -59,5 +112,5 @@ class ClientBarbers(Base):
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     client_id: Mapped[int] = mapped_column(ForeignKey("client.id"))
     barber_id: Mapped[int] = mapped_column(ForeignKey("barbers.id"))
-    client = relationship("Client", back_populates="barbers")
-    barber = relationship("Barber", back_populates="clients")
+    client = relationship("Client", back_populates="barbers", lazy=LAZY)
+    barber = relationship("Barber", back_populates="clients", lazy=LAZY)
@@ -0,0 +1,184 @@
+"""
+Client "📋 My requests" dashboard.
+
+One statement per page, however many requests or service lines there are: the
+client's upcoming pending requests are numbered and paged in SQL (count(*)
+OVER () carries the total; a page past the end, left over after cancellations,
+falls back to the first one in the same statement), joined to the barber's
+name, and each request's service lines come back pre-aggregated as a JSON array. The page is sent as a single message and
+◀️ / ▶️ edit it in place.
+"""
+from datetime import datetime, time
+from typing import List, NamedTuple
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from sqlalchemy import case, select, func, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import aliased
+
+from app.barber.models import Barber, BarberService
+from app.client.models import ClientRequest, ClientRequestService
+from app.client.callback_data import MyRequestsPageCB
+from app.client.keyboards import _can_edit_request
+from app.service.models import Service
+from app.user.models import User
+
+MY_REQUESTS_PAGE_SIZE = 5
+
+
+class MyRequestsPage(NamedTuple):
+    rows: List  # id, date, from_time, to_time, status, total, page, barber_name, barber_surname, services
+    page: int
+    pages: int
+    total: int
+
+
+def _page_query(client_id: int, since: datetime, page: int, page_size: int):
+    numbered = (
+        select(
+            ClientRequest.id,
+            ClientRequest.barber_id,
+            ClientRequest.date,
+            ClientRequest.from_time,
+            ClientRequest.to_time,
+            ClientRequest.status,
+            func.row_number().over(order_by=(ClientRequest.date.desc(), ClientRequest.id.desc())).label("rn"),
+            func.count().over().label("total"),
+        )
+        .where(
+            ClientRequest.client_id == client_id,
+            ClientRequest.date >= since,
+            ClientRequest.status == "pending",
+        )
+        .subquery("numbered")
+    )
+    # the requested page, or the first one when the list shrank under the user (cancelled / accepted)
+    shown = case(((page - 1) * page_size < numbered.c.total, page), else_=1)
+    paged = (
+        select(numbered, shown.label("page"))
+        .where(numbered.c.rn > (shown - 1) * page_size, numbered.c.rn <= shown * page_size)
+        .subquery("paged")
+    )
+
+    # service lines of one paged request, as [{uz, ru, price, duration}, ...]
+    line = func.json_build_object(
+        "uz", Service.name_uz,
+        "ru", Service.name_ru,
+        "price", func.coalesce(ClientRequestService.price, BarberService.price),
+        "duration", BarberService.duration,
+    )
+    services = (
+        select(func.coalesce(
+            func.json_agg(aggregate_order_by(line, ClientRequestService.barber_service_id)),
+            literal_column("'[]'::json"),
+        ))
+        .select_from(ClientRequestService)
+        .join(BarberService, BarberService.id == ClientRequestService.barber_service_id)
+        .join(Service, Service.id == BarberService.service_id)
+        .where(ClientRequestService.client_request_id == paged.c.id)
+        .scalar_subquery()
+    )
+
+    barber_user = aliased(User)
+    return (
+        select(
+            paged.c.id,
+            paged.c.date,
+            paged.c.from_time,
+            paged.c.to_time,
+            paged.c.status,
+            paged.c.total,
+            paged.c.page,
+            barber_user.name.label("barber_name"),
+            barber_user.surname.label("barber_surname"),
+            services.label("services"),
+        )
+        .select_from(paged)
+        .outerjoin(Barber, Barber.id == paged.c.barber_id)
+        .outerjoin(barber_user, barber_user.id == Barber.user_id)
+        .order_by(paged.c.rn)
+    )
+
+
+async def load_my_requests_page(session, client_id: int, page: int = 1,
+                                page_size: int = MY_REQUESTS_PAGE_SIZE) -> MyRequestsPage:
+    """Upcoming pending requests of a client, one page, in a single query (past the end: the first page)."""
+    since = datetime.combine(datetime.now().date(), time.min)
+    rows = (await session.execute(_page_query(client_id, since, max(page, 1), page_size))).all()
+    total = rows[0].total if rows else 0
+    pages = max((total + page_size - 1) // page_size, 1)
+    return MyRequestsPage(rows, rows[0].page if rows else 1, pages, total)
+
+
+def _status_text(status: str, lang: str) -> str:
+    if lang == "uz":
+        return "✅ Tasdiqlangan" if status == "accept" else "❌ Rad etilgan" if status == "deny" else "⏳ Kutilmoqda"
+    return "✅ Подтверждено" if status == "accept" else "❌ Отклонено" if status == "deny" else "⏳ В ожидании"
+
+
+def _hm(dt) -> str:
+    return dt.strftime("%H:%M") if dt else "—"
+
+
+def _render_row(n: int, row, lang: str) -> str:
+    barber = f"{row.barber_name or ''} {row.barber_surname or ''}".strip()
+    total_price = 0
+    services_text = ""
+    for s in row.services or []:
+        price = s.get("price") or 0
+        total_price += price
+        if lang == "uz":
+            services_text += f"\n   ✂️ {s.get('uz')} ({price} so'm, {s.get('duration')} daqiqa)"
+        else:
+            services_text += f"\n   ✂️ {s.get('ru')} ({price} сум, {s.get('duration')} мин.)"
+    day = row.date.strftime("%d.%m.%Y") if row.date else "—"
+
+    if lang == "uz":
+        return (
+            f"#{n} ✂️ Barber: {barber}\n"
+            f"📅 Sana: {day}\n"
+            f"⏰ Vaqt: {_hm(row.from_time)} - {_hm(row.to_time)}\n"
+            f"📌 Holat: {_status_text(row.status, lang)}\n"
+            f"🧾 Xizmatlar:{services_text}\n"
+            f"💰 Umumiy narx: {total_price} so'm"
+        )
+    return (
+        f"#{n} ✂️ Барбер: {barber}\n"
+        f"📅 Дата: {day}\n"
+        f"⏰ Время: {_hm(row.from_time)} - {_hm(row.to_time)}\n"
+        f"📌 Статус: {_status_text(row.status, lang)}\n"
+        f"🧾 Услуги:{services_text}\n"
+        f"💰 Общая сумма: {total_price} сум"
+    )
+
+
+def render_my_requests(data: MyRequestsPage, lang: str) -> str:
+    title = "📋 So‘rovlarim" if lang == "uz" else "📋 Мои заявки"
+    first = (data.page - 1) * MY_REQUESTS_PAGE_SIZE + 1
+    blocks = [_render_row(first + i, row, lang) for i, row in enumerate(data.rows)]
+    return f"{title} ({data.total})\n\n" + "\n\n".join(blocks)
+
+
+def my_requests_keyboard(data: MyRequestsPage, lang: str) -> InlineKeyboardMarkup:
+    """Per request: feedback / edit (same callbacks as before); then page navigation."""
+    feedback = "⭐ Fikr" if lang == "uz" else "⭐ Отзыв"
+    edit = "✏️ Tahrirlash" if lang == "uz" else "✏️ Изменить"
+    first = (data.page - 1) * MY_REQUESTS_PAGE_SIZE + 1
+
+    rows = []
+    for i, row in enumerate(data.rows):
+        n = first + i
+        btns = [InlineKeyboardButton(text=f"{feedback} #{n}", callback_data=f"req_feedback:{row.id}")]
+        if _can_edit_request(row):
+            btns.append(InlineKeyboardButton(text=f"{edit} #{n}", callback_data=f"req_details:{row.id}"))
+        rows.append(btns)
+
+    if data.pages > 1:
+        nav = []
+        if data.page > 1:
+            nav.append(InlineKeyboardButton(text="◀️", callback_data=MyRequestsPageCB(page=data.page - 1).pack()))
+        nav.append(InlineKeyboardButton(text=f"{data.page}/{data.pages}", callback_data="noop"))
+        if data.page < data.pages:
+            nav.append(InlineKeyboardButton(text="▶️", callback_data=MyRequestsPageCB(page=data.page + 1).pack()))
+        rows.append(nav)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -50,7 +50,7 @@ def aggregate_request_totals(cr) -> Dict[str, object]:
     """
     Sums duration & price over ClientRequest.services.
     - duration: ClientRequestService.duration if present, else BarberService.duration
-    - price: BarberService.price
+    - price: ClientRequestService.price (as booked) if present, else BarberService.price
     Returns dict with:
       items: List[{name_uz, name_ru, price, duration}]
       total_duration_min, total_price_uzs, final_price_uzs, discount_text
@@ -73,7 +73,9 @@ def aggregate_request_totals(cr) -> Dict[str, object]:
             d_val = getattr(bs, "duration", None)
         d = int(d_val) if d_val is not None else 0
 
-        p_val = getattr(bs, "price", None)
+        p_val = getattr(crs, "price", None)
+        if p_val is None:
+            p_val = getattr(bs, "price", None)
         p = int(p_val) if p_val is not None else 0
 
         name_uz = _service_name_localized(svc, "uz")
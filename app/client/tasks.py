@@ -1,19 +1,15 @@
 from app.celery_app import celery
-from app.client.models import ClientRequest, ClientRequestService, Client
-from app.barber.models import Barber, BarberService
-import asyncio
-from datetime import datetime, timedelta, time
+from app.client.models import ClientRequest
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-from sqlalchemy.orm import selectinload
+from app.loaders import loader
 from app.client.notification_utils import make_messages_ru_uz
-from aiogram import Bot
+from app.notifier import Notification, get_notifier
 import os
-from sqlalchemy.sql.sqltypes import Date, Time
-from sqlalchemy import select, and_, cast, or_
+from sqlalchemy import select, and_, or_
 from dotenv import load_dotenv
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
-from app.db import AsyncSessionLocal, async_engine
+from app.db import AsyncSessionLocal
+from app.worker_runtime import run_async, worker_bot
 import requests
 from typing import Any, Dict, List, Tuple
 import logging
@@ -44,14 +40,7 @@ def _to_naive_local(dt: datetime) -> datetime:
 
 @celery.task(name="app.client.tasks.notify_upcoming_requests")
 def notify_upcoming_requests():
-    loop = asyncio.new_event_loop()
-    try:
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(_notify_upcoming_requests_async())
-        # ✅ dispose the real engine instance before closing the loop
-        loop.run_until_complete(async_engine.dispose())
-    finally:
-        loop.close()
+    run_async(_notify_upcoming_requests_async())
 
 
 def _naive_local_now():
@@ -59,79 +48,78 @@ def _naive_local_now():
     return now_local, now_local.replace(tzinfo=None)  # aware, naive
 
 
+def _due_reminders_query(today_local_date, start_minute: int, end_minute: int):
+    """Accepted, not yet reminded requests of today starting in [start_minute, end_minute) (minutes of day)."""
+    return (
+        select(ClientRequest)
+        .options(*loader("request_notify"))
+        .where(
+            and_(
+                ClientRequest.status == "accept",
+                ClientRequest.reminder_sent_at.is_(None),
+
+                # A) match *today* by business date
+                ClientRequest.day == today_local_date,
+
+                # B) time-of-day window, as a range on the stored minute of day
+                ClientRequest.from_minute >= start_minute,
+                ClientRequest.from_minute < end_minute,
+            )
+        )
+        .order_by(ClientRequest.from_time.asc())
+    )
+
+
 async def _notify_upcoming_requests_async():
     now_local_aware, _ = _naive_local_now()
 
     # 1) today's business date (Asia/Tashkent)
     today_local_date = now_local_aware.date()  # date object (no tz)
 
-    # 2) time-of-day window (HH:MM) ignoring date
-    now_t = now_local_aware.time().replace(second=0, microsecond=0)
+    # 2) time-of-day window (minutes of day) ignoring date
+    now_m = now_local_aware.hour * 60 + now_local_aware.minute
     soon_aware = now_local_aware + timedelta(hours=2)
     # Clamp to today's end (no next-day spill)
-    end_t = soon_aware.time().replace(second=0, microsecond=0)
-    if end_t <= now_t:
-        # wrapping over midnight: clamp to 23:59:59 for "today only"
-        end_t = time(23, 59, 59)
+    end_m = soon_aware.hour * 60 + soon_aware.minute
+    if end_m <= now_m:
+        # wrapping over midnight: the rest of today only
+        end_m = 24 * 60
     async with AsyncSessionLocal() as session:
-        q = (
-            select(ClientRequest)
-            .options(
-                selectinload(ClientRequest.client).selectinload(Client.user),
-                selectinload(ClientRequest.barber).selectinload(Barber.user),
-                selectinload(ClientRequest.services)
-                .selectinload(ClientRequestService.barber_service)
-                .selectinload(BarberService.service),
-            )
-            .where(
-                and_(
-                    ClientRequest.status == "accept",
-                    ClientRequest.from_time.is_not(None),
-
-                    # A) match *today* by business date
-                    cast(ClientRequest.date, Date) == today_local_date,
-
-                    # B) time-of-day window (ignore date on from_time)
-                    cast(ClientRequest.from_time, Time) >= now_t,
-                    cast(ClientRequest.from_time, Time) < end_t,
-
-                    ClientRequest.reminder_sent_at.is_(None),
-                )
-            )
-            .order_by(ClientRequest.from_time.asc())
-        )
+        q = _due_reminders_query(today_local_date, now_m, end_m)
 
         result = await session.execute(q)
         requests = result.scalars().all()
         if not requests:
             return
 
-        bot = Bot(
-            token=TELEGRAM_TOKEN,
-            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-        )
-
-        try:
-            for cr in requests:
-                # Build localized messages (utils internally formats with TZ for display)
-                msg_for_client, msg_for_barber = make_messages_ru_uz(cr, TZ)
-
-                client_tg = getattr(getattr(cr.client, "user", None), "telegram_id", None)
-                barber_tg = getattr(getattr(cr.barber, "user", None), "telegram_id", None)
-
-                if client_tg:
-                    try:
-                        await bot.send_message(client_tg, msg_for_client)
-                    except Exception:
-                        pass
-                if barber_tg:
-                    try:
-                        await bot.send_message(barber_tg, msg_for_barber)
-                    except Exception:
-                        pass
-
-                # ⬇️ write NAIVE timestamp back to DB column (reminder_sent_at is WITHOUT TZ)
-                cr.reminder_sent_at = _naive_local_now()[1]
-            await session.commit()
-        finally:
-            await bot.session.close()
+        # process-wide Bot session and notifier: its rate budget carries across runs
+        notifier = get_notifier(worker_bot())
+        batch: List[Notification] = []
+        for cr in requests:
+            # Build localized messages (utils internally formats with TZ for display)
+            msg_for_client, msg_for_barber = make_messages_ru_uz(cr, TZ)
+
+            client_tg = getattr(getattr(cr.client, "user", None), "telegram_id", None)
+            barber_tg = getattr(getattr(cr.barber, "user", None), "telegram_id", None)
+
+            # a retry only goes to whoever the last run failed to reach
+            if client_tg and cr.client_reminded_at is None:
+                batch.append(Notification(client_tg, msg_for_client, tag=(cr.id, "client")))
+            if barber_tg and cr.barber_reminded_at is None:
+                batch.append(Notification(barber_tg, msg_for_barber, tag=(cr.id, "barber")))
+
+        results, stats = await notifier.send_many(batch)
+        log.info("reminders: %s requests, %s", len(requests), stats)
+
+        # retry next run only if something is still deliverable (blocked chats won't be)
+        pending = {r.notification.tag for r in results if not r.ok and not r.permanent_failure}
+        # ⬇️ NAIVE timestamps: the reminder columns are WITHOUT TZ
+        sent_at = _naive_local_now()[1]
+        for cr in requests:
+            if cr.client_reminded_at is None and (cr.id, "client") not in pending:
+                cr.client_reminded_at = sent_at
+            if cr.barber_reminded_at is None and (cr.id, "barber") not in pending:
+                cr.barber_reminded_at = sent_at
+            if cr.client_reminded_at and cr.barber_reminded_at:
+                cr.reminder_sent_at = sent_at
+        await session.commit()
@@ -1,5 +1,9 @@
 from datetime import datetime
 import asyncio
+import json
+import logging
+from collections import OrderedDict
+from time import monotonic
 from typing import Optional, Tuple
 import httpx
 from geopy.geocoders import Nominatim
@@ -9,11 +13,25 @@ from dotenv import load_dotenv
 import os
 
 from app.region.models import Country, Region, City
+from app.refdata import mark_refdata_changed
+from app.outbox.sync import enqueue_location_sync
 
 load_dotenv()
 YANDEX_API_KEY = os.getenv("YANDEX_API_KEY")
 BASE_URL = "https://geocode-maps.yandex.ru/1.x"
 
+# ~1.2 x 0.6 km cells at precision 6: same neighbourhood → same city
+GEOCODE_PRECISION = int(os.getenv("GEOCODE_PRECISION", "6"))
+GEOCODE_TTL = 30 * 24 * 60 * 60
+GEOCODE_NEGATIVE_TTL = 60 * 60  # providers answered but found nothing: retry within the hour
+GEOCODE_LRU_SIZE = 4096
+
+log = logging.getLogger(__name__)
+
+
+class GeocodeUnavailable(Exception):
+    """A provider could not be reached, so "not found" is unknown; never cached."""
+
 
 # ------------------ HELPERS ------------------
 
@@ -21,6 +39,100 @@ def _norm(s: Optional[str]) -> Optional[str]:
     return s.strip() if s and s.strip() else None
 
 
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOCODE_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    out, bits, ch, even = [], 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch, lon_lo = (ch << 1) | 1, mid
+            else:
+                ch, lon_hi = ch << 1, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch, lat_lo = (ch << 1) | 1, mid
+            else:
+                ch, lat_hi = ch << 1, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_GEOHASH_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+
+def _geocode_key(cell: str) -> str:
+    return f"geo:cell:{cell}"
+
+
+class _LRU:
+    """Tiny in-process LRU with per-entry expiry (front of the Redis cache)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < monotonic():
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: dict, ttl: int) -> None:
+        self._data[key] = (monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+_geo_lru = _LRU(GEOCODE_LRU_SIZE)
+
+# provider -> {"calls", "errors", "total_ms", "max_ms"}; cache -> {"lru", "redis", "miss"}
+GEOCODE_STATS: dict = {"cache": {"lru": 0, "redis": 0, "miss": 0}}
+
+
+def _record_latency(provider: str, started: float, ok: bool) -> None:
+    ms = (monotonic() - started) * 1000
+    st = GEOCODE_STATS.setdefault(provider, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+    st["calls"] += 1
+    st["errors"] += 0 if ok else 1
+    st["total_ms"] += ms
+    st["max_ms"] = max(st["max_ms"], ms)
+
+
+def geocode_stats() -> dict:
+    """Snapshot with avg latency per provider and cache hit counters."""
+    out = {"cache": dict(GEOCODE_STATS["cache"])}
+    for provider, st in GEOCODE_STATS.items():
+        if provider == "cache":
+            continue
+        out[provider] = dict(st, avg_ms=round(st["total_ms"] / st["calls"], 1) if st["calls"] else 0.0)
+    return out
+
+
+_http: Optional[httpx.AsyncClient] = None
+_nominatim: Optional[Nominatim] = None
+
+
+def _http_client() -> httpx.AsyncClient:
+    # one pooled client per process instead of a TLS handshake per lookup
+    global _http
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(timeout=10)
+    return _http
+
+
 async def get_location_yandex(lat: float, lon: float, lang: str = "uz_UZ") -> dict:
     if not YANDEX_API_KEY:
         return {"country": None, "region": None, "city": None}
@@ -31,10 +143,16 @@ async def get_location_yandex(lat: float, lon: float, lang: str = "uz_UZ") -> di
         "format": "json",
         "lang": lang,
     }
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(BASE_URL, params=params, timeout=10)
+    started = monotonic()
+    try:
+        resp = await _http_client().get(BASE_URL, params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json()
+    except Exception as e:
+        _record_latency("yandex", started, ok=False)
+        log.warning("yandex geocode failed (%s): %s", lang, e)
+        return {"country": None, "region": None, "city": None, "failed": True}
+    _record_latency("yandex", started, ok=True)
 
     try:
         comps = (
@@ -52,10 +170,20 @@ async def get_location_yandex(lat: float, lon: float, lang: str = "uz_UZ") -> di
 
 
 async def get_location_nominatim(lat: float, lon: float, lang: str = "uz") -> dict:
-    geolocator = Nominatim(user_agent="location_bot")
+    global _nominatim
+    if _nominatim is None:
+        _nominatim = Nominatim(user_agent="location_bot")
+    geolocator = _nominatim
 
     def _reverse():
-        loc = geolocator.reverse((lat, lon), language=lang)
+        started = monotonic()
+        try:
+            loc = geolocator.reverse((lat, lon), language=lang)
+        except Exception as e:
+            _record_latency("nominatim", started, ok=False)
+            log.warning("nominatim geocode failed (%s): %s", lang, e)
+            return {"city": None, "region": None, "country": None, "failed": True}
+        _record_latency("nominatim", started, ok=True)
         if loc and "address" in getattr(loc, "raw", {}):
             addr = loc.raw["address"]
             return {
@@ -74,10 +202,12 @@ async def _get_or_create_country(session: AsyncSession, name_uz: str, name_ru: s
     if existing:
         if not existing.name_ru and name_ru:
             existing.name_ru = name_ru
+            mark_refdata_changed(session)
         return existing
     obj = Country(name_uz=name_uz, name_ru=name_ru)
     session.add(obj)
     await session.flush()
+    mark_refdata_changed(session)
     return obj
 
 
@@ -87,10 +217,12 @@ async def _get_or_create_region(session: AsyncSession, country_id: int, name_uz:
     if existing:
         if not existing.name_ru and name_ru:
             existing.name_ru = name_ru
+            mark_refdata_changed(session)
         return existing
     obj = Region(name_uz=name_uz, name_ru=name_ru, country_id=country_id)
     session.add(obj)
     await session.flush()
+    mark_refdata_changed(session)
     return obj
 
 
@@ -100,42 +232,133 @@ async def _get_or_create_city(session: AsyncSession, region_id: int, name_uz: st
     if existing:
         if not existing.name_ru and name_ru:
             existing.name_ru = name_ru
+            mark_refdata_changed(session)
         return existing
     obj = City(name_uz=name_uz, name_ru=name_ru, region_id=region_id)
     session.add(obj)
     await session.flush()
+    mark_refdata_changed(session)
     return obj
 
 
 # ------------------ MAIN FUNCTION ------------------
 
-async def get_region_city_multilang(session: AsyncSession, lat: float, lon: float) -> Tuple[Country, Region, City]:
-    """
-    Try Yandex in UZ+RU; fallback to Nominatim if missing city/region.
-    Then upsert Country, Region, City.
-    """
-    uz = await get_location_yandex(lat, lon, "uz_UZ")
-    ru = await get_location_yandex(lat, lon, "ru_RU")
-
-    # If Yandex failed to give city/region, fallback
-    if not uz.get("city") or not uz.get("region"):
-        uz = await get_location_nominatim(lat, lon, "uz")
-    if not ru.get("city") or not ru.get("region"):
-        ru = await get_location_nominatim(lat, lon, "ru")
+async def _cache_get(redis, cell: str) -> Optional[dict]:
+    key = _geocode_key(cell)
+    hit = _geo_lru.get(key)
+    if hit is not None:
+        GEOCODE_STATS["cache"]["lru"] += 1
+        return hit
+    if redis is not None:
+        try:
+            raw = await redis.get(key)
+        except Exception as e:
+            log.warning("geocode cache read failed for %s: %s", cell, e)
+            raw = None
+        if raw:
+            value = json.loads(raw)
+            _geo_lru.set(key, value, GEOCODE_NEGATIVE_TTL if value.get("miss") else GEOCODE_TTL)
+            GEOCODE_STATS["cache"]["redis"] += 1
+            return value
+    GEOCODE_STATS["cache"]["miss"] += 1
+    return None
+
+
+async def _cache_set(redis, cell: str, value: dict) -> None:
+    key = _geocode_key(cell)
+    ttl = GEOCODE_NEGATIVE_TTL if value.get("miss") else GEOCODE_TTL
+    _geo_lru.set(key, value, ttl)
+    if redis is not None:
+        try:
+            await redis.set(key, json.dumps(value), ex=ttl)
+        except Exception as e:
+            log.warning("geocode cache write failed for %s: %s", cell, e)
+
+
+async def _load_cached_location(session: AsyncSession, value: dict):
+    row = (await session.execute(
+        select(Country, Region, City)
+        .join(Region, Region.country_id == Country.id)
+        .join(City, City.region_id == Region.id)
+        .where(
+            Country.id == value["country_id"],
+            Region.id == value["region_id"],
+            City.id == value["city_id"],
+        )
+    )).first()
+    return tuple(row) if row else None
+
+
+async def _resolve_names(lat: float, lon: float) -> Optional[dict]:
+    # both languages at once; Nominatim only for the ones Yandex left incomplete
+    uz, ru = await asyncio.gather(
+        get_location_yandex(lat, lon, "uz_UZ"),
+        get_location_yandex(lat, lon, "ru_RU"),
+    )
+    failed = uz.get("failed") or ru.get("failed")
+    need_uz = not uz.get("city") or not uz.get("region")
+    need_ru = not ru.get("city") or not ru.get("region")
+    if need_uz or need_ru:
+        fb_uz, fb_ru = await asyncio.gather(
+            get_location_nominatim(lat, lon, "uz") if need_uz else asyncio.sleep(0, uz),
+            get_location_nominatim(lat, lon, "ru") if need_ru else asyncio.sleep(0, ru),
+        )
+        uz, ru = fb_uz, fb_ru
+        failed = failed or uz.get("failed") or ru.get("failed")
 
     uz_country = _norm(uz.get("country")) or _norm(ru.get("country"))
     uz_region = _norm(uz.get("region")) or _norm(ru.get("region"))
     uz_city = _norm(uz.get("city")) or _norm(ru.get("city"))
+    if not (uz_country and uz_region and uz_city):
+        if failed:
+            raise GeocodeUnavailable(f"no geocoder answer for {lat},{lon}")
+        return None
+
+    return {
+        "uz": (uz_country, uz_region, uz_city),
+        "ru": (
+            _norm(ru.get("country")) or uz_country,
+            _norm(ru.get("region")) or uz_region,
+            _norm(ru.get("city")) or uz_city,
+        ),
+    }
+
+
+async def get_region_city_multilang(session: AsyncSession, lat: float, lon: float, redis=None
+                                    ) -> Tuple[Optional[Country], Optional[Region], Optional[City]]:
+    """
+    Cached by geohash cell (in-process LRU → Redis → providers).
+    On a miss: Yandex UZ+RU concurrently, Nominatim fallback, then upsert Country, Region, City.
+    Returns (None, None, None) when the point could not be resolved: negative-cached for an
+    hour when the providers found nothing, not cached at all when one of them failed.
+    """
+    cell = geohash_encode(lat, lon)
+    cached = await _cache_get(redis, cell)
+    if cached is not None:
+        if cached.get("miss"):
+            return None, None, None
+        loaded = await _load_cached_location(session, cached)
+        if loaded:
+            return loaded
 
-    ru_country = _norm(ru.get("country")) or uz_country
-    ru_region = _norm(ru.get("region")) or uz_region
-    ru_city = _norm(ru.get("city")) or uz_city
+    try:
+        names = await _resolve_names(lat, lon)
+    except GeocodeUnavailable as e:
+        log.warning("%s; not caching", e)
+        return None, None, None
+    if names is None:
+        await _cache_set(redis, cell, {"miss": 1})
+        return None, None, None
+
+    (uz_country, uz_region, uz_city), (ru_country, ru_region, ru_city) = names["uz"], names["ru"]
 
     # Upsert into DB
     country = await _get_or_create_country(session, uz_country, ru_country)
     region = await _get_or_create_region(session, country.id, uz_region, ru_region)
     city = await _get_or_create_city(session, region.id, uz_city, ru_city)
-    payload = [{
+    await _cache_set(redis, cell, {"country_id": country.id, "region_id": region.id, "city_id": city.id})
+
+    enqueue_location_sync(session, {
         "country_uz": country.name_uz,
         "country_ru": country.name_ru,
         "country_en": getattr(country, "name_en", None),
@@ -147,9 +370,7 @@ async def get_region_city_multilang(session: AsyncSession, lat: float, lon: floa
         "city_uz": city.name_uz,
         "city_ru": city.name_ru,
         "city_en": getattr(city, "name_en", None),
-    }]
-    from app.barber.tasks import sync_locations_to_django
-    sync_locations_to_django.delay(payload)
+    })  # sent after the caller commits
     return country, region, city
 
 
@@ -40,3 +40,10 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 Base = declarative_base()
+
+# Relationships load nothing implicitly; handlers opt into named shapes from app/loaders.py.
+# DB_STRICT_LOADING=1 makes any unplanned lazy load raise instead of silently hitting the DB;
+# the test suite and benchmarks/update_replay.py turn it on, production keeps "select" so a
+# load path no test covers degrades to an extra query rather than a failed update.
+STRICT_LOADING = os.getenv("DB_STRICT_LOADING", "0").lower() in ("1", "true", "yes")
+LAZY = "raise_on_sql" if STRICT_LOADING else "select"
@@ -0,0 +1,150 @@
+import json
+import logging
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import select, and_, exists
+from sqlalchemy.orm import aliased
+
+from app.db import AsyncSessionLocal
+from app.user.models import User
+from app.client.models import Client
+from app.barber.models import Barber
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_TTL = 60 * 60  # safety net; changes are invalidated explicitly
+
+
+def _identity_key(telegram_id: int) -> str:
+    return f"identity:{telegram_id}"
+
+
+@dataclass(frozen=True)
+class Identity:
+    """Who is talking to the bot: resolved once per update, cached in Redis."""
+    telegram_id: int
+    user_id: int
+    lang: str
+    user_type: Optional[str]
+    platform_login: Optional[str]
+    client_id: Optional[int]
+    barber_id: Optional[int]  # the Barber bound to platform_login, as barber handlers look it up
+    country_id: Optional[int]
+    region_id: Optional[int]
+    city_id: Optional[int]
+    is_barber: bool = False  # any Barber row for the user, whatever its login
+
+    @property
+    def role(self) -> str:
+        """Returns 'barber', 'client', or 'unknown' (same rules as /profile)."""
+        if self.is_barber or self.barber_id:
+            return "barber"
+        if self.client_id:
+            return "client"
+        return "unknown"
+
+    @property
+    def is_ru(self) -> bool:
+        return (self.lang or "").lower().startswith("ru")
+
+
+_AnyBarber = aliased(Barber)
+
+
+async def _resolve_identity(session, telegram_id: int) -> Optional[Identity]:
+    # one round-trip: user + its client + the barber bound to the current platform login
+    # + whether any barber row exists (the /profile role)
+    row = (await session.execute(
+        select(
+            User.id, User.lang, User.user_type, User.platform_login,
+            User.country_id, User.region_id, User.city_id,
+            Client.id, Barber.id,
+            exists().where(_AnyBarber.user_id == User.id),
+        )
+        .outerjoin(Client, Client.user_id == User.id)
+        .outerjoin(Barber, and_(Barber.user_id == User.id, Barber.login == User.platform_login))
+        .where(User.telegram_id == telegram_id)
+        .limit(1)
+    )).first()
+    if not row:
+        return None
+
+    user_id, lang, user_type, login, country_id, region_id, city_id, client_id, barber_id, is_barber = row
+    return Identity(
+        telegram_id=telegram_id,
+        user_id=user_id,
+        lang=(lang or "uz").lower(),
+        user_type=user_type,
+        platform_login=login,
+        client_id=client_id,
+        barber_id=barber_id,
+        country_id=country_id,
+        region_id=region_id,
+        city_id=city_id,
+        is_barber=bool(is_barber),
+    )
+
+
+async def get_identity(redis, telegram_id: int, session=None) -> Optional[Identity]:
+    """
+    Cached identity lookup. Unknown users are not cached, so /start → choose_language
+    is picked up on the very next update.
+    """
+    if redis is not None:
+        try:
+            raw = await redis.get(_identity_key(telegram_id))
+            if raw:
+                return Identity(**json.loads(raw))
+        except Exception as e:
+            logger.warning("identity cache read failed for %s: %s", telegram_id, e)
+
+    if session is not None:
+        identity = await _resolve_identity(session, telegram_id)
+    else:
+        async with AsyncSessionLocal() as own_session:
+            identity = await _resolve_identity(own_session, telegram_id)
+
+    if identity is not None and redis is not None:
+        try:
+            await redis.set(_identity_key(telegram_id), json.dumps(asdict(identity)), ex=IDENTITY_TTL)
+        except Exception as e:
+            logger.warning("identity cache write failed for %s: %s", telegram_id, e)
+    return identity
+
+
+async def invalidate_identity(redis, telegram_id: int) -> None:
+    """Call after anything that changes lang, role, login, location or Client/Barber rows."""
+    if redis is None:
+        return
+    try:
+        await redis.delete(_identity_key(telegram_id))
+    except Exception as e:
+        logger.warning("identity cache invalidate failed for %s: %s", telegram_id, e)
+
+
+class IdentityMiddleware(BaseMiddleware):
+    """
+    Outer middleware: resolves the sender once per update and injects
+    `identity` (Identity | None) into handler data.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        tg_user = data.get("event_from_user")
+        identity = None
+        if tg_user is not None:
+            bot = data.get("bot")
+            try:
+                identity = await get_identity(getattr(bot, "redis", None), tg_user.id)
+            except Exception as e:
+                # never block an update because of identity resolution
+                logger.exception("identity resolution failed for %s: %s", tg_user.id, e)
+        data["identity"] = identity
+        return await handler(event, data)
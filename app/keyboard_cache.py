@@ -0,0 +1,73 @@
+"""
+Pre-built keyboard cache.
+
+Menus are the same for every user of a language, and the region/city pickers only
+change with reference data, so the markup objects are built once per
+(kind, lang, data-version) and reused:
+
+    @static_keyboard("client_main_menu")
+    def client_main_menu(lang): ...                      # version is always 0
+
+    kb = keyboard_cache.get("regions", lang, snap.generation, lambda: build(...))
+
+A new data version replaces the entries of that kind, so keyboards go stale
+exactly when the refdata snapshot does. Cached markups are shared between
+updates: callers must not append rows to them (build a new markup instead).
+"""
+import functools
+import inspect
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+KEYBOARD_CACHE_MAX = 1024
+
+
+class KeyboardCache:
+    def __init__(self, max_entries: int = KEYBOARD_CACHE_MAX):
+        self.max_entries = max_entries
+        self._data: Dict[Tuple[Hashable, Any, Hashable], Any] = {}
+        self._versions: Dict[Hashable, Hashable] = {}  # kind -> version currently held
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, kind: Hashable, lang: Any, version: Hashable, build: Callable[[], Any]):
+        key = (kind, lang, version)
+        markup = self._data.get(key)
+        if markup is not None:
+            self.stats["hits"] += 1
+            return markup
+
+        self.stats["misses"] += 1
+        if self._versions.get(kind, version) != version:
+            self._drop_kind(kind)
+        if len(self._data) >= self.max_entries:
+            self.clear()
+        markup = build()
+        self._data[key] = markup
+        self._versions[kind] = version
+        return markup
+
+    def _drop_kind(self, kind: Hashable) -> None:
+        stale = [k for k in self._data if k[0] == kind]
+        for k in stale:
+            del self._data[k]
+        self.stats["evictions"] += len(stale)
+
+    def clear(self) -> None:
+        self.stats["evictions"] += len(self._data)
+        self._data.clear()
+        self._versions.clear()
+
+
+keyboard_cache = KeyboardCache()
+
+
+def static_keyboard(kind: str):
+    """Cache a `builder(lang)` menu per language; the undecorated builder stays on __wrapped__."""
+    def decorator(builder):
+        param = next(iter(inspect.signature(builder).parameters.values()))
+        default = None if param.default is inspect.Parameter.empty else param.default
+
+        @functools.wraps(builder)
+        def wrapper(lang=default):
+            return keyboard_cache.get(kind, lang, 0, lambda: builder(lang))
+        return wrapper
+    return decorator
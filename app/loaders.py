@@ -0,0 +1,81 @@
+"""
+Named query shapes.
+
+Relationships are not eager by default (see app/db.py LAZY), so a handler states
+what it is going to render:
+
+    select(ClientRequest).options(*loader("request_render"))
+
+With DB_STRICT_LOADING=1 every profile also appends raiseload("*"), so any
+relationship touched outside the declared shape fails loudly instead of
+fanning out into extra queries.
+"""
+from typing import List
+
+from sqlalchemy.orm import selectinload, raiseload
+
+from app.db import STRICT_LOADING
+from app.barber.models import Barber, BarberService, BarberServiceScore, BarberSchedule
+from app.client.models import Client, ClientRequest, ClientRequestService
+
+
+def _request_services():
+    return (
+        selectinload(ClientRequest.services)
+        .selectinload(ClientRequestService.barber_service)
+        .selectinload(BarberService.service)
+    )
+
+
+LOADER_PROFILES = {
+    # Barber profile card for clients: name + working days
+    "barber_card": lambda: (
+        selectinload(Barber.user),
+        selectinload(Barber.working_days),
+    ),
+    # Barber lists / directory rows: name only
+    "barber_list": lambda: (
+        selectinload(Barber.user),
+    ),
+    # One request block (schedule day, request manage screen, barber request list)
+    "request_render": lambda: (
+        selectinload(ClientRequest.client).selectinload(Client.user),
+        _request_services(),
+    ),
+    # Request + both parties (reminders, accept/deny notifications)
+    "request_notify": lambda: (
+        selectinload(ClientRequest.client).selectinload(Client.user),
+        selectinload(ClientRequest.barber).selectinload(Barber.user),
+        _request_services(),
+    ),
+    # Client-side history card: barber name + services
+    "request_history": lambda: (
+        selectinload(ClientRequest.barber).selectinload(Barber.user),
+        _request_services(),
+    ),
+    # Schedule row with its detail rows
+    "schedule_day": lambda: (
+        selectinload(BarberSchedule.details),
+    ),
+    # Barber's received scores page
+    "score_list": lambda: (
+        selectinload(BarberServiceScore.client).selectinload(Client.user),
+        selectinload(BarberServiceScore.barber_service).selectinload(BarberService.service),
+        selectinload(BarberServiceScore.client_request),
+    ),
+    # Score lines under a history card
+    "score_render": lambda: (
+        selectinload(BarberServiceScore.barber_service).selectinload(BarberService.service),
+    ),
+}
+
+
+def loader(name: str) -> List:
+    """Loader options for a named profile (+ raiseload('*') in strict mode)."""
+    try:
+        opts = list(LOADER_PROFILES[name]())
+    except KeyError:
+        raise KeyError(f"Unknown loader profile: {name!r}") from None
+    if STRICT_LOADING:
+        opts.append(raiseload("*"))
+    return opts
@@ -0,0 +1,279 @@
+"""
+Prometheus metrics for the bot process.
+
+Per handler (labels: router = the handler's module, handler = its function):
+
+    bot_handler_seconds          wall time of the handler
+    bot_handler_db_statements    SQL statements it ran        (SQLAlchemy engine events)
+    bot_handler_db_seconds       time spent in those statements
+    bot_handler_redis_commands   Redis commands it sent       (bot.redis connection class)
+    bot_handler_api_calls        Bot API calls it made
+    bot_handler_errors_total     handlers that raised (also logged with a traceback)
+
+and process-wide:
+
+    bot_api_seconds{method}      latency of every Bot API call
+    bot_db_pool_checked_out      connections held from the pool at scrape time
+    bot_redis_keys{db}           keys in the app Redis, and those with a TTL
+    bot_redis_expiring_keys{db}  (a growing gap means keys that never expire)
+    bot_redis_used_memory_bytes  memory used by the Redis server
+
+The work of one update is attributed through a context variable, so concurrent
+updates do not mix. Rendered in the Prometheus text format by a small aiohttp
+server (METRICS_HOST / METRICS_PORT, run.py) at /metrics; no client library
+needed.
+"""
+import logging
+import os
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+from redis.asyncio.connection import Connection
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # 0 disables the endpoint
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set (Prometheus semantics)."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        idx = bisect_left(self.buckets, value)
+        if idx < len(self.buckets):
+            series[idx] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]:.6g}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], int] = {}
+
+    def inc(self, *labels: str) -> None:
+        self._series[labels] = self._series.get(labels, 0) + 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {n}" for labels, n in sorted(self._series.items())]
+        return lines
+
+
+HANDLER = ("router", "handler")
+handler_seconds = Histogram("bot_handler_seconds", "Handler wall time.", HANDLER, LATENCY_BUCKETS)
+handler_db_statements = Histogram("bot_handler_db_statements", "SQL statements per handled update.",
+                                  HANDLER, COUNT_BUCKETS)
+handler_db_seconds = Histogram("bot_handler_db_seconds", "Time in SQL statements per handled update.",
+                               HANDLER, LATENCY_BUCKETS)
+handler_redis_commands = Histogram("bot_handler_redis_commands", "Redis commands per handled update.",
+                                   HANDLER, COUNT_BUCKETS)
+handler_api_calls = Histogram("bot_handler_api_calls", "Bot API calls per handled update.", HANDLER, COUNT_BUCKETS)
+handler_errors = Counter("bot_handler_errors_total", "Handlers that raised.", HANDLER)
+api_seconds = Histogram("bot_api_seconds", "Bot API call latency.", ("method",), LATENCY_BUCKETS)
+
+REGISTRY = (handler_seconds, handler_db_statements, handler_db_seconds, handler_redis_commands,
+            handler_api_calls, handler_errors, api_seconds)
+
+
+@dataclass
+class _Usage:
+    db_statements: int = 0
+    db_seconds: float = 0.0
+    redis_commands: int = 0
+    api_calls: int = 0
+
+
+_usage: ContextVar[Optional[_Usage]] = ContextVar("handler_usage", default=None)
+_engines: list = []  # instrumented engines, for the pool gauge
+_redis_clients: list = []  # app Redis, for the key and memory gauges
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware: times the matched handler and collects what it used."""
+
+    async def __call__(self, handler, event, data):
+        callback = data["handler"].callback
+        labels = (callback.__module__, callback.__name__)
+        usage = _Usage()
+        token = _usage.set(usage)
+        started = perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(*labels)
+            logger.exception("handler %s.%s failed", *labels)
+            raise
+        finally:
+            handler_seconds.observe(perf_counter() - started, *labels)
+            _usage.reset(token)
+            handler_db_statements.observe(usage.db_statements, *labels)
+            handler_db_seconds.observe(usage.db_seconds, *labels)
+            handler_redis_commands.observe(usage.redis_commands, *labels)
+            handler_api_calls.observe(usage.api_calls, *labels)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session middleware: latency of every API call, counted against the current handler."""
+
+    async def __call__(self, make_request, bot, method):
+        usage = _usage.get()
+        if usage is not None:
+            usage.api_calls += 1
+        started = perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            api_seconds.observe(perf_counter() - started, type(method).__name__)
+
+
+class MetricsConnection(Connection):
+    """Redis connection that counts commands (pipelined ones included) against the current handler."""
+
+    def pack_command(self, *args):
+        usage = _usage.get()
+        if usage is not None:
+            usage.redis_commands += 1
+        return super().pack_command(*args)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _usage.get() is not None:
+        conn.info.setdefault("metrics_started", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    usage = _usage.get()
+    started = conn.info.get("metrics_started")
+    if usage is not None and started:
+        usage.db_statements += 1
+        usage.db_seconds += perf_counter() - started.pop()
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("metrics_started") if exception_context.connection else None
+    usage = _usage.get()
+    if usage is not None and started:
+        usage.db_statements += 1
+        usage.db_seconds += perf_counter() - started.pop()
+
+
+def instrument(dp: Dispatcher, bot, engine) -> None:
+    """Attach the handler middleware to every router, the API middleware to the bot, events to the engine.
+    bot.redis, when set, is sampled at scrape time."""
+    mw = HandlerMetricsMiddleware()
+    for router in dp.chain_tail:
+        for observer in router.observers.values():
+            if observer.event_name not in ("update", "error"):
+                observer.middleware(mw)
+    bot.session.middleware(ApiMetricsMiddleware())
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+    _engines.append(engine)
+    if getattr(bot, "redis", None) is not None:
+        _redis_clients.append(bot.redis)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += ["# HELP bot_db_pool_checked_out Connections currently checked out of the pool.",
+              "# TYPE bot_db_pool_checked_out gauge"]
+    for engine in _engines:
+        checked_out = getattr(engine.pool, "checkedout", None)
+        if checked_out is not None:
+            lines.append(f"bot_db_pool_checked_out{_labels(('db',), (engine.url.database or '',))} {checked_out()}")
+    return "\n".join(lines) + "\n"
+
+
+async def _redis_lines() -> List[str]:
+    keys = ["# HELP bot_redis_keys Keys in the app Redis database.", "# TYPE bot_redis_keys gauge"]
+    expiring = ["# HELP bot_redis_expiring_keys Keys with a TTL in the app Redis database.",
+                "# TYPE bot_redis_expiring_keys gauge"]
+    memory = ["# HELP bot_redis_used_memory_bytes Memory used by the Redis server.",
+              "# TYPE bot_redis_used_memory_bytes gauge"]
+    for redis in _redis_clients:
+        try:
+            pipe = redis.pipeline(transaction=False)
+            pipe.info("keyspace")
+            pipe.info("memory")
+            keyspace, mem = await pipe.execute()
+        except Exception as e:
+            logger.warning("redis stats failed: %s", e)
+            continue
+        db = f"db{redis.connection_pool.connection_kwargs.get('db', 0)}"
+        stats = keyspace.get(db, {})
+        keys.append(f"bot_redis_keys{_labels(('db',), (db,))} {stats.get('keys', 0)}")
+        expiring.append(f"bot_redis_expiring_keys{_labels(('db',), (db,))} {stats.get('expires', 0)}")
+        memory.append(f"bot_redis_used_memory_bytes {mem.get('used_memory', 0)}")
+    return keys + expiring + memory
+
+
+async def _metrics(request: web.Request) -> web.Response:
+    body = render_metrics() + "\n".join(await _redis_lines()) + "\n"
+    return web.Response(body=body.encode(),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    """Serve GET /metrics; returns the runner (cleanup() on shutdown), or None when disabled."""
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info("metrics on http://%s:%s/metrics", host, port)
+    return runner
@@ -7,12 +7,15 @@ import app.user.models  # User
 import app.client.models  # Client
 import app.barber.models  # Barber, BarberService, BarberSchedule, ClientRequest, ClientRequestService
 import app.service.models  # Service, ServiceImage
+import app.outbox.models  # SyncOutbox
 
 # Now freeze/validate mappers only AFTER everything is imported
 from sqlalchemy.orm import configure_mappers
 
 configure_mappers()
 
+import app.barber.schedule.totals  # noqa: E402,F401  (schedule totals flush hook)
+
 from app.user.models import User
 from app.barber.models import Barber, BarberSchedule, BarberService
 from app.client.models import Client, ClientRequest
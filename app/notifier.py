@@ -0,0 +1,180 @@
+"""
+Outbound notification dispatcher.
+
+All bot-initiated messages (reminders, accept/deny notices, new-request alerts)
+go through one NotificationDispatcher per Bot:
+
+    notifier = get_notifier(bot)
+    result = await notifier.send(chat_id, text, reply_markup=kb)
+    results, stats = await notifier.send_many([Notification(chat_id, text), ...])
+
+Sends are spread under a global budget (Telegram: ~30 msg/s per bot) and a
+per-chat interval, run with bounded concurrency, and TelegramRetryAfter pauses
+the whole dispatcher for the requested time before retrying.
+"""
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from aiogram.exceptions import (
+    TelegramRetryAfter,
+    TelegramNetworkError,
+    TelegramServerError,
+    TelegramForbiddenError,
+    TelegramBadRequest,
+)
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_RATE_PER_SEC = float(os.getenv("NOTIFY_RATE_PER_SEC", "30"))
+NOTIFY_CHAT_INTERVAL = float(os.getenv("NOTIFY_CHAT_INTERVAL", "1.0"))  # seconds between messages to one chat
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", "16"))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "3"))
+
+
+@dataclass
+class Notification:
+    chat_id: int
+    text: str
+    kwargs: Dict[str, Any] = field(default_factory=dict)  # reply_markup, parse_mode, ...
+    tag: Any = None  # caller's correlation key (e.g. request id)
+
+
+@dataclass
+class SendResult:
+    notification: Notification
+    ok: bool
+    attempts: int = 0
+    latency: float = 0.0  # seconds, including rate-limit waits
+    error: Optional[BaseException] = None
+
+    @property
+    def permanent_failure(self) -> bool:
+        """Blocked bot / bad chat: retrying later will not help."""
+        return isinstance(self.error, (TelegramForbiddenError, TelegramBadRequest))
+
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.sent}/{self.total} sent, {self.failed} failed, {self.retries} retries, "
+            f"{self.elapsed:.2f}s ({self.throughput:.1f} msg/s), p50 {self.p50_ms:.0f}ms p95 {self.p95_ms:.0f}ms"
+        )
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(pct / 100 * (len(values) - 1)))))
+    return values[idx]
+
+
+class NotificationDispatcher:
+    def __init__(
+            self,
+            bot,
+            rate_per_sec: float = NOTIFY_RATE_PER_SEC,
+            chat_interval: float = NOTIFY_CHAT_INTERVAL,
+            concurrency: int = NOTIFY_CONCURRENCY,
+            max_retries: int = NOTIFY_MAX_RETRIES,
+    ):
+        self.bot = bot
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self._sem = asyncio.Semaphore(concurrency)
+        # next free send slot (monotonic time), global and per chat.
+        # Slots are reserved without awaiting in between, so no locks are needed.
+        self._next_slot = 0.0
+        self._chat_next: Dict[int, float] = {}
+
+    def _reserve_slot(self, chat_id: int) -> float:
+        now = monotonic()
+        slot = max(now, self._next_slot, self._chat_next.get(chat_id, 0.0))
+        self._next_slot = slot + self.interval
+        self._chat_next[chat_id] = slot + self.chat_interval
+        if len(self._chat_next) > 10_000:
+            self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+        return slot - now
+
+    def _pause(self, seconds: float) -> None:
+        # flood control is per bot: hold every sender, not only the one that hit it
+        self._next_slot = max(self._next_slot, monotonic() + seconds)
+
+    async def send(self, chat_id: int, text: str, **kwargs) -> SendResult:
+        return await self._deliver(Notification(chat_id=chat_id, text=text, kwargs=kwargs))
+
+    async def _deliver(self, n: Notification) -> SendResult:
+        started = monotonic()
+        result = SendResult(notification=n, ok=False)
+        async with self._sem:
+            while result.attempts <= self.max_retries:
+                wait = self._reserve_slot(n.chat_id)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                result.attempts += 1
+                try:
+                    await self.bot.send_message(n.chat_id, n.text, **n.kwargs)
+                    result.ok = True
+                    result.error = None
+                    break
+                except TelegramRetryAfter as e:
+                    result.error = e
+                    logger.warning("notify %s: flood control, retry after %ss", n.chat_id, e.retry_after)
+                    self._pause(e.retry_after)
+                except (TelegramNetworkError, TelegramServerError) as e:
+                    result.error = e
+                    await asyncio.sleep(min(2 ** result.attempts, 10))
+                except Exception as e:
+                    # blocked / chat not found / bad markup: not retryable
+                    result.error = e
+                    break
+        result.latency = monotonic() - started
+        if not result.ok:
+            logger.warning("notify %s failed after %s attempt(s): %s", n.chat_id, result.attempts, result.error)
+        return result
+
+    async def send_many(self, notifications: Iterable[Notification]) -> Tuple[List[SendResult], BatchStats]:
+        notifications = list(notifications)
+        started = monotonic()
+        results = list(await asyncio.gather(*(self._deliver(n) for n in notifications)))
+
+        latencies = [r.latency * 1000 for r in results if r.ok]
+        stats = BatchStats(
+            total=len(results),
+            sent=sum(1 for r in results if r.ok),
+            failed=sum(1 for r in results if not r.ok),
+            retries=sum(max(r.attempts - 1, 0) for r in results),
+            elapsed=monotonic() - started,
+            p50_ms=_percentile(latencies, 50),
+            p95_ms=_percentile(latencies, 95),
+        )
+        if notifications:
+            logger.info("notify batch: %s", stats)
+        return results, stats
+
+
+def get_notifier(bot) -> NotificationDispatcher:
+    """The bot's dispatcher (run.py attaches one as bot.notifier); created lazily elsewhere."""
+    notifier = getattr(bot, "notifier", None)
+    if notifier is None:
+        notifier = NotificationDispatcher(bot)
+        bot.notifier = notifier
+    return notifier
@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class SyncOutbox(Base):
+    """One pending platform sync event, written in the same transaction as the change."""
+    __tablename__ = "sync_outbox"
+    __table_args__ = (Index("ix_sync_outbox_available_at", "available_at"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20))  # user | client | location
+    entity_key: Mapped[str] = mapped_column(String(255))  # events with the same (kind, key) coalesce
+    payload: Mapped[dict] = mapped_column(JSONB)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)  # next attempt
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
@@ -0,0 +1,292 @@
+"""
+Transactional outbox for platform (Django) sync.
+
+Handlers record the event in their own transaction, nothing leaves the process
+before commit and nothing is lost if the bot dies right after it:
+
+    enqueue_client_sync(session, tg_id, first_name=..., client_id=client.id)
+    await session.commit()          # wakes the drainer
+
+The drainer (started from run.py) claims due rows in one short transaction: an
+UPDATE over a FOR UPDATE SKIP LOCKED pick moves their available_at forward by
+OUTBOX_LEASE and commits, so several bot processes can run it and no row lock
+or transaction stays open during HTTP. The outcome is written in a second short
+transaction; if the process dies in between, the lease runs out and the rows
+are picked up again (delivery is at-least-once, the endpoints upsert). Events
+are coalesced per
+(kind, entity_key), latest payload wins, and posted over one keep-alive httpx
+client: locations in list batches (the endpoint takes a list), users and
+clients concurrently. Failures back off exponentially. After
+OUTBOX_MAX_ATTEMPTS, or on a 4xx, a row stays in the table as a dead letter.
+"""
+import asyncio
+import logging
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+from sqlalchemy import delete, select, update
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db import AsyncSessionLocal
+from app.outbox.models import SyncOutbox
+
+logger = logging.getLogger(__name__)
+
+API = os.getenv("API", "http://127.0.0.1:8000").rstrip("/")
+DJANGO_SYNC_TOKEN = os.getenv("DJANGO_SYNC_TOKEN")
+DJANGO_LOCATION_TOKEN = os.getenv("DJANGO_LOCATION_TOKEN", "")
+LOCATION_PUSH_URL = os.getenv("LOCATION_PUSH_URL", "").lstrip("/")
+
+OUTBOX_INTERVAL = float(os.getenv("OUTBOX_INTERVAL", "10"))  # poll for retries / other processes' rows
+OUTBOX_DEBOUNCE = float(os.getenv("OUTBOX_DEBOUNCE", "1.0"))  # gather events after a wake-up
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "500"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "8"))
+OUTBOX_LIST_CHUNK = int(os.getenv("OUTBOX_LIST_CHUNK", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_CAP = 15 * 60  # seconds
+OUTBOX_LEASE = float(os.getenv("OUTBOX_LEASE", "600"))  # seconds a claimed batch is hidden; > one batch's posts
+
+SYNC_USER = "user"
+SYNC_CLIENT = "client"
+SYNC_LOCATION = "location"
+
+
+class _Endpoint(NamedTuple):
+    path: str
+    token: Optional[str]
+    takes_list: bool
+
+
+ENDPOINTS: Dict[str, _Endpoint] = {
+    SYNC_USER: _Endpoint("api/v1/user/sync/user/", DJANGO_SYNC_TOKEN, False),
+    SYNC_CLIENT: _Endpoint("api/v1/client/add/", DJANGO_SYNC_TOKEN, False),
+    SYNC_LOCATION: _Endpoint(LOCATION_PUSH_URL, DJANGO_LOCATION_TOKEN, True),
+}
+
+
+def enqueue_sync(session, kind: str, entity_key, payload) -> None:
+    """Add a sync event to the caller's transaction; it is sent after commit."""
+    session.add(SyncOutbox(kind=kind, entity_key=str(entity_key)[:255], payload=payload))
+    session.info["outbox_pending"] = True
+
+
+def enqueue_user_sync(session, payload: dict) -> None:
+    """payload: telegram_id, first_name, last_name, role ("user"|"barber"|"admin"), username."""
+    enqueue_sync(session, SYNC_USER, payload["telegram_id"], payload)
+
+
+def enqueue_client_sync(session, telegram_id: int, first_name: str = None, last_name: str = None,
+                        lang: str = None, role: str = "client", client_id=None) -> None:
+    enqueue_sync(session, SYNC_CLIENT, telegram_id, {
+        "telegram_id": telegram_id,
+        "first_name": first_name,
+        "last_name": last_name,
+        "lang": lang,
+        "role": role or "client",
+        "username": str(telegram_id),
+        "client_id": client_id,
+    })
+
+
+def enqueue_location_sync(session, item: dict) -> None:
+    """item: country_*/region_*/city_* names (uz, ru, en) of one resolved place."""
+    key = "|".join(str(item.get(k) or "") for k in ("country_uz", "region_uz", "city_uz"))
+    enqueue_sync(session, SYNC_LOCATION, key, item)
+
+
+@dataclass
+class DrainStats:
+    fetched: int = 0
+    coalesced: int = 0  # distinct (kind, entity) after coalescing
+    requests: int = 0  # HTTP calls made
+    sent: int = 0  # rows delivered
+    failed: int = 0  # rows rescheduled
+    dead: int = 0  # rows given up on
+
+    def __str__(self) -> str:
+        return (
+            f"{self.fetched} event(s) → {self.coalesced} entit(ies) in {self.requests} request(s): "
+            f"{self.sent} sent, {self.failed} retrying, {self.dead} dead"
+        )
+
+
+class _Failure(NamedTuple):
+    error: str
+    permanent: bool
+
+
+def _backoff(attempts: int) -> float:
+    return min(OUTBOX_BACKOFF_CAP, 5 * 2 ** attempts) * random.uniform(0.8, 1.2)
+
+
+class OutboxDrainer:
+    def __init__(self):
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sem = asyncio.Semaphore(OUTBOX_CONCURRENCY)
+
+    # ---------- lifecycle ----------
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=API,
+                timeout=20,
+                limits=httpx.Limits(max_connections=OUTBOX_CONCURRENCY, max_keepalive_connections=OUTBOX_CONCURRENCY),
+                headers={"Content-Type": "application/json"},
+            )
+        return self._client
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), OUTBOX_INTERVAL)
+                await asyncio.sleep(OUTBOX_DEBOUNCE)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while (await self.drain_once()).fetched >= OUTBOX_BATCH:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("outbox drain failed")
+
+    # ---------- draining ----------
+    async def drain_once(self) -> DrainStats:
+        stats = DrainStats()
+        now = datetime.now()
+        rows = await self._claim(now)
+        stats.fetched = len(rows)
+        if not rows:
+            return stats
+
+        # (kind, key) -> rows in id order; the last one carries the current state
+        groups: Dict[Tuple[str, str], list] = {}
+        for r in rows:
+            groups.setdefault((r.kind, r.entity_key), []).append(r)
+        stats.coalesced = len(groups)
+
+        failures: Dict[Tuple[str, str], _Failure] = {}
+        for kind in {k for k, _ in groups}:
+            keys = [g for g in groups if g[0] == kind]
+            failures.update(await self._send_kind(kind, keys, groups, stats))
+
+        await self._settle(groups, failures, datetime.now(), stats)
+        logger.info("outbox: %s", stats)
+        return stats
+
+    async def _claim(self, now: datetime) -> list:
+        """Lease up to OUTBOX_BATCH due rows to this drainer; the row locks last one statement."""
+        due = (
+            select(SyncOutbox.id)
+            .where(SyncOutbox.available_at <= now, SyncOutbox.attempts < OUTBOX_MAX_ATTEMPTS)
+            .order_by(SyncOutbox.id)
+            .limit(OUTBOX_BATCH)
+            .with_for_update(skip_locked=True)
+        )
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                update(SyncOutbox)
+                .where(SyncOutbox.id.in_(due))
+                .values(available_at=now + timedelta(seconds=OUTBOX_LEASE))
+                .returning(SyncOutbox.id, SyncOutbox.kind, SyncOutbox.entity_key, SyncOutbox.payload,
+                           SyncOutbox.attempts)
+                .execution_options(synchronize_session=False)
+            )).all()
+            await session.commit()
+        return sorted(rows, key=lambda r: r.id)  # RETURNING has no order
+
+    async def _settle(self, groups: dict, failures: Dict[Tuple[str, str], _Failure], now: datetime,
+                      stats: DrainStats) -> None:
+        """Delete delivered rows, reschedule (or give up on) failed ones; ends their lease."""
+        async with AsyncSessionLocal() as session:
+            done_ids = [r.id for g, grp in groups.items() if g not in failures for r in grp]
+            if done_ids:
+                await session.execute(delete(SyncOutbox).where(SyncOutbox.id.in_(done_ids)))
+            stats.sent = len(done_ids)
+
+            for g, failure in failures.items():
+                for r in groups[g]:
+                    attempts = OUTBOX_MAX_ATTEMPTS if failure.permanent else r.attempts + 1
+                    if attempts >= OUTBOX_MAX_ATTEMPTS:
+                        stats.dead += 1
+                    else:
+                        stats.failed += 1
+                    await session.execute(
+                        update(SyncOutbox)
+                        .where(SyncOutbox.id == r.id)
+                        .values(
+                            attempts=attempts,
+                            available_at=now + timedelta(seconds=_backoff(r.attempts)),
+                            last_error=failure.error[:500],
+                        )
+                    )
+            await session.commit()
+
+    async def _send_kind(self, kind: str, keys: List[Tuple[str, str]], groups: dict,
+                         stats: DrainStats) -> Dict[Tuple[str, str], _Failure]:
+        endpoint = ENDPOINTS.get(kind)
+        if endpoint is None:
+            return {g: _Failure(f"unknown sync kind {kind!r}", True) for g in keys}
+
+        failures = {}
+        if endpoint.takes_list:
+            for i in range(0, len(keys), OUTBOX_LIST_CHUNK):
+                chunk = keys[i:i + OUTBOX_LIST_CHUNK]
+                stats.requests += 1
+                failure = await self._post(endpoint, [groups[g][-1].payload for g in chunk])
+                if failure:
+                    failures.update({g: failure for g in chunk})
+        else:
+            stats.requests += len(keys)
+            results = await asyncio.gather(*(self._post(endpoint, groups[g][-1].payload) for g in keys))
+            failures.update({g: f for g, f in zip(keys, results) if f})
+        return failures
+
+    async def _post(self, endpoint: _Endpoint, body) -> Optional[_Failure]:
+        headers = {"Authorization": f"Token {endpoint.token}"} if endpoint.token else None
+        async with self._sem:
+            try:
+                r = await self._http().post(f"/{endpoint.path}", json=body, headers=headers)
+            except httpx.HTTPError as e:
+                return _Failure(f"{type(e).__name__}: {e}", False)
+        if r.status_code < 300:
+            return None
+        logger.error("POST %s -> %s %s", endpoint.path, r.status_code, r.text[:300])
+        permanent = 400 <= r.status_code < 500 and r.status_code not in (408, 409, 425, 429)
+        return _Failure(f"HTTP {r.status_code}: {r.text[:300]}", permanent)
+
+
+outbox_drainer = OutboxDrainer()
+
+
+@event.listens_for(Session, "after_commit")
+def _outbox_after_commit(session) -> None:
+    if session.info.pop("outbox_pending", False):
+        outbox_drainer.wake()
@@ -0,0 +1,142 @@
+"""
+Per-handler SQL budgets and an N+1 detector.
+
+A handler declares how many statements one update may cost:
+
+    @client_request_router.callback_query(F.data == "confirm_services")
+    @query_budget(7)
+    async def confirm_services_callback(callback, state): ...
+
+The decorator only tags the function. Budgets are checked where statements are
+captured: QueryBudgetMiddleware (an inner middleware, installed by
+benchmarks/update_replay.py --budgets) collects every statement the matched
+handler sends through a watched engine and raises QueryBudgetExceeded, or hands
+the report to a callback, when the budget is exceeded. The report groups
+statements by shape (parameters and IN-list lengths folded), so a loop of
+per-row queries shows up as one shape repeated N times.
+
+Outside a dispatcher, in a test or a script:
+
+    with capture_statements() as log:
+        await load_my_requests_page(session, client_id)
+    assert_query_budget(log, 1)
+"""
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from sqlalchemy import event
+
+_log: ContextVar[Optional[List[str]]] = ContextVar("query_budget_log", default=None)
+_watched: set = set()
+
+
+def query_budget(max_statements: int):
+    """Declare the most SQL statements one update may cost the decorated handler."""
+
+    def decorate(fn):
+        fn.__query_budget__ = max_statements
+        return fn
+
+    return decorate
+
+
+def budget_of(callback) -> Optional[int]:
+    return getattr(callback, "__query_budget__", None)
+
+
+def _record(conn, cursor, statement, parameters, context, executemany):
+    log = _log.get()
+    if log is not None:
+        log.append(statement)
+
+
+def watch(engine) -> None:
+    """Capture the statements of `engine` (AsyncEngine or Engine); idempotent."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine not in _watched:
+        event.listen(sync_engine, "before_cursor_execute", _record)
+        _watched.add(sync_engine)
+
+
+@contextmanager
+def capture_statements() -> Iterator[List[str]]:
+    """Collect the statements of watched engines issued in this context (this task only)."""
+    log: List[str] = []
+    token = _log.set(log)
+    try:
+        yield log
+    finally:
+        _log.reset(token)
+
+
+_PARAM = re.compile(r"\$\d+|%\([^)]*\)s|\?")
+_PARAM_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROW_LIST = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with parameters and parameter lists folded, whitespace collapsed."""
+    shape = _PARAM.sub("?", " ".join(statement.split()))
+    shape = _PARAM_LIST.sub("?...", shape)
+    return _ROW_LIST.sub("(?)...", shape)
+
+
+@dataclass
+class BudgetReport:
+    handler: str
+    budget: Optional[int]
+    statements: List[str]
+
+    @property
+    def exceeded(self) -> bool:
+        return self.budget is not None and len(self.statements) > self.budget
+
+    def repeated(self, min_count: int = 2) -> List[Tuple[int, str]]:
+        """(count, shape) of every shape sent at least `min_count` times, most repeated first."""
+        shapes = Counter(statement_shape(s) for s in self.statements)
+        return [(n, shape) for shape, n in shapes.most_common() if n >= min_count]
+
+    def __str__(self) -> str:
+        budget = "no budget" if self.budget is None else f"budget {self.budget}"
+        lines = [f"{self.handler}: {len(self.statements)} SQL statements ({budget})"]
+        lines += [f"  {n} x {shape[:160]}" for n, shape in self.repeated()]
+        return "\n".join(lines)
+
+
+class QueryBudgetExceeded(AssertionError):
+    def __init__(self, report: BudgetReport):
+        super().__init__(str(report))
+        self.report = report
+
+
+def assert_query_budget(statements: List[str], max_statements: int, handler: str = "statements") -> None:
+    report = BudgetReport(handler, max_statements, list(statements))
+    if report.exceeded:
+        raise QueryBudgetExceeded(report)
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """
+    Inner middleware: captures what the matched handler sends to the database.
+    With `on_report` every update's report goes there (the caller decides what
+    fails); without it an exceeded budget raises QueryBudgetExceeded.
+    """
+
+    def __init__(self, on_report: Optional[Callable[[BudgetReport], None]] = None):
+        self.on_report = on_report
+
+    async def __call__(self, handler, event, data):
+        callback = data["handler"].callback
+        with capture_statements() as log:
+            result = await handler(event, data)
+        report = BudgetReport(f"{callback.__module__}.{callback.__name__}", budget_of(callback), log)
+        if self.on_report is not None:
+            self.on_report(report)
+        elif report.exceeded:
+            raise QueryBudgetExceeded(report)
+        return result
@@ -0,0 +1,230 @@
+"""
+Reference data cache: service catalog, regions, cities.
+
+These tables change rarely (hourly `update_services`, a new city from
+geocoding), so every process keeps an immutable snapshot of compact tuples:
+
+    regions = await refdata.regions()
+    cities = await refdata.cities(region_id)
+    services = await refdata.services()
+
+Writers bump a version in Redis and publish it on `refdata:changed`; every
+process drops its snapshot on the message (and, as a safety net, compares
+versions at most every REFDATA_CHECK_INTERVAL seconds) and reloads on next use.
+"""
+import asyncio
+import logging
+import os
+from time import monotonic
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+import redis.asyncio as aioredis
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.db import AsyncSessionLocal
+from app.region.models import Region, City
+from app.service.models import Service
+
+logger = logging.getLogger(__name__)
+
+REFDATA_VERSION_KEY = "refdata:version"
+REFDATA_CHANNEL = "refdata:changed"
+REFDATA_CHECK_INTERVAL = float(os.getenv("REFDATA_CHECK_INTERVAL", "60"))
+
+
+class ServiceRef(NamedTuple):
+    id: int
+    name_uz: Optional[str]
+    name_ru: Optional[str]
+    name_en: Optional[str]
+    disabled: Optional[bool]
+
+
+class RegionRef(NamedTuple):
+    id: int
+    name_uz: Optional[str]
+    name_ru: Optional[str]
+    country_id: Optional[int]
+
+
+class CityRef(NamedTuple):
+    id: int
+    name_uz: Optional[str]
+    name_ru: Optional[str]
+    region_id: Optional[int]
+
+
+class RefSnapshot(NamedTuple):
+    version: int
+    generation: int  # local reload counter; keys derived caches such as pre-built keyboards
+    services: Tuple[ServiceRef, ...]
+    regions: Tuple[RegionRef, ...]
+    cities_by_region: Mapping[int, Tuple[CityRef, ...]]
+
+
+def _redis_from_env():
+    host = os.getenv("REDIS_HOST", "localhost")
+    port = os.getenv("REDIS_PORT", "6379")
+    db = os.getenv("REDIS_DB_APP", "4")
+    return aioredis.from_url(f"redis://{host}:{port}/{db}", decode_responses=True)
+
+
+async def bump_refdata_version(redis=None) -> None:
+    """Tell every process that reference tables changed. Call after commit."""
+    own = redis is None
+    if own:
+        redis = _redis_from_env()
+    try:
+        version = await redis.incr(REFDATA_VERSION_KEY)
+        await redis.publish(REFDATA_CHANNEL, version)
+    except Exception as e:
+        logger.warning("refdata version bump failed: %s", e)
+    finally:
+        if own:
+            await redis.aclose()
+
+
+class RefDataCache:
+    def __init__(self):
+        self._snapshot: Optional[RefSnapshot] = None
+        self._lock = asyncio.Lock()
+        self._redis = None
+        self._checked_at = 0.0
+        self._generation = 0
+        self._listener: Optional[asyncio.Task] = None
+        self._pending = set()
+        self.stats = {"hits": 0, "misses": 0, "reloads": 0, "invalidations": 0}
+
+    # ---------- lifecycle ----------
+    async def start(self, redis) -> None:
+        """Load at startup and follow invalidations (bot process)."""
+        self._redis = redis
+        await self._reload()
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(REFDATA_CHANNEL)
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "message":
+                        continue
+                    snap = self._snapshot
+                    if snap is None or int(msg["data"]) != snap.version:
+                        self.invalidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("refdata listener error, resubscribing: %s", e)
+                self.invalidate()
+                await asyncio.sleep(5)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+        self.stats["invalidations"] += 1
+
+    def changed(self) -> None:
+        """Local write committed: drop our snapshot now, tell the others in the background."""
+        self.invalidate()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(bump_refdata_version(self._redis))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    # ---------- loading ----------
+    async def _remote_version(self) -> int:
+        if self._redis is None:
+            return 0
+        try:
+            return int(await self._redis.get(REFDATA_VERSION_KEY) or 0)
+        except Exception as e:
+            logger.warning("refdata version read failed: %s", e)
+            return 0
+
+    async def _reload(self) -> RefSnapshot:
+        version = await self._remote_version()
+        async with AsyncSessionLocal() as session:
+            services = tuple(ServiceRef(*r) for r in (await session.execute(
+                select(Service.id, Service.name_uz, Service.name_ru, Service.name_en, Service.disabled)
+                .order_by(Service.id)
+            )).all())
+            regions = tuple(RegionRef(*r) for r in (await session.execute(
+                select(Region.id, Region.name_uz, Region.name_ru, Region.country_id).order_by(Region.id)
+            )).all())
+            cities = [CityRef(*r) for r in (await session.execute(
+                select(City.id, City.name_uz, City.name_ru, City.region_id).order_by(City.id)
+            )).all()]
+
+        by_region: dict = {}
+        for c in cities:
+            by_region.setdefault(c.region_id, []).append(c)
+        self._generation += 1
+        snap = RefSnapshot(
+            version=version,
+            generation=self._generation,
+            services=services,
+            regions=regions,
+            cities_by_region=MappingProxyType({k: tuple(v) for k, v in by_region.items()}),
+        )
+        self._snapshot = snap
+        self._checked_at = monotonic()
+        self.stats["reloads"] += 1
+        return snap
+
+    async def snapshot(self) -> RefSnapshot:
+        snap = self._snapshot
+        if snap is not None and monotonic() - self._checked_at > REFDATA_CHECK_INTERVAL:
+            # safety net for missed pub/sub messages
+            self._checked_at = monotonic()
+            if await self._remote_version() != snap.version:
+                self.invalidate()
+                snap = None
+        if snap is not None:
+            self.stats["hits"] += 1
+            return snap
+
+        self.stats["misses"] += 1
+        async with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            return await self._reload()
+
+    # ---------- accessors ----------
+    async def services(self, include_disabled: bool = False) -> Tuple[ServiceRef, ...]:
+        snap = await self.snapshot()
+        if include_disabled:
+            return snap.services
+        # same as Service.disabled.is_(False): NULL counts as not enabled
+        return tuple(s for s in snap.services if s.disabled is False)
+
+    async def regions(self) -> Tuple[RegionRef, ...]:
+        return (await self.snapshot()).regions
+
+    async def cities(self, region_id: int) -> Tuple[CityRef, ...]:
+        return (await self.snapshot()).cities_by_region.get(region_id, ())
+
+
+refdata = RefDataCache()
+
+
+def mark_refdata_changed(session) -> None:
+    """Flag a session that inserted/changed reference rows; handled after its commit."""
+    session.info["refdata_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _refdata_after_commit(session) -> None:
+    if session.info.pop("refdata_changed", False):
+        refdata.changed()
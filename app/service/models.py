@@ -1,7 +1,7 @@
 from sqlalchemy import Integer, String, ForeignKey, BigInteger
 from sqlalchemy.orm import Mapped, mapped_column
-from app.db import Base
-from sqlalchemy import Table, Column, ForeignKey, BigInteger, Boolean
+from app.db import Base, LAZY
+from sqlalchemy import Table, Column, ForeignKey, BigInteger, Boolean, UniqueConstraint
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from typing import Optional
 from sqlalchemy.ext.declarative import declarative_base
@@ -9,6 +9,7 @@ from sqlalchemy.ext.declarative import declarative_base
 
 class Service(Base):
     __tablename__ = "services"
+    __table_args__ = (UniqueConstraint("platform_id", name="uq_services_platform_id"),)
     id: Mapped[int] = mapped_column(primary_key=True)
     name_uz: Mapped[str] = mapped_column(String(50), nullable=True)
     name_ru: Mapped[str] = mapped_column(String(50), nullable=True)
@@ -19,12 +20,18 @@ class Service(Base):
     platform_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
     # DO NOT define barbers here yet
     images = relationship("ServiceImages", backref="service", cascade="all, delete-orphan")
-    barber_service = relationship("BarberService", back_populates="service", lazy="selectin")
+    barber_service = relationship("BarberService", back_populates="service", lazy=LAZY)
     disabled: Mapped[bool] = mapped_column(Boolean, default=False, nullable=True)
 
 
 class ServiceImages(Base):
     __tablename__ = "service_images"
+    __table_args__ = (UniqueConstraint("service_id", "source_url", name="uq_service_images_service_source"),)
     id: Mapped[int] = mapped_column(primary_key=True)
     service_id: Mapped[int] = mapped_column(ForeignKey("services.id"))
-    image_url: Mapped[str] = mapped_column(String(255), nullable=True)
+    image_url: Mapped[str] = mapped_column(String(255), nullable=True)  # local path in static/images
+    # platform URL + validators for conditional re-fetch (see app/service/tasks.py)
+    source_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    etag: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    last_modified: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
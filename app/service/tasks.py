@@ -3,11 +3,15 @@ from __future__ import annotations
 
 import os
 import asyncio
+import hashlib
 import logging
-from typing import Optional
+from dataclasses import dataclass
+from time import monotonic
+from typing import NamedTuple, Optional
 from urllib.parse import urlparse
 from pathlib import Path
 
+import httpx
 import requests
 from celery import shared_task
 
@@ -15,12 +19,15 @@ from celery import shared_task
 #    Your app/models/__init__.py must import region -> user -> client -> barber -> service, then call configure_mappers()
 import app.models  # DO NOT REMOVE
 
-from sqlalchemy import select, delete
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from app.db import AsyncSessionLocal, async_engine
+from app.db import AsyncSessionLocal
+from app.worker_runtime import run_async
+from app.barber.models import BarberService
 from app.service.models import Service, ServiceImages
+from app.refdata import bump_refdata_version
 
 log = logging.getLogger(__name__)
 
@@ -29,13 +36,13 @@ log = logging.getLogger(__name__)
 @shared_task(name="app.tasks.update_services")
 def update_services() -> None:
     """
-    Celery task entrypoint. Runs the async body in a fresh event loop.
+    Celery task entrypoint. Runs the async body on the worker's event loop.
     We import app.models above so all mappers (Country/User/...) are registered
     BEFORE the first DB access.
     """
     # Defensive import (no-op if already imported)
     import app.models  # noqa: F401
-    asyncio.run(_update_services())
+    run_async(_update_services())
 
 
 # ---------- async task body ----------
@@ -86,106 +93,258 @@ async def _update_services() -> None:
     # Optional debug: peek at payload
     # log.warning("%s", services)
 
-    # ---- 3) Upsert into DB ----
+    # ---- 3) Diff against the DB, fetch changed images, bulk upsert ----
+    report = SyncReport()
+    started = monotonic()
     async with AsyncSessionLocal() as session:
         try:
-            for s in services:
-                # Upsert Service by platform_id
-                service = (await session.scalars(
-                    select(Service).where(Service.platform_id == s.get("id"))
-                )).first()
-
-                if not service:
-                    service = Service(
-                        platform_id=s.get("id"),
-                        name_uz=s.get("name_uz"),
-                        name_ru=s.get("name_ru"),
-                        name_en=s.get("name_en"),   # ← no trailing comma!
-                        description_uz=s.get("description_uz"),
-                        description_ru=s.get("description_ru"),
-                        description_en=s.get("description_en"),
-                        disabled=bool(s.get("disabled", False)),
-                    )
-                    session.add(service)
-                    # Need service.id for image FK
-                    await session.flush()
-                else:
-                    service.name_uz = s.get("name_uz")
-                    service.name_ru = s.get("name_ru")
-                    service.name_en = s.get("name_en")
-                    service.description_uz = s.get("description_uz")
-                    service.description_ru = s.get("description_ru")
-                    service.description_en = s.get("description_en")
-                    service.disabled = bool(s.get("disabled", False))
-
-                # Upsert images for this service
-                for img in s.get("images", []) or []:
-                    url = img.get("image")
-                    if not url:
-                        continue
-                    local_path = _download_image(url)
-                    if not local_path:
-                        continue
-
-                    # Avoid duplicates by (service_id, image_url)
-                    exists = (await session.scalars(
-                        select(ServiceImages).where(
-                            ServiceImages.service_id == service.id,
-                            ServiceImages.image_url == local_path,
-                        )
-                    )).first()
-                    if not exists:
-                        session.add(ServiceImages(service_id=service.id, image_url=local_path))
-
-            await session.commit()
-
-            # Remove local services that no longer exist on the platform
-            platform_ids = [s.get("id") for s in services if s.get("id") is not None]
-            if platform_ids:
-                await session.execute(
-                    delete(Service).where(Service.platform_id.notin_(platform_ids))
-                )
-                await session.commit()
-
+            await _sync_catalog(session, services, report)
+            if report.services_touched:
+                # every bot process reloads its service catalog
+                await bump_refdata_version()
         except SQLAlchemyError as db_err:
             await session.rollback()
             log.exception("DB error while saving services: %s", db_err)
         except Exception as e:
             await session.rollback()
             log.exception("Unexpected error while saving services: %s", e)
+    report.elapsed = monotonic() - started
+    log.info("service sync: %s", report)
 
-    # ---- 4) Dispose engine before loop closes (prevents asyncpg teardown noise) ----
-    try:
-        await async_engine.dispose()
-    except Exception:
-        # best-effort; avoid masking real errors
-        pass
 
+# ---------- sync engine ----------
+SERVICE_FIELDS = (
+    "name_uz", "name_ru", "name_en",
+    "description_uz", "description_ru", "description_en",
+    "disabled",
+)
+IMAGE_DIR = Path("static/images")
+IMAGE_CONCURRENCY = int(os.getenv("SERVICE_IMAGE_CONCURRENCY", "8"))
+IMAGE_TIMEOUT = float(os.getenv("SERVICE_IMAGE_TIMEOUT", "30"))
+
+
+@dataclass
+class SyncReport:
+    services_new: int = 0
+    services_changed: int = 0
+    services_unchanged: int = 0
+    services_deleted: int = 0
+    services_disabled: int = 0  # left the platform, still offered by a barber
+    images_changed: int = 0
+    images_unchanged: int = 0
+    images_deleted: int = 0
+    downloaded: int = 0
+    not_modified: int = 0  # 304 from the platform
+    deduplicated: int = 0  # downloaded content already in static/images
+    failed: int = 0
+    bytes_downloaded: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def services_touched(self) -> int:
+        return self.services_new + self.services_changed + self.services_deleted + self.services_disabled
+
+    def __str__(self) -> str:
+        return (
+            f"services {self.services_new} new, {self.services_changed} changed, "
+            f"{self.services_unchanged} unchanged, {self.services_deleted} deleted, "
+            f"{self.services_disabled} disabled; "
+            f"images {self.images_changed} changed, {self.images_unchanged} unchanged, "
+            f"{self.images_deleted} deleted; downloads {self.downloaded} "
+            f"({self.bytes_downloaded} bytes, {self.deduplicated} deduplicated), "
+            f"{self.not_modified} not modified, {self.failed} failed; {self.elapsed:.2f}s"
+        )
+
+
+class _ImageFile(NamedTuple):
+    image_url: str  # local path
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: Optional[str]
+
+
+def _service_row(s: dict) -> dict:
+    row = {f: s.get(f) for f in SERVICE_FIELDS}
+    row["disabled"] = bool(s.get("disabled", False))
+    row["platform_id"] = s["id"]
+    return row
+
+
+async def _sync_catalog(session, services: list, report: SyncReport) -> None:
+    incoming = {s["id"]: s for s in services if s.get("id") is not None}
+
+    # -- read current state (one query per table), then end the read transaction
+    existing = {
+        r.platform_id: r
+        for r in (await session.execute(
+            select(Service.id, Service.platform_id, *(getattr(Service, f) for f in SERVICE_FIELDS))
+            .where(Service.platform_id.is_not(None))
+        )).all()
+    }
+    current_images = (await session.execute(
+        select(
+            ServiceImages.id, ServiceImages.service_id, ServiceImages.source_url, ServiceImages.image_url,
+            ServiceImages.etag, ServiceImages.last_modified, ServiceImages.content_hash,
+        )
+    )).all()
+    await session.commit()
+
+    # -- diff services
+    upserts = []
+    for pid, s in incoming.items():
+        row = _service_row(s)
+        old = existing.get(pid)
+        if old is None:
+            report.services_new += 1
+            upserts.append(row)
+        elif any(getattr(old, f) != row[f] for f in SERVICE_FIELDS):
+            report.services_changed += 1
+            upserts.append(row)
+        else:
+            report.services_unchanged += 1
+    # an empty payload is treated as a platform hiccup, never as "delete everything"
+    removed = {r.id: r for pid, r in existing.items() if pid not in incoming} if incoming else {}
+
+    # -- fetch images: once per URL, conditional on what we already hold
+    wanted = {}  # (platform_id, url) in payload order
+    for pid, s in incoming.items():
+        for img in s.get("images") or []:
+            if img.get("image"):
+                wanted[(pid, img["image"])] = None
+    prior_by_url = {}
+    for r in current_images:
+        if r.source_url and r.image_url and Path(r.image_url).exists():
+            prior_by_url.setdefault(r.source_url, r)
+    urls = list(dict.fromkeys(url for _, url in wanted))
+    fetched = await _fetch_images(urls, prior_by_url, report)
 
-# ---------- helpers ----------
-def _download_image(url: str) -> Optional[str]:
+    # -- write everything in one transaction
+    service_ids = {pid: r.id for pid, r in existing.items()}
+    if upserts:
+        stmt = pg_insert(Service).values(upserts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Service.platform_id],
+            set_={f: stmt.excluded[f] for f in SERVICE_FIELDS},
+        ).returning(Service.id, Service.platform_id)
+        service_ids.update({pid: sid for sid, pid in (await session.execute(stmt)).all()})
+
+    images_by_key = {(r.service_id, r.source_url): r for r in current_images}
+    keep = set()
+    image_rows = []
+    for pid, url in wanted:
+        sid = service_ids[pid]
+        f = fetched.get(url)
+        if f is None:
+            # failed without a local copy; keep whatever row exists and retry next run
+            keep.add((sid, url))
+            continue
+        keep.add((sid, url))
+        old = images_by_key.get((sid, url))
+        if old is not None and _ImageFile(old.image_url, old.etag, old.last_modified, old.content_hash) == f:
+            report.images_unchanged += 1
+            continue
+        report.images_changed += 1
+        image_rows.append({"service_id": sid, "source_url": url, **f._asdict()})
+    if image_rows:
+        stmt = pg_insert(ServiceImages).values(image_rows)
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[ServiceImages.service_id, ServiceImages.source_url],
+            set_={c: stmt.excluded[c] for c in _ImageFile._fields},
+        ))
+
+    # services that left the platform but a barber still offers: barber_services.service_id
+    # has no ON DELETE, so they are disabled (hidden from the catalog) instead of deleted
+    linked = set((await session.execute(
+        select(BarberService.service_id).where(BarberService.service_id.in_(list(removed))).distinct()
+    )).scalars()) if removed else set()
+    to_disable = [sid for sid in linked if removed[sid].disabled is not True]
+    removed_ids = [sid for sid in removed if sid not in linked]
+    if to_disable:
+        await session.execute(update(Service).where(Service.id.in_(to_disable)).values(disabled=True))
+        report.services_disabled = len(to_disable)
+
+    # images dropped from the payload (and legacy rows without source_url); a removed
+    # service's images go with it below, a disabled one keeps them
+    synced = set(service_ids.values()) - set(removed)
+    stale_images = [
+        r.id for r in current_images
+        if r.service_id in synced and (r.service_id, r.source_url) not in keep
+    ]
+    if stale_images:
+        await session.execute(delete(ServiceImages).where(ServiceImages.id.in_(stale_images)))
+        report.images_deleted = len(stale_images)
+    if removed_ids:
+        try:
+            # savepoint: a barber linking one of them meanwhile fails only the delete, not the sync
+            async with session.begin_nested():
+                gone = await session.execute(delete(ServiceImages).where(ServiceImages.service_id.in_(removed_ids)))
+                await session.execute(delete(Service).where(Service.id.in_(removed_ids)))
+            report.services_deleted = len(removed_ids)
+            report.images_deleted += gone.rowcount or 0
+        except IntegrityError as e:
+            log.warning("kept %s removed service(s) still referenced: %s", len(removed_ids), e.orig)
+
+    await session.commit()
+
+
+async def _fetch_images(urls: list, prior_by_url: dict, report: SyncReport) -> dict:
+    IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+    sem = asyncio.Semaphore(IMAGE_CONCURRENCY)
+    limits = httpx.Limits(max_connections=IMAGE_CONCURRENCY)
+    async with httpx.AsyncClient(timeout=IMAGE_TIMEOUT, follow_redirects=True, limits=limits) as client:
+        results = await asyncio.gather(
+            *(_fetch_image(client, sem, url, prior_by_url.get(url), report) for url in urls)
+        )
+    return {url: f for url, f in zip(urls, results) if f is not None}
+
+
+async def _fetch_image(client: httpx.AsyncClient, sem: asyncio.Semaphore, url: str, prior,
+                       report: SyncReport) -> Optional[_ImageFile]:
     """
-    Downloads an image to static/images/ and returns the local relative path as string,
-    or None on failure.
+    Conditional GET (ETag / Last-Modified of the copy we hold). New content is stored
+    content-addressed as static/images/<sha256>.<ext>, so identical images share one file.
+    On failure the previous copy, if any, is kept.
     """
+    previous = _ImageFile(prior.image_url, prior.etag, prior.last_modified, prior.content_hash) if prior else None
+    headers = {}
+    if previous:
+        if previous.etag:
+            headers["If-None-Match"] = previous.etag
+        if previous.last_modified:
+            headers["If-Modified-Since"] = previous.last_modified
+
     try:
-        resp = requests.get(url, stream=True, timeout=30)
-        if resp.status_code != 200:
-            log.warning("Image download failed (%s): %s", resp.status_code, url)
-            return None
-
-        filename = os.path.basename(urlparse(url).path) or "image.bin"
-        # simple dedup by filename; if collisions are possible, hash the URL
-        local_dir = Path("static/images")
-        local_dir.mkdir(parents=True, exist_ok=True)
-        local_path = local_dir / filename
-
-        with open(local_path, "wb") as f:
-            for chunk in resp.iter_content(1024 * 64):
-                if chunk:
-                    f.write(chunk)
-
-        return str(local_path)
-    except Exception as e:
+        async with sem:
+            resp = await client.get(url, headers=headers)
+    except httpx.HTTPError as e:
         log.warning("Error downloading image %s: %s", url, e)
-        return None
+        report.failed += 1
+        return previous
+
+    if resp.status_code == 304 and previous:
+        report.not_modified += 1
+        return previous
+    if resp.status_code != 200:
+        log.warning("Image download failed (%s): %s", resp.status_code, url)
+        report.failed += 1
+        return previous
+
+    body = resp.content
+    digest = hashlib.sha256(body).hexdigest()
+    suffix = Path(urlparse(url).path).suffix.lower()[:10] or ".bin"
+    local_path = IMAGE_DIR / f"{digest}{suffix}"
+    report.downloaded += 1
+    report.bytes_downloaded += len(body)
+    if local_path.exists():
+        report.deduplicated += 1
+    else:
+        await asyncio.to_thread(_write_atomic, local_path, body)
+
+    return _ImageFile(str(local_path), resp.headers.get("etag"), resp.headers.get("last-modified"), digest)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_suffix(path.suffix + ".part")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
@@ -2,5 +2,4 @@ from app.barber import tasks
 from app.service import tasks
 from app.region import tasks
 from app.client import tasks
-from app.basic.task_sysnc_user import sync_client_to_django, sync_user_to_django
 
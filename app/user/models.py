@@ -27,6 +27,6 @@ class User(Base):
     region_id: Mapped[int] = mapped_column(ForeignKey("region.id"), nullable=True)
     region = relationship("Region", back_populates="users")
 
-    city_id: Mapped[int] = mapped_column(ForeignKey("city.id"), nullable=True)
+    city_id: Mapped[int] = mapped_column(ForeignKey("city.id"), nullable=True, index=True)
     city = relationship("City", back_populates="users")
 
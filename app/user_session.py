@@ -0,0 +1,93 @@
+"""
+Per-user conversation state kept in the app Redis.
+
+One hash per Telegram user, `session:{telegram_id}`, holding the small fields
+handlers carry between updates (the "back" breadcrumb, the slot picked before
+choosing services, ...). Every read and write refreshes the TTL in the same
+pipelined round trip, so an active user's session never expires mid-flow and an
+abandoned one disappears after SESSION_TTL instead of living forever.
+
+    await set_last_action(redis, tg_id, "barber_profile")
+    await update_session(redis, tg_id, picked_day="2026-10-19", picked_hm="1530")
+    s = await load_session(redis, tg_id, "picked_day", "picked_hm")
+    await clear_session(redis, tg_id, "picked_day", "picked_hm")
+
+These replace the per-field `user:{telegram_id}:<field>` keys, which had no
+TTL; leftovers can be dropped once after deploying:
+
+    redis-cli -n $REDIS_DB_APP --scan --pattern 'user:*:*' | xargs -r redis-cli -n $REDIS_DB_APP unlink
+"""
+import os
+from dataclasses import dataclass, fields
+from typing import Optional
+
+SESSION_TTL = int(os.getenv("USER_SESSION_TTL", str(7 * 24 * 60 * 60)))  # sliding, seconds
+
+
+def _session_key(telegram_id: int) -> str:
+    return f"session:{telegram_id}"
+
+
+@dataclass
+class UserSession:
+    last_action: Optional[str] = None  # where "⬅️ back" returns to (app/basic/handlers.py)
+    picked_day: Optional[str] = None  # "YYYY-MM-DD" of the slot picked before choosing services
+    picked_hm: Optional[str] = None  # "HHMM" of that slot
+    selected_services: Optional[str] = None  # comma-separated barber_service ids of an edited request
+    service_id: Optional[int] = None  # barber_service being edited
+
+    def __post_init__(self):
+        if isinstance(self.service_id, str):
+            self.service_id = int(self.service_id)
+
+
+FIELDS = tuple(f.name for f in fields(UserSession))
+
+
+def _check(names) -> None:
+    unknown = set(names) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"unknown session field(s): {', '.join(sorted(unknown))}")
+
+
+async def load_session(redis, telegram_id: int, *names: str) -> UserSession:
+    """The session's fields (all of them, or just `names`); missing ones are None."""
+    names = names or FIELDS
+    _check(names)
+    key = _session_key(telegram_id)
+    pipe = redis.pipeline(transaction=False)
+    pipe.hmget(key, names)
+    pipe.expire(key, SESSION_TTL)
+    values, _ = await pipe.execute()
+    return UserSession(**{n: v for n, v in zip(names, values) if v is not None})
+
+
+async def update_session(redis, telegram_id: int, **values) -> None:
+    """Set fields (None removes one) and restart the TTL, in one round trip."""
+    _check(values)
+    key = _session_key(telegram_id)
+    present = {n: str(v) for n, v in values.items() if v is not None}
+    removed = [n for n, v in values.items() if v is None]
+    pipe = redis.pipeline(transaction=False)
+    if present:
+        pipe.hset(key, mapping=present)
+    if removed:
+        pipe.hdel(key, *removed)
+    pipe.expire(key, SESSION_TTL)
+    await pipe.execute()
+
+
+async def clear_session(redis, telegram_id: int, *names: str) -> None:
+    """Remove the given fields, or the whole session when none are given."""
+    if not names:
+        await redis.delete(_session_key(telegram_id))
+        return
+    await update_session(redis, telegram_id, **dict.fromkeys(names))
+
+
+async def get_last_action(redis, telegram_id: int) -> Optional[str]:
+    return (await load_session(redis, telegram_id, "last_action")).last_action
+
+
+async def set_last_action(redis, telegram_id: int, action: str) -> None:
+    await update_session(redis, telegram_id, last_action=action)
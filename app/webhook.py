@@ -0,0 +1,134 @@
+"""
+Webhook ingestion (BOT_MODE=webhook in run.py).
+
+An aiohttp server that checks Telegram's secret token, answers 200 right away and
+processes the update in the background, so any number of bot processes can sit
+behind a load balancer (FSM state and caches already live in Redis).
+
+    WEBHOOK_BASE_URL        public https base, e.g. https://bot.example.com
+    WEBHOOK_PATH            /tg/webhook
+    WEBHOOK_SECRET          X-Telegram-Bot-Api-Secret-Token value (required)
+    WEBHOOK_HOST / _PORT    bind address (0.0.0.0:8080)
+    WEBHOOK_MAX_CONCURRENCY updates processed at once per process (64)
+    WEBHOOK_MAX_PENDING     accepted-but-unfinished updates before answering 503 (1000);
+                            Telegram redelivers, another process picks it up
+    WEBHOOK_MAX_CONNECTIONS Telegram → us parallel connections (40)
+    WEBHOOK_SET             1 → call setWebhook on startup (idempotent, safe on every replica)
+    WEBHOOK_DRAIN_TIMEOUT   seconds in-flight updates get to finish on SIGTERM / SIGINT (25)
+"""
+import asyncio
+import logging
+import os
+import signal
+from typing import Any, Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/tg/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "64"))
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_SET = os.getenv("WEBHOOK_SET", "1").lower() in ("1", "true", "yes")
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "25"))
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Fast-ack handler: 200 immediately, processing in a background task bounded by
+    a semaphore; beyond `max_pending` in-flight updates it sheds load with 503.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrency: int, max_pending: int,
+                 **kwargs: Any) -> None:
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.max_pending = max_pending
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        async with self._sem:
+            try:
+                await super()._background_feed_update(bot, update)
+            except Exception:
+                logger.exception("webhook update %s failed", update.get("update_id"))
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        if len(self._background_feed_update_tasks) >= self.max_pending:
+            logger.warning("webhook backlog full (%s), asking Telegram to retry", self.max_pending)
+            return web.Response(status=503)
+        return await super()._handle_request_background(bot, request)
+
+    async def drain(self, timeout: float) -> None:
+        """Let accepted updates finish before the process exits (rolling deploys)."""
+        pending = set(self._background_feed_update_tasks)
+        if not pending:
+            return
+        logger.info("webhook: draining %s in-flight update(s)", len(pending))
+        done, not_done = await asyncio.wait(pending, timeout=timeout)
+        if not_done:
+            logger.warning("webhook: %s update(s) still running after %.0fs", len(not_done), timeout)
+
+    async def close(self) -> None:
+        await self.drain(WEBHOOK_DRAIN_TIMEOUT)
+        await super().close()
+
+
+async def _healthz(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    if not WEBHOOK_SECRET:
+        raise ValueError("WEBHOOK_SECRET is required in webhook mode.")
+
+    if WEBHOOK_SET:
+        if not WEBHOOK_BASE_URL:
+            raise ValueError("WEBHOOK_BASE_URL is required when WEBHOOK_SET=1.")
+
+        async def _on_startup(bot: Bot) -> None:
+            await bot.set_webhook(
+                url=f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+            )
+            logger.info("webhook set to %s%s", WEBHOOK_BASE_URL, WEBHOOK_PATH)
+
+        dp.startup.register(_on_startup)
+
+    app = web.Application()
+    app.router.add_get("/healthz", _healthz)
+    BoundedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        max_concurrency=WEBHOOK_MAX_CONCURRENCY,
+        max_pending=WEBHOOK_MAX_PENDING,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+    await site.start()
+    logger.info("webhook server listening on %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+    # SIGTERM (rolling deploy) / SIGINT: stop listening, drain in-flight updates, then return to run.py's cleanup
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    signals = (signal.SIGTERM, signal.SIGINT)
+    for sig in signals:
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+        logger.info("webhook: shutting down")
+    finally:
+        for sig in signals:
+            loop.remove_signal_handler(sig)
+        await runner.cleanup()
@@ -0,0 +1,135 @@
+"""
+Async runtime for Celery worker processes.
+
+One event loop per worker process runs forever in a daemon thread; async task
+bodies are submitted to it instead of each run building (and tearing down) its
+own loop, asyncpg connections and Bot HTTP session:
+
+    @celery.task(name="...")
+    def my_task():
+        run_async(_my_task_async())
+
+    async def _my_task_async():
+        async with AsyncSessionLocal() as session: ...     # warm pool
+        await get_notifier(worker_bot()).send(...)         # shared Bot session
+
+The loop is started (and the pool warmed) on `worker_process_init`, i.e. after
+the prefork fork, and closed on `worker_process_shutdown`. Outside a prefork
+child (solo pool, scripts) it starts lazily on first use.
+"""
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Optional
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from celery.signals import worker_process_init, worker_process_shutdown
+from sqlalchemy import text
+
+from app.db import async_engine
+
+logger = logging.getLogger(__name__)
+
+WORKER_POOL_WARM = int(os.getenv("WORKER_POOL_WARM", "2"))  # connections opened at process start
+
+
+class WorkerRuntime:
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._bot: Optional[Bot] = None
+
+    # ---------- lifecycle ----------
+    def start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self.loop is None or self.loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._serve, args=(loop,), name="worker-async", daemon=True)
+                thread.start()
+                self.loop, self._thread = loop, thread
+            return self.loop
+
+    @staticmethod
+    def _serve(loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run `coro` on the worker loop and block the calling (Celery) thread for its result."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.start())
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # time limit / shutdown in the caller: don't leave the coroutine running
+            future.cancel()
+            raise
+
+    async def warm_up(self) -> None:
+        async def _touch():
+            async with async_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                await asyncio.sleep(0.05)  # hold it so the next one opens a new connection
+
+        await asyncio.gather(*(_touch() for _ in range(max(WORKER_POOL_WARM, 0))))
+
+    def shutdown(self, timeout: float = 10) -> None:
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+
+        async def _close():
+            if self._bot is not None:
+                await self._bot.session.close()
+                self._bot = None
+            await async_engine.dispose()
+
+        try:
+            asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout)
+        except Exception as e:
+            logger.warning("worker runtime shutdown: %s", e)
+        loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        loop.close()
+        self.loop = self._thread = None
+
+    # ---------- shared clients ----------
+    def bot(self) -> Bot:
+        """The process-wide Bot (one aiohttp session); use from coroutines running on this loop."""
+        if self._bot is None:
+            self._bot = Bot(
+                token=os.getenv("TOKEN"),
+                default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+            )
+        return self._bot
+
+
+runtime = WorkerRuntime()
+
+
+def run_async(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    return runtime.run(coro, timeout)
+
+
+def worker_bot() -> Bot:
+    return runtime.bot()
+
+
+@worker_process_init.connect
+def _on_worker_process_init(**_) -> None:
+    # the engine object was created before the fork; a child must never reuse parent sockets
+    async_engine.sync_engine.dispose(close=False)
+    runtime.start()
+    try:
+        runtime.run(runtime.warm_up(), timeout=15)
+    except Exception as e:
+        logger.warning("worker pool warm-up failed: %s", e)
+
+
+@worker_process_shutdown.connect
+def _on_worker_process_shutdown(**_) -> None:
+    runtime.shutdown()
@@ -0,0 +1,78 @@
+"""
+Concurrent double-booking check against a local Postgres (migration 0005 applied).
+
+N sessions try to book the same barber for overlapping times at once, each
+after an application-side "is it free?" check; the exclusion constraint must
+let exactly one of them commit.
+
+    python -m benchmarks.booking_race BARBER_ID               # 20 concurrent attempts
+    python -m benchmarks.booking_race BARBER_ID 100
+
+Rows are written on a far-future day and deleted afterwards. Uses
+SQLALCHEMY_DATABASE_URI like the bot; point it at a scratch database.
+tests/test_booking_race.py runs the same race against the test fixture.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+import app.models  # noqa: F401  (configure mappers)
+from app.barber.barber_requests.utils import check_time_conflict
+from app.barber.schedule.availability import is_slot_conflict
+from app.client.models import ClientRequest
+from app.db import AsyncSessionLocal, async_engine
+
+DAY = datetime(2099, 1, 1, 10, 0)
+
+
+async def _attempt(barber_id: int, i: int, gate: asyncio.Event, precheck: bool = True) -> str:
+    start = DAY + timedelta(minutes=5 * (i % 6))  # all attempts overlap [10:00, 11:25)
+    end = start + timedelta(minutes=60)
+    async with AsyncSessionLocal() as session:
+        await gate.wait()
+        # the old application-side check: every attempt sees a free slot
+        if precheck and await check_time_conflict(session, barber_id, start, end):
+            return "checked-busy"
+        session.add(ClientRequest(barber_id=barber_id, date=start, from_time=start, to_time=end, status="accept"))
+        try:
+            await session.commit()
+            return "booked"
+        except IntegrityError as e:
+            await session.rollback()
+            return "conflict" if is_slot_conflict(e) else f"error: {e.orig}"
+
+
+async def _main(argv) -> None:
+    barber_id = int(argv[0])
+    n = int(argv[1]) if len(argv) > 1 else 20
+    window = (ClientRequest.barber_id == barber_id, ClientRequest.from_time >= DAY,
+              ClientRequest.from_time < DAY + timedelta(days=1))
+    try:
+        async with AsyncSessionLocal() as session:
+            if (await session.execute(select(ClientRequest.id).where(*window).limit(1))).first():
+                sys.exit(f"barber {barber_id} already has requests on {DAY:%Y-%m-%d}; clean up first")
+
+        gate = asyncio.Event()
+        tasks = [asyncio.create_task(_attempt(barber_id, i, gate)) for i in range(n)]
+        await asyncio.sleep(0.2)
+        gate.set()
+        results = await asyncio.gather(*tasks)
+
+        booked = results.count("booked")
+        print(f"{n} concurrent attempts: {booked} booked, {results.count('conflict')} rejected by the constraint, "
+              f"{results.count('checked-busy')} rejected by the pre-check")
+        for r in sorted({r for r in results if r.startswith("error")}):
+            print(" ", r)
+        print("OK" if booked == 1 else "DOUBLE BOOKING" if booked > 1 else "nothing booked")
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(ClientRequest).where(*window))
+            await session.commit()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,76 @@
+"""
+Per-task overhead of the old Celery pattern (fresh loop per run, engine disposed
+at the end) vs the worker runtime (one loop thread, warm pool).
+
+    python -m benchmarks.celery_runtime           # loop overhead only, no services needed
+    python -m benchmarks.celery_runtime 200 --db  # plus one SELECT 1 per run (SQLALCHEMY_DATABASE_URI)
+
+Bot HTTP sessions are not exercised (no network here); with the runtime the
+TLS handshake to api.telegram.org is paid once per process instead of per run.
+"""
+import asyncio
+import statistics
+import sys
+from time import perf_counter
+
+from sqlalchemy import text
+
+from app.db import AsyncSessionLocal, async_engine
+from app.worker_runtime import runtime
+
+
+async def _task_body(use_db: bool) -> None:
+    if use_db:
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("SELECT 1"))
+    else:
+        await asyncio.sleep(0)
+
+
+def _old_style(use_db: bool) -> None:
+    async def _run():
+        await _task_body(use_db)
+        await async_engine.dispose()
+
+    asyncio.run(_run())
+
+
+def _new_style(use_db: bool) -> None:
+    runtime.run(_task_body(use_db))
+
+
+def _measure(fn, runs: int, use_db: bool) -> list:
+    out = []
+    for _ in range(runs):
+        started = perf_counter()
+        fn(use_db)
+        out.append((perf_counter() - started) * 1000)
+    return out
+
+
+def _report(name: str, samples: list) -> None:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"  {name:<28} mean {statistics.mean(samples):8.3f} ms   p50 {samples[len(samples) // 2]:8.3f} ms   "
+          f"p95 {p95:8.3f} ms")
+
+
+def main(argv) -> None:
+    use_db = "--db" in argv
+    args = [a for a in argv if not a.startswith("--")]
+    runs = int(args[0]) if args else 200
+
+    before = _measure(_old_style, runs, use_db)
+    runtime.start()
+    if use_db:
+        runtime.run(runtime.warm_up())
+    after = _measure(_new_style, runs, use_db)
+    runtime.shutdown()
+
+    print(f"{runs} runs per variant, {'SELECT 1 per run' if use_db else 'empty task body'}")
+    _report("asyncio.run + dispose", before)
+    _report("worker runtime", after)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
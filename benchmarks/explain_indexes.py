@@ -0,0 +1,227 @@
+"""
+EXPLAIN regression check for the hot-path indexes (migrations 0006, 0007).
+
+Builds the schema from the models in a throw-away `explain_check` schema of a
+local Postgres, seeds synthetic data at production-like ratios, ANALYZEs, then
+runs the real handler/task queries and EXPLAINs every SELECT they issue
+(selectin loads included) with the same parameters. Any sequential scan of a
+hot table fails the run (exit code 1); tests/test_explain_indexes.py runs the
+same check under pytest.
+
+    python -m benchmarks.explain_indexes            # 300 000 requests
+    python -m benchmarks.explain_indexes 1000000
+
+Uses SQLALCHEMY_DATABASE_URI like the bot; point it at a scratch database. The
+schema is dropped afterwards.
+"""
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+from datetime import date, datetime, time, timedelta
+from typing import Callable, List, NamedTuple, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import app.models  # noqa: F401  (configure mappers)
+from app.barber.barber_requests.utils import _build_requests_query, _count_requests, check_time_conflict
+from app.barber.barber_scores import _page_scores
+from app.barber.models import BarberSchedule
+from app.barber.schedule.availability import _build_day_availability
+from app.barber.schedule.day_summary import today_schedule_id
+from app.barber.schedule.schedule_utils import (
+    fetch_requests_for_day, fetch_requests_for_schedule, occupancy_for_range,
+)
+from app.client.barber_directory import _directory_page_sql
+from app.client.my_requests import load_my_requests_page
+from app.client.tasks import _due_reminders_query
+from app.db import Base, DATABASE_URL
+
+SCHEMA = "explain_check"
+HOT_TABLES = {
+    "client_requests", "client_requests_services", "barber_service_scores",
+    "barber_schedule", "barber_services", "users",
+}
+
+BARBERS = 2000
+CLIENTS = 18000
+CITIES = 50
+DAYS = 60  # schedules per barber, centred on today
+SERVICES_PER_BARBER = 5
+REQUESTS = 300_000
+
+# seeded rows, parents first; :n is the number of requests
+SEED = """
+INSERT INTO country (id, name_ru) VALUES (1, 'country');
+INSERT INTO region (id, name_ru, country_id) VALUES (1, 'region', 1);
+INSERT INTO city (id, name_ru, region_id) SELECT c, 'city ' || c, 1 FROM generate_series(1, {cities}) c;
+INSERT INTO users (id, name, telegram_id, user_type, lang, country_id, region_id, city_id)
+    SELECT u, 'user ' || u, 1000000 + u, CASE WHEN u <= {barbers} THEN 'barber' ELSE 'client' END,
+           'ru', 1, 1, u % {cities} + 1
+    FROM generate_series(1, {barbers} + {clients}) u;
+INSERT INTO barbers (id, user_id, score, start_time, end_time)
+    SELECT b, b, b % 5 + 1, '2000-01-01 09:00', '2000-01-01 21:00' FROM generate_series(1, {barbers}) b;
+INSERT INTO client (id, user_id) SELECT c, {barbers} + c FROM generate_series(1, {clients}) c;
+INSERT INTO services (id, name_uz, name_ru) SELECT s, 'xizmat ' || s, 'услуга ' || s
+    FROM generate_series(1, {per_barber}) s;
+INSERT INTO barber_services (id, barber_id, service_id, price, duration, is_active)
+    SELECT (b - 1) * {per_barber} + s, b, s, 50000, 30, true
+    FROM generate_series(1, {barbers}) b, generate_series(1, {per_barber}) s;
+INSERT INTO barber_schedule (id, day, barber_id, n_clients, total_income)
+    SELECT (b - 1) * {days} + d + 1, date_trunc('day', localtimestamp) + (d - {days} / 2) * interval '1 day', b, 0, 0
+    FROM generate_series(1, {barbers}) b, generate_series(0, {days} - 1) d;
+
+-- request i: barber i % B, day (i / B) % D, hour slot i / (B * D); no two active ones overlap
+INSERT INTO client_requests (id, client_id, barber_id, date, from_time, to_time, status,
+                             barber_schedule_id, reminder_sent_at)
+    SELECT i, i % {clients} + 1, b, day, day + (9 + k) * interval '1 hour',
+           day + (9 + k) * interval '1 hour' + interval '45 minutes',
+           CASE WHEN i % 10 < 6 THEN 'accept' WHEN i % 10 < 8 THEN 'pending' ELSE 'deny' END,
+           (b - 1) * {days} + d + 1,
+           CASE WHEN d < {days} / 2 THEN day END
+    FROM (
+        SELECT i, i % {barbers} + 1 AS b, (i / {barbers}) % {days} AS d, i / ({barbers} * {days}) AS k
+        FROM generate_series(0, {n} - 1) i
+    ) s, LATERAL (SELECT date_trunc('day', localtimestamp) + (s.d - {days} / 2) * interval '1 day' AS day) t;
+INSERT INTO client_requests_services (id, client_request_id, barber_service_id, duration, status)
+    SELECT r.id * 2 + j, r.id, (r.barber_id - 1) * {per_barber} + (r.id + j) % {per_barber} + 1, 30, true
+    FROM client_requests r, generate_series(0, 1) j;
+INSERT INTO barber_service_scores (id, barber_service_id, client_id, score, client_request_id, barber_id)
+    SELECT r.id, (r.barber_id - 1) * {per_barber} + 1, r.client_id, r.id % 5 + 1, r.id, r.barber_id
+    FROM client_requests r WHERE r.status = 'accept' AND r.id % 3 = 0;
+"""
+
+_captured: List[Tuple[str, tuple]] = []
+
+
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        _captured.append((statement, tuple(parameters or ())))
+
+
+def _probes(barber_id: int, client_id: int, city_id: int, today: date) -> List[Tuple[str, Callable]]:
+    async def requests_list(session, status):
+        q = await _build_requests_query(status, barber_id)
+        await _count_requests(session, q)
+        (await session.execute(q.limit(5))).scalars().all()
+
+    async def day_availability(session):
+        sched_id = await today_schedule_id(session, barber_id, today)
+        await _build_day_availability(session, await session.get(BarberSchedule, sched_id))
+
+    async def schedule_requests(session):
+        sched_id = await today_schedule_id(session, barber_id, today)
+        await fetch_requests_for_schedule(session, barber_id, sched_id)
+
+    async def reminders(session):
+        (await session.execute(_due_reminders_query(today, 0, 24 * 60))).scalars().all()
+
+    slot = datetime.combine(today, time(9, 30))
+    return [
+        ("barber requests: pending", lambda s: requests_list(s, "pending")),
+        ("barber requests: accepted", lambda s: requests_list(s, "accept")),
+        ("schedule: requests of a day", lambda s: fetch_requests_for_day(s, barber_id, today)),
+        ("schedule: requests of a schedule", schedule_requests),
+        ("schedule: week occupancy", lambda s: occupancy_for_range(s, barber_id, today, today + timedelta(days=6))),
+        ("schedule: day availability", day_availability),
+        ("booking: time conflict", lambda s: check_time_conflict(s, barber_id, slot, slot + timedelta(minutes=30))),
+        ("client: my requests", lambda s: load_my_requests_page(s, client_id, 1)),
+        ("barber: scores page", lambda s: _page_scores(s, barber_id, 1, 5)),
+        ("client: barbers of a city", lambda s: _directory_page_sql(s, city_id, 1, 10)),
+        ("task: due reminders", reminders),
+    ]
+
+
+def _seq_scans(plan: dict) -> List[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in HOT_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", ()):
+        found += _seq_scans(child)
+    return found
+
+
+def _indexes(plan: dict) -> List[str]:
+    names = [plan["Index Name"]] if "Index Name" in plan else []
+    for child in plan.get("Plans", ()):
+        names += _indexes(child)
+    return names
+
+
+class PlanCheck(NamedTuple):
+    probe: str
+    statement: str
+    seq_scans: List[str]  # hot tables scanned sequentially
+    indexes: List[str]
+
+
+@asynccontextmanager
+async def explain_schema(n: int):
+    """The `explain_check` schema, seeded with n requests and ANALYZEd; yields its engine, drops it on exit."""
+    engine = create_async_engine(
+        DATABASE_URL,
+        connect_args={"server_settings": {"search_path": f"{SCHEMA}, public"}},
+    )
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+            # checkfirst would see same-named tables of `public` through the search_path
+            await conn.run_sync(Base.metadata.create_all, checkfirst=False)
+            seed = SEED.format(n=n, barbers=BARBERS, clients=CLIENTS, cities=CITIES, days=DAYS,
+                               per_barber=SERVICES_PER_BARBER)
+            for stmt in filter(str.strip, seed.split(";")):
+                await conn.exec_driver_sql(stmt)
+        async with engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("ANALYZE")
+        yield engine
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+async def check_plans(engine) -> List[PlanCheck]:
+    """EXPLAIN every SELECT the probes issue against the seeded schema."""
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    checks = []
+    event.listen(engine.sync_engine, "before_cursor_execute", _capture)
+    try:
+        for name, probe in _probes(barber_id=BARBERS // 2, client_id=CLIENTS // 2, city_id=CITIES // 2,
+                                   today=datetime.now().date()):
+            _captured.clear()
+            async with session_factory() as session:
+                await probe(session)
+            statements = list(_captured)
+
+            async with engine.connect() as conn:
+                for statement, params in statements:
+                    raw = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", params)).scalar_one()
+                    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+                    checks.append(PlanCheck(name, statement, _seq_scans(plan), _indexes(plan)))
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _capture)
+    return checks
+
+
+async def _main(argv) -> None:
+    n = int(argv[0]) if argv else REQUESTS
+    async with explain_schema(n) as engine:
+        print(f"seeded {n} requests for {BARBERS} barbers / {CLIENTS} clients")
+        checks = await check_plans(engine)
+
+    for c in checks:
+        verdict = f"SEQ SCAN on {', '.join(sorted(set(c.seq_scans)))}" if c.seq_scans else "ok"
+        used = ", ".join(sorted(set(c.indexes))) or "-"
+        print(f"{verdict:<40} {c.probe}  [{used}]")
+    failures = sum(bool(c.seq_scans) for c in checks)
+    print("OK" if not failures else f"{failures} statement(s) scan a hot table sequentially")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
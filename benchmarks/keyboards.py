@@ -0,0 +1,84 @@
+"""
+Keyboard render time per update, with and without the keyboard cache.
+
+A synthetic refdata snapshot is installed, so no database is needed:
+
+    python -m benchmarks.keyboards                  # 14 regions x 12 cities
+    python -m benchmarks.keyboards 30 40 20000      # regions, cities per region, updates
+"""
+import asyncio
+import sys
+from time import monotonic, perf_counter
+from types import MappingProxyType
+
+from app.refdata import refdata, RefSnapshot, RegionRef, CityRef
+from app.keyboard_cache import keyboard_cache
+from app.client.keyboards import (
+    create_regions_keyboard, create_cities_keyboard, regions_keyboard, cities_keyboard,
+    barber_menu, location_keyboard,
+)
+from app.basic.keyboards import client_main_menu, barber_main_menu
+
+
+def _install_snapshot(n_regions: int, n_cities: int) -> RefSnapshot:
+    regions = tuple(RegionRef(i, f"Viloyat {i}", f"Область {i}", 1) for i in range(1, n_regions + 1))
+    by_region = {
+        r.id: tuple(
+            CityRef(r.id * 1000 + j, f"Shahar {r.id}-{j}", f"Город {r.id}-{j}", r.id)
+            for j in range(1, n_cities + 1)
+        )
+        for r in regions
+    }
+    snap = RefSnapshot(version=0, generation=1, services=(), regions=regions,
+                       cities_by_region=MappingProxyType(by_region))
+    refdata._snapshot = snap
+    refdata._checked_at = monotonic() + 10 ** 9
+    return snap
+
+
+def _render_uncached(snap: RefSnapshot, i: int) -> None:
+    lang = "ru" if i % 2 else "uz"
+    region_id = snap.regions[i % len(snap.regions)].id
+    create_regions_keyboard(snap.regions, lang)
+    create_cities_keyboard(snap.cities_by_region[region_id], lang)
+    client_main_menu.__wrapped__(lang)
+    barber_main_menu.__wrapped__(lang)
+    barber_menu.__wrapped__(lang)
+    location_keyboard.__wrapped__(lang)
+
+
+async def _render_cached(snap: RefSnapshot, i: int) -> None:
+    lang = "ru" if i % 2 else "uz"
+    region_id = snap.regions[i % len(snap.regions)].id
+    await regions_keyboard(lang)
+    await cities_keyboard(region_id, lang)
+    client_main_menu(lang)
+    barber_main_menu(lang)
+    barber_menu(lang)
+    location_keyboard(lang)
+
+
+async def _main(n_regions: int, n_cities: int, updates: int) -> None:
+    snap = _install_snapshot(n_regions, n_cities)
+
+    started = perf_counter()
+    for i in range(updates):
+        _render_uncached(snap, i)
+    before = (perf_counter() - started) / updates
+
+    keyboard_cache.clear()
+    started = perf_counter()
+    for i in range(updates):
+        await _render_cached(snap, i)
+    after = (perf_counter() - started) / updates
+
+    print(f"{n_regions} regions x {n_cities} cities, {updates} updates, 6 keyboards per update")
+    print(f"  uncached: {before * 1e6:8.1f} us/update")
+    print(f"  cached:   {after * 1e6:8.1f} us/update  ({before / after:.1f}x)")
+    print(f"  cache stats: {keyboard_cache.stats}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    n_regions, n_cities, updates = (args + [14, 12, 5000][len(args):])[:3]
+    asyncio.run(_main(n_regions, n_cities, updates))
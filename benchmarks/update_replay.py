@@ -0,0 +1,510 @@
+"""
+End-to-end update replay: synthetic Telegram updates through the real Dispatcher.
+
+The Dispatcher is the one run.py builds (identity middleware + every router).
+Bot API calls go to a recording session that answers locally, so what is
+measured is the bot itself: handlers, Postgres, Redis. Flows, mixed and run
+concurrently:
+
+    client   ✂️ Barberlar → select_barber → 🗓️ Sartarosh jadvali → barber_day →
+             slot → two service toggles → confirm → 📋 So‘rovlarim
+    barber   📅 Jadvalim → day → request list → open → accept →
+             📨 So‘rovlar → accepted tab → pending page
+
+Reported per handler: p50 / p95 / p99 latency, SQL statements and Bot API
+calls per update; plus overall updates per second. With --budgets each
+handler's costliest update is checked against its @query_budget and listed
+with its repeated statement shapes (N+1 loops).
+
+    python -m benchmarks.update_replay                                # 200 flows, 20 at a time
+    python -m benchmarks.update_replay --flows 2000 --concurrency 100 --clients 200
+    python -m benchmarks.update_replay --fakeredis                    # no Redis server (needs fakeredis)
+    python -m benchmarks.update_replay --max-p95 150 --max-queries 15 # CI: exit 1 when exceeded
+    python -m benchmarks.update_replay --budgets                      # CI: exit 1 over a @query_budget
+
+Needs SQLALCHEMY_DATABASE_URI (migrated, scratch database) and, without
+--fakeredis, the bot's Redis (REDIS_HOST / REDIS_PORT / REDIS_DB_APP). Fixture
+users, barbers, services and everything the flows create are deleted at the
+end; telegram ids 7 700 000 000+ are reserved for them.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+from typing import Dict, List, Optional, get_args
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message, Update, User as TgUser
+from sqlalchemy import delete, event, func, select
+
+# an unplanned lazy load fails the replay (app/db.py); must be set before the models are imported
+os.environ.setdefault("DB_STRICT_LOADING", "1")
+
+import app.models  # noqa: E402,F401  (configure mappers)
+from app.barber.models import Barber, BarberSchedule, BarberScheduleDetail, BarberService, BarberServiceScore, \
+    BarberWorkingDays
+from app.barber.schedule.availability import invalidate_availability
+from app.barber.schedule.day_summary import SummaryRef, invalidate_day_summaries
+from app.barber.schedule.callback_data import DayBySidCB, ReqOpenCB, ReqStatusCB, SchedListCB
+from app.barber.schedule.schedule_utils import RU_NAMES, UZ_NAMES
+from app.client.callback_data import SchedPickSlotCBClient
+from app.client.models import Client, ClientBarbers, ClientRequest, ClientRequestService
+from app.db import AsyncSessionLocal, async_engine
+from app.notifier import NotificationDispatcher
+from app.outbox.models import SyncOutbox
+from app.query_budget import BudgetReport, QueryBudgetMiddleware, watch
+from app.refdata import refdata
+from app.region.models import City, Country, Region
+from app.service.models import Service
+from app.user.models import User
+from run import build_dispatcher
+
+TG_BASE = 7_700_000_000
+BOT_USER = TgUser(id=TG_BASE - 1, is_bot=True, first_name="replay", username="replay_bot")
+SLOTS_PER_DAY = 11  # 09:00 .. 19:00, one hour each (two 30-minute services)
+BOOKING_DAYS = 6  # tomorrow .. +6
+
+
+# ---------- measurement ----------
+
+@dataclass
+class _Sample:
+    label: str
+    handler: Optional[str] = None
+    queries: int = 0
+    api: Counter = field(default_factory=Counter)
+
+
+_current: ContextVar[Optional[_Sample]] = ContextVar("replay_sample", default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    sample = _current.get()
+    if sample is not None:
+        sample.queries += 1
+
+
+class _HandlerName(BaseMiddleware):
+    """Inner middleware: tags the current sample with the handler that took the update."""
+
+    async def __call__(self, handler, event, data):
+        sample = _current.get()
+        if sample is not None and data.get("handler") is not None:
+            callback = data["handler"].callback
+            sample.handler = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+        return await handler(event, data)
+
+
+class RecordingSession(BaseSession):
+    """Bot API session that records every call and answers it locally."""
+
+    def __init__(self):
+        super().__init__()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        sample = _current.get()
+        if sample is not None:
+            sample.api[type(method).__name__] += 1
+
+        returning = method.__returning__
+        if returning is bool:
+            return True
+        if returning is TgUser:
+            return BOT_USER
+        if returning is Message or Message in get_args(returning):
+            chat_id = getattr(method, "chat_id", None)
+            return Message.model_validate(
+                {
+                    "message_id": next(self._message_ids),
+                    "date": datetime.now(),
+                    "chat": {"id": chat_id if isinstance(chat_id, int) else 0, "type": "private"},
+                    "from": BOT_USER.model_dump(),
+                    "text": getattr(method, "text", None),
+                },
+                context={"bot": bot},
+            )
+        return None
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        raise NotImplementedError("no downloads in the replay")
+        yield b""  # pragma: no cover
+
+    async def close(self):
+        pass
+
+
+@dataclass
+class Replay:
+    bot: Bot
+    dp: object
+    samples: List[_Sample] = field(default_factory=list)
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    costliest: Dict[str, BudgetReport] = field(default_factory=dict)  # handler -> its most expensive update
+    _update_ids: itertools.count = field(default_factory=lambda: itertools.count(1))
+
+    async def _feed(self, label: str, payload: dict) -> None:
+        update = Update.model_validate({"update_id": next(self._update_ids), **payload}, context={"bot": self.bot})
+        sample = _Sample(label)
+        token = _current.set(sample)
+        started = perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        finally:
+            elapsed = (perf_counter() - started) * 1000
+            _current.reset(token)
+        key = sample.handler or f"(unhandled) {label}"
+        self.latencies[key].append(elapsed)
+        sample.handler = key
+        self.samples.append(sample)
+
+    def keep_report(self, report: BudgetReport) -> None:
+        worst = self.costliest.get(report.handler)
+        if worst is None or len(report.statements) > len(worst.statements):
+            self.costliest[report.handler] = report
+
+    @staticmethod
+    def _user(tg_id: int) -> dict:
+        return {"id": tg_id, "is_bot": False, "first_name": f"replay {tg_id - TG_BASE}", "language_code": "uz"}
+
+    def _message(self, tg_id: int, text: Optional[str], from_bot: bool = False) -> dict:
+        return {
+            "message_id": next(self._update_ids),
+            "date": int(datetime.now().timestamp()),
+            "chat": {"id": tg_id, "type": "private"},
+            "from": BOT_USER.model_dump() if from_bot else self._user(tg_id),
+            "text": text,
+        }
+
+    async def send(self, tg_id: int, text: str) -> None:
+        await self._feed(text, {"message": self._message(tg_id, text)})
+
+    async def press(self, tg_id: int, data: str) -> None:
+        await self._feed(data.split(":", 1)[0].split("|", 1)[0], {"callback_query": {
+            "id": str(next(self._update_ids)),
+            "from": self._user(tg_id),
+            "chat_instance": str(tg_id),
+            "data": data,
+            "message": self._message(tg_id, "…", from_bot=True),
+        }})
+
+
+# ---------- fixture ----------
+
+@dataclass
+class Fixture:
+    country_id: int
+    region_id: int
+    city_id: int
+    service_ids: List[int]
+    user_ids: List[int]
+    barbers: List[dict]  # tg, id, services: [barber_service_id], schedules: {date: sched_id}
+    clients: List[dict]  # tg, id
+    outbox_floor: int
+
+
+async def _seed(n_barbers: int, n_clients: int) -> Fixture:
+    today = date.today()
+    async with AsyncSessionLocal() as session:
+        taken = (await session.execute(
+            select(User.id).where(User.telegram_id.between(TG_BASE, TG_BASE + 999_999)).limit(1)
+        )).first()
+        if taken:
+            sys.exit("replay fixture users already exist (telegram ids 7 700 000 000+); clean up first")
+        outbox_floor = (await session.execute(select(func.coalesce(func.max(SyncOutbox.id), 0)))).scalar_one()
+
+        country = Country(name_uz="Replay", name_ru="Replay", name_en="Replay")
+        session.add(country)
+        await session.flush()
+        region = Region(name_uz="Replay", name_ru="Replay", name_en="Replay", country_id=country.id)
+        session.add(region)
+        await session.flush()
+        city = City(name_uz="Replay", name_ru="Replay", name_en="Replay", region_id=region.id)
+        session.add(city)
+        services = [Service(name_uz=f"Replay {i}", name_ru=f"Replay {i}", name_en=f"Replay {i}") for i in range(3)]
+        session.add_all(services)
+        await session.flush()
+
+        def new_user(i: int, user_type: str) -> User:
+            return User(
+                name=f"{user_type} {i}", surname="Replay", telegram_id=TG_BASE + len(users), user_type=user_type,
+                platform_login=f"replay_{user_type}_{i}", lang="uz",
+                country_id=country.id, region_id=region.id, city_id=city.id,
+            )
+
+        users: List[User] = []
+        barbers, clients = [], []
+        for i in range(n_barbers):
+            user = new_user(i, "barber")
+            users.append(user)
+            session.add(user)
+            await session.flush()
+            barber = Barber(
+                user_id=user.id, login=user.platform_login, score=5,
+                start_time=datetime.combine(today, time(9, 0)), end_time=datetime.combine(today, time(21, 0)),
+            )
+            session.add(barber)
+            await session.flush()
+            session.add_all(
+                BarberWorkingDays(barber_id=barber.id, name_uz=UZ_NAMES[d], name_ru=RU_NAMES[d], is_working=True)
+                for d in range(7)
+            )
+            bss = [BarberService(barber_id=barber.id, service_id=s.id, price=50_000, duration=30, is_active=True)
+                   for s in services]
+            days = [today + timedelta(days=d) for d in range(BOOKING_DAYS + 1)]
+            scheds = [BarberSchedule(barber_id=barber.id, day=datetime.combine(d, time.min), n_clients=0,
+                                     total_income=0, name_uz=UZ_NAMES[d.weekday()], name_ru=RU_NAMES[d.weekday()])
+                      for d in days]
+            session.add_all(bss + scheds)
+            await session.flush()
+            barbers.append({
+                "tg": user.telegram_id, "id": barber.id, "services": [bs.id for bs in bss],
+                "schedules": {d: s.id for d, s in zip(days, scheds)}, "slots": itertools.count(),
+                "lock": asyncio.Lock(),
+            })
+        for i in range(n_clients):
+            user = new_user(i, "client")
+            users.append(user)
+            session.add(user)
+            await session.flush()
+            client = Client(user_id=user.id)
+            session.add(client)
+            await session.flush()
+            clients.append({"tg": user.telegram_id, "id": client.id, "lock": asyncio.Lock()})
+        await session.commit()
+
+    return Fixture(country.id, region.id, city.id, [s.id for s in services], [u.id for u in users],
+                   barbers, clients, outbox_floor)
+
+
+async def _cleanup(fx: Fixture, redis) -> None:
+    barber_ids = [b["id"] for b in fx.barbers]
+    client_ids = [c["id"] for c in fx.clients]
+    sched_ids = [sid for b in fx.barbers for sid in b["schedules"].values()]
+    async with AsyncSessionLocal() as session:
+        request_ids = select(ClientRequest.id).where(
+            (ClientRequest.barber_id.in_(barber_ids)) | (ClientRequest.client_id.in_(client_ids))
+        )
+        await session.execute(delete(ClientRequestService).where(ClientRequestService.client_request_id.in_(request_ids)))
+        await session.execute(delete(BarberServiceScore).where(BarberServiceScore.client_request_id.in_(request_ids)))
+        await session.execute(delete(BarberScheduleDetail).where(BarberScheduleDetail.barber_schedule_id.in_(sched_ids)))
+        await session.execute(delete(ClientRequest).where(ClientRequest.id.in_(request_ids)))
+        await session.execute(delete(ClientBarbers).where(
+            (ClientBarbers.barber_id.in_(barber_ids)) | (ClientBarbers.client_id.in_(client_ids))
+        ))
+        await session.execute(delete(BarberSchedule).where(BarberSchedule.barber_id.in_(barber_ids)))
+        await session.execute(delete(BarberService).where(BarberService.barber_id.in_(barber_ids)))
+        await session.execute(delete(BarberWorkingDays).where(BarberWorkingDays.barber_id.in_(barber_ids)))
+        await session.execute(delete(Barber).where(Barber.id.in_(barber_ids)))
+        await session.execute(delete(Client).where(Client.id.in_(client_ids)))
+        await session.execute(delete(User).where(User.id.in_(fx.user_ids)))
+        await session.execute(delete(Service).where(Service.id.in_(fx.service_ids)))
+        await session.execute(delete(City).where(City.id == fx.city_id))
+        await session.execute(delete(Region).where(Region.id == fx.region_id))
+        await session.execute(delete(Country).where(Country.id == fx.country_id))
+        await session.execute(delete(SyncOutbox).where(SyncOutbox.id > fx.outbox_floor))
+        await session.commit()
+
+    await invalidate_availability(redis, *sched_ids)
+    await invalidate_day_summaries(redis, *(
+        SummaryRef(b["id"], sid, day) for b in fx.barbers for day, sid in b["schedules"].items()
+    ))
+    patterns = [f"dir:city:{fx.city_id}*"] + [
+        p for who in (*fx.barbers, *fx.clients) for p in (f"identity:{who['tg']}", f"session:{who['tg']}")
+    ]
+    for pattern in patterns:
+        keys = [k async for k in redis.scan_iter(match=pattern)]
+        if keys:
+            await redis.delete(*keys)
+
+
+# ---------- flows ----------
+
+async def _client_flow(replay: Replay, fx: Fixture, client: dict, barber: dict) -> None:
+    idx = next(barber["slots"])  # past the last hour of the last day it wraps: the "busy" path
+    day = date.today() + timedelta(days=1 + (idx // SLOTS_PER_DAY) % BOOKING_DAYS)
+    hm = f"{9 + idx % SLOTS_PER_DAY:02d}00"
+    tg = client["tg"]
+    async with client["lock"]:  # one flow per chat at a time, like a real user
+        await replay.send(tg, "✂️ Barberlar")
+        await replay.press(tg, f"select_barber:{barber['id']}")
+        await replay.send(tg, "🗓️ Sartarosh jadvali")
+        await replay.press(tg, f"barber_day:{barber['schedules'][day]}")
+        await replay.press(tg, SchedPickSlotCBClient(day=day.isoformat(), hm=hm).pack())
+        for bs_id in barber["services"][:2]:
+            await replay.press(tg, f"choose_service_client:{bs_id}")
+        await replay.press(tg, "confirm_services")
+        await replay.send(tg, "📋 So‘rovlarim")
+
+
+async def _barber_flow(replay: Replay, fx: Fixture, barber: dict) -> None:
+    tg = barber["tg"]
+    async with barber["lock"]:
+        async with AsyncSessionLocal() as session:
+            pending = (await session.execute(
+                select(ClientRequest.id, ClientRequest.barber_schedule_id)
+                .where(ClientRequest.barber_id == barber["id"], ClientRequest.status == "pending")
+                .order_by(ClientRequest.id.desc())
+                .limit(1)
+            )).first()
+        sid = pending.barber_schedule_id if pending else barber["schedules"][date.today() + timedelta(days=1)]
+
+        await replay.send(tg, "📅 Jadvalim")
+        await replay.press(tg, DayBySidCB(sid=sid).pack())
+        await replay.press(tg, SchedListCB(sid=sid, page=1).pack())
+        if pending:
+            await replay.press(tg, ReqOpenCB(req_id=pending.id, sid=sid, page=1).pack())
+            await replay.press(tg, ReqStatusCB(req_id=pending.id, sid=sid, action="accept", page=1).pack())
+        await replay.send(tg, "📨 So‘rovlar")
+        await replay.press(tg, "reqflt:accept:1")
+        await replay.press(tg, "reqpage:pending:1")
+
+
+# ---------- report ----------
+
+def _pct(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def _report(replay: Replay, wall: float, args) -> List[str]:
+    by_handler: Dict[str, List[_Sample]] = defaultdict(list)
+    for s in replay.samples:
+        by_handler[s.handler].append(s)
+
+    print(f"\n{'handler':<48} {'n':>5} {'p50':>7} {'p95':>7} {'p99':>7} {'sql/upd':>8} {'api/upd':>8}")
+    breaches = []
+    for name in sorted(by_handler, key=lambda h: -_pct(replay.latencies[h], 95)):
+        lat, samples = replay.latencies[name], by_handler[name]
+        queries = sum(s.queries for s in samples) / len(samples)
+        api = sum(sum(s.api.values()) for s in samples) / len(samples)
+        print(f"{name[:48]:<48} {len(lat):>5} {_pct(lat, 50):>7.1f} {_pct(lat, 95):>7.1f} {_pct(lat, 99):>7.1f} "
+              f"{queries:>8.1f} {api:>8.1f}")
+        if args.max_queries is not None and queries > args.max_queries:
+            breaches.append(f"{name}: {queries:.1f} SQL statements per update > {args.max_queries}")
+
+    everything = [ms for lat in replay.latencies.values() for ms in lat]
+    api_total = sum((s.api for s in replay.samples), Counter())
+    print(f"\n{len(everything)} updates in {wall:.2f}s = {len(everything) / wall:.0f} updates/s, "
+          f"p50 {_pct(everything, 50):.1f} ms, p95 {_pct(everything, 95):.1f} ms, p99 {_pct(everything, 99):.1f} ms")
+    print("Bot API calls: " + ", ".join(f"{k} {v}" for k, v in api_total.most_common()))
+
+    for limit, p in ((args.max_p95, 95), (args.max_p99, 99)):
+        if limit is not None and _pct(everything, p) > limit:
+            breaches.append(f"overall p{p} {_pct(everything, p):.1f} ms > {limit} ms")
+    if args.min_rate is not None and len(everything) / wall < args.min_rate:
+        breaches.append(f"{len(everything) / wall:.0f} updates/s < {args.min_rate}")
+    if args.budgets:
+        print("\ncostliest update per handler:")
+        for report in sorted(replay.costliest.values(), key=lambda r: -len(r.statements)):
+            print(report)
+            if report.exceeded:
+                breaches.append(f"{report.handler}: {len(report.statements)} SQL statements > "
+                                f"@query_budget({report.budget})")
+    unhandled = [h for h in by_handler if h.startswith("(unhandled)")]
+    if unhandled:
+        breaches.append("updates no handler took: " + ", ".join(unhandled))
+    return breaches
+
+
+# ---------- main ----------
+
+def _redis(use_fake: bool):
+    if use_fake:
+        try:
+            from fakeredis import FakeAsyncRedis
+        except ImportError:
+            sys.exit("--fakeredis needs the fakeredis package")
+        return FakeAsyncRedis(decode_responses=True)
+    import redis.asyncio as aioredis
+    return aioredis.from_url(
+        f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', '6379')}/"
+        f"{os.getenv('REDIS_DB_APP', '4')}",
+        decode_responses=True,
+    )
+
+
+def _parse(argv) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.update_replay", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--flows", type=int, default=200, help="client + barber flows to run")
+    ap.add_argument("--concurrency", type=int, default=20, help="flows in flight at once")
+    ap.add_argument("--clients", type=int, default=40)
+    ap.add_argument("--barbers", type=int, default=5)
+    ap.add_argument("--barber-share", type=float, default=0.25, help="fraction of flows that are barber flows")
+    ap.add_argument("--fakeredis", action="store_true", help="in-process Redis instead of REDIS_HOST")
+    ap.add_argument("--max-p95", type=float, help="fail when overall p95 latency (ms) is above")
+    ap.add_argument("--max-p99", type=float, help="fail when overall p99 latency (ms) is above")
+    ap.add_argument("--max-queries", type=float, help="fail when any handler averages more SQL statements per update")
+    ap.add_argument("--min-rate", type=float, help="fail when throughput (updates/s) is below")
+    ap.add_argument("--budgets", action="store_true", help="fail when a handler exceeds its @query_budget")
+    return ap.parse_args(argv)
+
+
+def build_replay(redis, budgets: bool = False) -> Replay:
+    """The run.py Dispatcher behind a recording Bot; with `budgets` every update's BudgetReport is kept."""
+    bot = Bot(token="42:replay", session=RecordingSession())
+    bot.redis = redis
+    # no pacing: measure the handlers, not Telegram's rate limits
+    bot.notifier = NotificationDispatcher(bot, rate_per_sec=0, chat_interval=0)
+    dp = build_dispatcher(MemoryStorage())
+    replay = Replay(bot, dp)
+    tag = _HandlerName()
+    budget_check = QueryBudgetMiddleware(on_report=replay.keep_report)
+    for r in dp.chain_tail:
+        for observer in (r.message, r.callback_query):
+            observer.middleware(tag)
+            if budgets:
+                observer.middleware(budget_check)
+    if budgets:
+        watch(async_engine)
+    return replay
+
+
+async def _main(argv) -> int:
+    args = _parse(argv)
+    redis = _redis(args.fakeredis)
+    replay = build_replay(redis, budgets=args.budgets)
+    bot = replay.bot
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _count_query)
+    fx = await _seed(args.barbers, args.clients)
+    try:
+        await refdata.start(redis)
+        every = max(1, round(1 / args.barber_share)) if args.barber_share > 0 else 0
+        gate = asyncio.Semaphore(args.concurrency)
+
+        async def run_flow(i: int) -> None:
+            async with gate:
+                barber = fx.barbers[i % len(fx.barbers)]
+                if every and i % every == every - 1:
+                    await _barber_flow(replay, fx, barber)
+                else:
+                    await _client_flow(replay, fx, fx.clients[i % len(fx.clients)], barber)
+
+        started = perf_counter()
+        await asyncio.gather(*(run_flow(i) for i in range(args.flows)))
+        wall = perf_counter() - started
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", _count_query)
+        if refdata._listener is not None:
+            refdata._listener.cancel()
+        await _cleanup(fx, redis)
+        await bot.session.close()
+        await async_engine.dispose()
+
+    breaches = _report(replay, wall, args)
+    for b in breaches:
+        print("FAIL", b)
+    return 1 if breaches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,50 @@
+"""barber_schedule: one row per (barber_id, day)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Needed by the set-based schedule generator (INSERT … ON CONFLICT DO NOTHING).
+Existing duplicates are folded into the lowest id first: requests and detail
+rows are re-pointed, then the extra schedule rows are deleted.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_DUPES = """
+    SELECT id, min(id) OVER (PARTITION BY barber_id, day) AS keep_id
+    FROM barber_schedule
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(f"""
+        UPDATE client_requests cr SET barber_schedule_id = d.keep_id
+        FROM ({_DUPES}) d
+        WHERE cr.barber_schedule_id = d.id AND d.id <> d.keep_id
+    """)
+    op.execute(f"""
+        UPDATE barber_schedule_details sd SET barber_schedule_id = d.keep_id
+        FROM ({_DUPES}) d
+        WHERE sd.barber_schedule_id = d.id AND d.id <> d.keep_id
+    """)
+    op.execute(f"""
+        DELETE FROM barber_schedule bs
+        USING ({_DUPES}) d
+        WHERE bs.id = d.id AND d.id <> d.keep_id
+    """)
+    op.create_unique_constraint("uq_barber_schedule_barber_day", "barber_schedule", ["barber_id", "day"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("uq_barber_schedule_barber_day", "barber_schedule", type_="unique")
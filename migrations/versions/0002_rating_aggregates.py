@@ -0,0 +1,60 @@
+"""rating aggregates on barbers / barber_services
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+score_sum / score_count are maintained by app/barber/ratings.py on every rating
+write; this adds the columns and backfills them from barber_service_scores
+(same as `python -m app.barber.ratings`).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ("barbers", "barber_services"):
+        op.add_column(table, sa.Column("score_sum", sa.BigInteger(), server_default="0", nullable=False))
+        op.add_column(table, sa.Column("score_count", sa.Integer(), server_default="0", nullable=False))
+
+    op.execute("""
+        UPDATE barbers b
+        SET score_sum = agg.s,
+            score_count = agg.n,
+            score = CASE WHEN agg.n > 0 THEN round(agg.s::numeric / agg.n) END
+        FROM (
+            SELECT barber_id, coalesce(sum(score), 0) AS s, count(score) AS n
+            FROM barber_service_scores
+            WHERE barber_id IS NOT NULL
+            GROUP BY barber_id
+        ) agg
+        WHERE agg.barber_id = b.id
+    """)
+    op.execute("""
+        UPDATE barber_services bs
+        SET score_sum = agg.s,
+            score_count = agg.n
+        FROM (
+            SELECT barber_service_id, coalesce(sum(score), 0) AS s, count(score) AS n
+            FROM barber_service_scores
+            GROUP BY barber_service_id
+        ) agg
+        WHERE agg.barber_service_id = bs.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ("barber_services", "barbers"):
+        op.drop_column(table, "score_count")
+        op.drop_column(table, "score_sum")
@@ -0,0 +1,61 @@
+"""services.platform_id unique, service_images source/validator columns
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+Needed by the bulk service sync (INSERT … ON CONFLICT (platform_id) and
+ON CONFLICT (service_id, source_url)). Duplicate services per platform_id are
+folded into the lowest id first: barber services and images are re-pointed,
+then the extra service rows are deleted. Existing image rows have no
+source_url and are replaced by the next sync.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_DUPES = """
+    SELECT id, min(id) OVER (PARTITION BY platform_id) AS keep_id
+    FROM services
+    WHERE platform_id IS NOT NULL
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ("barber_services", "service_images"):
+        op.execute(f"""
+            UPDATE {table} t SET service_id = d.keep_id
+            FROM ({_DUPES}) d
+            WHERE t.service_id = d.id AND d.id <> d.keep_id
+        """)
+    op.execute(f"""
+        DELETE FROM services s
+        USING ({_DUPES}) d
+        WHERE s.id = d.id AND d.id <> d.keep_id
+    """)
+    op.create_unique_constraint("uq_services_platform_id", "services", ["platform_id"])
+
+    op.add_column("service_images", sa.Column("source_url", sa.String(500), nullable=True))
+    op.add_column("service_images", sa.Column("etag", sa.String(255), nullable=True))
+    op.add_column("service_images", sa.Column("last_modified", sa.String(64), nullable=True))
+    op.add_column("service_images", sa.Column("content_hash", sa.String(64), nullable=True))
+    op.create_unique_constraint(
+        "uq_service_images_service_source", "service_images", ["service_id", "source_url"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("uq_service_images_service_source", "service_images", type_="unique")
+    for column in ("content_hash", "last_modified", "etag", "source_url"):
+        op.drop_column("service_images", column)
+    op.drop_constraint("uq_services_platform_id", "services", type_="unique")
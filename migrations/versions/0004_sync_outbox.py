@@ -0,0 +1,43 @@
+"""sync_outbox table
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+Platform sync events written in the handler's transaction and drained by
+app/outbox/sync.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "sync_outbox",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("kind", sa.String(20), nullable=False),
+        sa.Column("entity_key", sa.String(255), nullable=False),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("available_at", sa.DateTime(), nullable=False),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("last_error", sa.String(500), nullable=True),
+    )
+    op.create_index("ix_sync_outbox_available_at", "sync_outbox", ["available_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_sync_outbox_available_at", table_name="sync_outbox")
+    op.drop_table("sync_outbox")
@@ -0,0 +1,88 @@
+"""client_requests.slot tsrange + per-barber no-overlap exclusion constraint
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+Bookings of one barber may not overlap while they are pending or accepted.
+The check moves into Postgres: a stored generated tsrange column and a GiST
+exclusion constraint (barber_id =, slot &&), so concurrent bookings cannot
+both commit and overlap lookups are index-backed.
+
+Existing overlaps are resolved first, greedily per barber: accepted requests
+win over pending ones, then the older (lower id) one; the losers are set to
+"deny". Run `python -m app.barber.schedule.totals` afterwards if accepted
+requests were denied.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SLOT_EXPR = "CASE WHEN from_time < to_time THEN tsrange(from_time, to_time, '[)') END"
+ACTIVE = "status IN ('pending', 'accept')"
+
+# (status rank, id): smaller wins
+_RANK = "(CASE WHEN {t}.status = 'accept' THEN 0 ELSE 1 END, {t}.id)"
+_OVERLAPS = f"""
+    o.barber_id = r.barber_id AND o.id <> r.id AND o.{ACTIVE}
+    AND o.from_time < r.to_time AND r.from_time < o.to_time
+    AND o.from_time < o.to_time
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    # winners: active rows with no better-ranked overlapping active row; deny whatever
+    # overlaps a winner and repeat until nothing overlaps
+    op.execute(f"""
+        DO $$
+        BEGIN
+            LOOP
+                WITH winners AS (
+                    SELECT r.id, r.barber_id, r.from_time, r.to_time
+                    FROM client_requests r
+                    WHERE r.{ACTIVE} AND r.from_time < r.to_time
+                      AND NOT EXISTS (
+                          SELECT 1 FROM client_requests o
+                          WHERE {_OVERLAPS} AND {_RANK.format(t="o")} < {_RANK.format(t="r")}
+                      )
+                )
+                UPDATE client_requests l SET status = 'deny'
+                FROM winners w
+                WHERE l.barber_id = w.barber_id AND l.id <> w.id AND l.{ACTIVE}
+                  AND l.from_time < w.to_time AND w.from_time < l.to_time
+                  AND l.from_time < l.to_time;
+                EXIT WHEN NOT FOUND;
+            END LOOP;
+        END $$
+    """)
+
+    op.add_column(
+        "client_requests",
+        sa.Column("slot", postgresql.TSRANGE(), sa.Computed(SLOT_EXPR, persisted=True), nullable=True),
+    )
+    op.create_exclude_constraint(
+        "ex_client_requests_barber_slot",
+        "client_requests",
+        ("barber_id", "="),
+        ("slot", "&&"),
+        using="gist",
+        where=sa.text(ACTIVE),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("ex_client_requests_barber_slot", "client_requests")
+    op.drop_column("client_requests", "slot")
@@ -0,0 +1,62 @@
+"""hot-path indexes
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+Indexes for the filters the handlers run on every update: requests by
+barber/status/time, by schedule, a client's pending requests, a barber's
+accepted requests of a day, due reminders, service lines and scores of a
+request, a barber's services and scores, users by city. BarberSchedule
+(barber_id, day) is already served by uq_barber_schedule_barber_day (0001).
+
+Built CONCURRENTLY outside the migration transaction so writes keep going;
+IF NOT EXISTS makes a re-run after an interrupted build safe (drop an INVALID
+leftover first). benchmarks/explain_indexes.py checks the plans.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name, table, columns, partial predicate
+INDEXES = (
+    ("ix_client_requests_barber_status_from", "client_requests", ["barber_id", "status", "from_time"], None),
+    ("ix_client_requests_sched_status", "client_requests", ["barber_schedule_id", "status"], None),
+    ("ix_client_requests_client_pending", "client_requests", ["client_id", "date"], "status = 'pending'"),
+    ("ix_client_requests_barber_day_accept", "client_requests",
+     ["barber_id", sa.text("CAST(from_time AS DATE)")], "status = 'accept'"),
+    ("ix_client_requests_reminder_due", "client_requests",
+     [sa.text("CAST(date AS DATE)"), "from_time"], "status = 'accept' AND reminder_sent_at IS NULL"),
+    ("ix_client_requests_services_request", "client_requests_services", ["client_request_id"], None),
+    ("ix_barber_services_barber", "barber_services", ["barber_id"], None),
+    ("ix_barber_service_scores_barber", "barber_service_scores", ["barber_id", "id"], "score IS NOT NULL"),
+    ("ix_barber_service_scores_request", "barber_service_scores", ["client_request_id"], None),
+    ("ix_users_city_id", "users", ["city_id"], None),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
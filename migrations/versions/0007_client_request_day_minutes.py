@@ -0,0 +1,80 @@
+"""client_requests.day / from_minute / to_minute stored columns
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+Day and time-of-day filters used to cast the timestamps (CAST(from_time AS
+DATE), CAST(from_time AS TIME)), which no plain b-tree can serve. Postgres now
+stores the request's day and the minute of day of from_time / to_time as
+generated columns, and the helpers compare them with plain range predicates:
+
+    (barber_id, status, day, from_minute)   a barber's requests of a day / window
+    (day, from_minute) WHERE due            reminders
+
+These replace the expression indexes of 0006 that served the same filters.
+Adding stored generated columns rewrites client_requests under an exclusive
+lock; the indexes are then built CONCURRENTLY.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DAY_EXPR = "CAST(COALESCE(from_time, date) AS DATE)"
+MINUTE_EXPR = "CAST(EXTRACT(HOUR FROM {c}) * 60 + EXTRACT(MINUTE FROM {c}) AS INTEGER)"
+REMINDER_DUE = "status = 'accept' AND reminder_sent_at IS NULL"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("client_requests", sa.Column("day", sa.Date(), sa.Computed(DAY_EXPR, persisted=True)))
+    op.add_column("client_requests", sa.Column(
+        "from_minute", sa.Integer(), sa.Computed(MINUTE_EXPR.format(c="from_time"), persisted=True)))
+    op.add_column("client_requests", sa.Column(
+        "to_minute", sa.Integer(), sa.Computed(MINUTE_EXPR.format(c="to_time"), persisted=True)))
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_client_requests_barber_status_day", "client_requests",
+            ["barber_id", "status", "day", "from_minute"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.drop_index("ix_client_requests_barber_day_accept", table_name="client_requests",
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_client_requests_reminder_due", table_name="client_requests",
+                      postgresql_concurrently=True, if_exists=True)
+        op.create_index(
+            "ix_client_requests_reminder_due", "client_requests", ["day", "from_minute"],
+            postgresql_where=sa.text(REMINDER_DUE),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # the new indexes go with their columns
+    op.drop_column("client_requests", "to_minute")
+    op.drop_column("client_requests", "from_minute")
+    op.drop_column("client_requests", "day")
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_client_requests_barber_day_accept", "client_requests",
+            ["barber_id", sa.text("CAST(from_time AS DATE)")],
+            postgresql_where=sa.text("status = 'accept'"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_client_requests_reminder_due", "client_requests",
+            [sa.text("CAST(date AS DATE)"), "from_time"],
+            postgresql_where=sa.text(REMINDER_DUE),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
@@ -0,0 +1,45 @@
+"""client_requests_services.price: the service price at booking
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+
+Schedule totals (app/barber/schedule/totals.py) move by the change in a
+request's price when it is accepted, cancelled or edited. Reading the price
+from barber_services made a cancellation subtract the current price, so a
+price list edit between booking and cancellation left total_income off by the
+difference. Each service line now keeps the price it was booked at.
+
+Existing lines are backfilled with the current barber_services price, which is
+what the totals were last computed from; run
+`python -m app.barber.schedule.totals` afterwards to resettle any drift.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("client_requests_services", sa.Column("price", sa.Integer(), nullable=True))
+    op.execute(
+        """
+        UPDATE client_requests_services AS crs
+        SET price = bs.price
+        FROM barber_services AS bs
+        WHERE bs.id = crs.barber_service_id AND crs.price IS NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("client_requests_services", "price")
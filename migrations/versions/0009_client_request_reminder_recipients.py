@@ -0,0 +1,35 @@
+"""client_requests.client_reminded_at / barber_reminded_at: reminder delivery per recipient
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+
+The upcoming-visit reminder goes to the client and to the barber. A send that
+failed for one of them used to leave reminder_sent_at empty for the request,
+so the next run reminded both again. Each recipient's delivery is now stamped
+on its own; reminder_sent_at is set once both are done and keeps driving the
+partial reminder index.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("client_requests", sa.Column("client_reminded_at", sa.DateTime(), nullable=True))
+    op.add_column("client_requests", sa.Column("barber_reminded_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("client_requests", "barber_reminded_at")
+    op.drop_column("client_requests", "client_reminded_at")
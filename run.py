@@ -5,6 +5,14 @@ import os
 from aiogram.fsm.storage.redis import RedisStorage, DefaultKeyBuilder
 import redis.asyncio as redis
 
+from app.identity import IdentityMiddleware
+from app.notifier import NotificationDispatcher
+from app.webhook import run_webhook
+from app.refdata import refdata
+from app.outbox.sync import outbox_drainer
+from app.metrics import MetricsConnection, instrument, start_metrics_server
+from app.db import async_engine
+
 # Routers
 
 # Basic
@@ -37,31 +45,22 @@ from app.client.client_barber_list import client_barber_list_router
 load_dotenv()
 
 TOKEN = os.getenv('TOKEN')
-if not TOKEN:
-    raise ValueError("Missing bot TOKEN in environment variables.")
 
 REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT = os.getenv('REDIS_PORT', '6379')
 REDIS_DB = os.getenv('REDIS_DB_BOT', '3')
 REDIS_DB_APP = os.getenv('REDIS_DB_APP', '4')
 
+# polling (default, single process) | webhook (see app/webhook.py)
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
 
-async def main():
-    bot = Bot(token=TOKEN)
 
-    # ✅ Aiogram FSM Storage (independent from our redis client)
-    storage = RedisStorage.from_url(
-        f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}",
-        key_builder=DefaultKeyBuilder(with_bot_id=True)  # ensures unique keys
-    )
+def build_dispatcher(storage) -> Dispatcher:
+    """The bot's Dispatcher: identity middleware and every router (also used by benchmarks/update_replay.py)."""
     dp = Dispatcher(storage=storage)
 
-    # ✅ Our shared redis pool for business logic
-    redis_pool = redis.from_url(
-        f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB_APP}",
-        decode_responses=True
-    )
-    bot.redis = redis_pool  # attach for use inside handlers
+    # ✅ Resolve user/client/barber once per update → handlers get `identity`
+    dp.update.outer_middleware(IdentityMiddleware())
 
     # Routers
     dp.include_router(barber_qr_route)
@@ -87,8 +86,53 @@ async def main():
     dp.include_router(client_request_info_router)
     dp.include_router(client_request_history_router)
     dp.include_router(client_barber_list_router)
+    return dp
+
+
+async def main():
+    if not TOKEN:
+        raise ValueError("Missing bot TOKEN in environment variables.")
+    bot = Bot(token=TOKEN)
 
-    await dp.start_polling(bot)
+    # ✅ Aiogram FSM Storage (independent from our redis client)
+    storage = RedisStorage.from_url(
+        f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}",
+        key_builder=DefaultKeyBuilder(with_bot_id=True)  # ensures unique keys
+    )
+    dp = build_dispatcher(storage)
+
+    # ✅ Our shared redis pool for business logic
+    redis_pool = redis.from_url(
+        f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB_APP}",
+        decode_responses=True,
+        connection_class=MetricsConnection,  # counts commands per handler
+    )
+    bot.redis = redis_pool  # attach for use inside handlers
+
+    # ✅ Services / regions / cities held in memory, invalidated via Redis pub/sub
+    await refdata.start(redis_pool)
+
+    # ✅ Rate-limited outbound sends (new-request alerts, accept/deny notices)
+    bot.notifier = NotificationDispatcher(bot)
+
+    # ✅ Platform (Django) sync: outbox rows written by handlers, posted in batches
+    outbox_drainer.start()
+
+    # ✅ Per-handler timings / SQL / Redis / Bot API metrics on METRICS_PORT (/metrics)
+    instrument(dp, bot, async_engine)
+    metrics_runner = await start_metrics_server()
+
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            # polling fallback: a leftover webhook would make getUpdates fail
+            await bot.delete_webhook(drop_pending_updates=False)
+            await dp.start_polling(bot)
+    finally:
+        await outbox_drainer.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+"""
+Fixtures for the handler tests.
+
+The handlers run through the real Dispatcher (benchmarks/update_replay.py) against
+Postgres and Redis, so the suite needs what the replay needs: SQLALCHEMY_DATABASE_URI
+pointing at a migrated scratch database and the bot's Redis (REDIS_HOST / REDIS_PORT /
+REDIS_DB_APP). Tests that need them are skipped when either is unreachable.
+
+Query budgets:
+
+    async def test_something(replay, fx, capture_statements):
+        with capture_statements() as log:
+            await replay.press(tg, "confirm_services")
+        assert_query_budget(log, 4)
+"""
+import os
+
+import pytest
+
+# unplanned lazy loads raise under test (app/db.py); set before anything imports the models
+os.environ.setdefault("DB_STRICT_LOADING", "1")
+
+from app.db import async_engine  # noqa: E402
+from app.query_budget import capture_statements as _capture_statements, watch  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def capture_statements():
+    """`with capture_statements() as log:` collects the SQL the app's engine sends inside the block."""
+    watch(async_engine)
+    return _capture_statements
+
+
+@pytest.fixture
+async def redis():
+    import redis.asyncio as aioredis
+
+    client = aioredis.from_url(
+        f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', '6379')}/"
+        f"{os.getenv('REDIS_DB_APP', '4')}",
+        decode_responses=True,
+    )
+    try:
+        await client.ping()
+    except Exception as e:
+        await client.aclose()
+        pytest.skip(f"no Redis: {e}")
+    yield client
+    await client.aclose()
+
+
+@pytest.fixture
+async def db():
+    try:
+        async with async_engine.connect():
+            pass
+    except Exception as e:
+        pytest.skip(f"no database: {e}")
+    yield async_engine
+    # the engine's pool is bound to this test's event loop
+    await async_engine.dispose()
+
+
+@pytest.fixture
+async def replay(db, redis):
+    from benchmarks.update_replay import build_replay
+    from app.refdata import refdata
+
+    replay = build_replay(redis)
+    await refdata.start(redis)
+    yield replay
+    if refdata._listener is not None:
+        refdata._listener.cancel()
+        refdata._listener = None  # the next test runs on a new event loop
+    await replay.bot.session.close()
+
+
+@pytest.fixture
+async def fx(db, redis):
+    """One barber (three 30-minute services, schedules today .. +6) and one client."""
+    from benchmarks.update_replay import _cleanup, _seed
+
+    fixture = await _seed(1, 1)
+    yield fixture
+    await _cleanup(fixture, redis)
@@ -0,0 +1,41 @@
+"""
+Concurrent bookings of one barber: the no-overlap exclusion constraint lets exactly one commit.
+"""
+import asyncio
+
+import pytest
+
+from app.barber.barber_requests.utils import check_time_conflict
+from app.client.models import ClientRequest
+from app.db import AsyncSessionLocal
+from benchmarks.booking_race import DAY, _attempt
+
+pytestmark = pytest.mark.anyio
+
+N = 10
+
+
+async def _race(barber_id: int, precheck: bool) -> list:
+    gate = asyncio.Event()
+    tasks = [asyncio.create_task(_attempt(barber_id, i, gate, precheck)) for i in range(N)]
+    await asyncio.sleep(0.2)  # every session is checked out and waiting
+    gate.set()
+    return await asyncio.gather(*tasks)
+
+
+async def test_one_of_concurrent_bookings_commits(fx):
+    results = await _race(fx.barbers[0]["id"], precheck=False)
+    assert results.count("booked") == 1
+    assert results.count("conflict") == N - 1  # the IntegrityError maps to "slot taken", nothing else leaks
+
+
+async def test_precheck_sees_pending_bookings(fx):
+    barber_id = fx.barbers[0]["id"]
+    async with AsyncSessionLocal() as session:
+        start = DAY.replace(hour=12)
+        session.add(ClientRequest(barber_id=barber_id, date=start, from_time=start,
+                                  to_time=start.replace(hour=13), status="pending"))
+        await session.commit()
+        # the constraint covers pending bookings, so accepting over one must be refused up front
+        assert await check_time_conflict(session, barber_id, start.replace(minute=30), start.replace(hour=14))
+        assert not await check_time_conflict(session, barber_id, start.replace(hour=13), start.replace(hour=14))
@@ -0,0 +1,21 @@
+"""
+The hot-path queries keep their indexes (migrations 0006, 0007): no sequential scan of a hot table.
+
+Seeds benchmarks/explain_indexes.py's synthetic data in a throw-away schema of the
+test database, so it takes a while; a dropped or unusable index fails here.
+"""
+import pytest
+
+from benchmarks.explain_indexes import REQUESTS, check_plans, explain_schema
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_hot_queries_use_indexes(db):
+    async with explain_schema(REQUESTS) as engine:
+        checks = await check_plans(engine)
+
+    assert checks
+    scans = [f"{c.probe}: seq scan on {', '.join(sorted(set(c.seq_scans)))}\n{c.statement}"
+             for c in checks if c.seq_scans]
+    assert not scans, "\n\n".join(scans)
@@ -0,0 +1,35 @@
+"""
+Reverse-geocode cache (app/client/utils.py): only real "not found" answers are negative-cached.
+"""
+import pytest
+
+from app.client import utils
+from app.client.utils import _geo_lru, _geocode_key, geohash_encode, get_region_city_multilang
+
+pytestmark = pytest.mark.anyio
+
+EMPTY = {"country": None, "region": None, "city": None}
+
+
+def _providers(monkeypatch, answer: dict) -> None:
+    async def provider(lat, lon, lang):
+        return dict(answer)
+
+    monkeypatch.setattr(utils, "get_location_yandex", provider)
+    monkeypatch.setattr(utils, "get_location_nominatim", provider)
+
+
+async def test_provider_failure_is_not_cached(monkeypatch):
+    lat, lon = 41.3111, 69.2797
+    _providers(monkeypatch, {**EMPTY, "failed": True})
+
+    assert await get_region_city_multilang(None, lat, lon) == (None, None, None)
+    assert _geo_lru.get(_geocode_key(geohash_encode(lat, lon))) is None
+
+
+async def test_nothing_found_is_negative_cached(monkeypatch):
+    lat, lon = 39.6542, 66.9597
+    _providers(monkeypatch, EMPTY)
+
+    assert await get_region_city_multilang(None, lat, lon) == (None, None, None)
+    assert _geo_lru.get(_geocode_key(geohash_encode(lat, lon))) == {"miss": 1}
@@ -0,0 +1,53 @@
+"""
+load_my_requests_page is one statement per page, including a page past the end.
+"""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from app.client.models import ClientRequest
+from app.client.my_requests import load_my_requests_page
+from app.db import AsyncSessionLocal
+from app.query_budget import assert_query_budget
+
+pytestmark = pytest.mark.anyio
+
+
+async def _pending_requests(fx, n: int) -> None:
+    barber, client = fx.barbers[0], fx.clients[0]
+    tomorrow = date.today() + timedelta(days=1)
+    async with AsyncSessionLocal() as session:
+        for i in range(n):
+            start = datetime.combine(tomorrow, time(9 + i))
+            session.add(ClientRequest(
+                client_id=client["id"], barber_id=barber["id"], barber_schedule_id=barber["schedules"][tomorrow],
+                date=start, from_time=start, to_time=start + timedelta(minutes=30),
+            ))
+        await session.commit()
+
+
+async def test_page_is_one_statement(fx, capture_statements):
+    await _pending_requests(fx, 3)
+    async with AsyncSessionLocal() as session:
+        with capture_statements() as log:
+            data = await load_my_requests_page(session, fx.clients[0]["id"], page=2, page_size=2)
+    assert_query_budget(log, 1)
+    assert (data.page, data.pages, data.total, len(data.rows)) == (2, 2, 3, 1)
+
+
+async def test_page_past_the_end_falls_back_to_first_in_the_same_statement(fx, capture_statements):
+    await _pending_requests(fx, 3)
+    async with AsyncSessionLocal() as session:
+        with capture_statements() as log:
+            data = await load_my_requests_page(session, fx.clients[0]["id"], page=5, page_size=2)
+    assert_query_budget(log, 1)
+    assert (data.page, data.pages, data.total, len(data.rows)) == (1, 2, 3, 2)
+    assert [r.from_time.hour for r in data.rows] == [11, 10]  # newest first
+
+
+async def test_no_requests(fx, capture_statements):
+    async with AsyncSessionLocal() as session:
+        with capture_statements() as log:
+            data = await load_my_requests_page(session, fx.clients[0]["id"], page=3)
+    assert_query_budget(log, 1)
+    assert (data.page, data.pages, data.total, data.rows) == (1, 1, 0, [])
@@ -0,0 +1,140 @@
+"""
+Every @query_budget handler, driven through the Dispatcher, stays within its budget.
+"""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.barber import barber_request_self
+from app.barber.models import BarberServiceScore
+from app.barber.schedule.callback_data import DayBySidCB, SchedPickSlotCBForBarber
+from app.client import barber_profile, client_request, client_request_history, client_request_info
+from app.client.callback_data import MyRequestsPageCB, SchedPickSlotCBClient
+from app.client.models import ClientRequest, ClientRequestService
+from app.db import AsyncSessionLocal
+from app.query_budget import BudgetReport, assert_query_budget, budget_of
+
+pytestmark = pytest.mark.anyio
+
+TOMORROW = date.today() + timedelta(days=1)
+SEEDED = 5  # requests per list, so a per-row query shows up as a repeated statement
+
+
+async def _within_budget(replay, capture_statements, handler, step, repeats: bool = True) -> None:
+    """`repeats=False`: no statement shape may be sent twice either (an N+1 over the seeded rows)."""
+    with capture_statements() as log:
+        await step
+    assert replay.samples[-1].handler == f"{handler.__module__.rsplit('.', 1)[-1]}.{handler.__name__}"
+    name = f"{handler.__module__}.{handler.__name__}"
+    assert_query_budget(log, budget_of(handler), name)
+    if not repeats:
+        report = BudgetReport(name, budget_of(handler), list(log))
+        assert not report.repeated(), str(report)
+
+
+async def _seed_requests(client: dict, barber: dict, status: str, n: int = SEEDED) -> None:
+    """n requests the day after tomorrow, two service lines each (scored when accepted)."""
+    day = TOMORROW + timedelta(days=1)  # clear of the slots the replayed bookings take
+    async with AsyncSessionLocal() as session:
+        for i in range(n):
+            start = datetime.combine(day, time(9 + i))
+            cr = ClientRequest(
+                client_id=client["id"], barber_id=barber["id"], barber_schedule_id=barber["schedules"][day],
+                date=start, from_time=start, to_time=start + timedelta(minutes=60), status=status,
+            )
+            session.add(cr)
+            await session.flush()
+            for bs_id in barber["services"][:2]:
+                session.add(ClientRequestService(client_request_id=cr.id, barber_service_id=bs_id,
+                                                 duration=30, price=50_000, status=True))
+                if status == "accept":
+                    session.add(BarberServiceScore(barber_service_id=bs_id, client_id=client["id"], score=5,
+                                                   client_request_id=cr.id, barber_id=barber["id"]))
+        await session.commit()
+
+
+async def _requests_of(barber_id: int) -> list:
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(
+            select(ClientRequest).where(ClientRequest.barber_id == barber_id)
+        )).scalars().all()
+
+
+async def _client_picks_services(replay, client: dict, barber: dict) -> None:
+    tg = client["tg"]
+    await replay.send(tg, "✂️ Barberlar")
+    await replay.press(tg, f"select_barber:{barber['id']}")
+    await replay.send(tg, "🗓️ Sartarosh jadvali")
+    await replay.press(tg, f"barber_day:{barber['schedules'][TOMORROW]}")
+    await replay.press(tg, SchedPickSlotCBClient(day=TOMORROW.isoformat(), hm="1000").pack())
+    for bs_id in barber["services"][:2]:
+        await replay.press(tg, f"choose_service_client:{bs_id}")
+
+
+async def _client_books(replay, client: dict, barber: dict) -> None:
+    await _client_picks_services(replay, client, barber)
+    await replay.press(client["tg"], "confirm_services")
+
+
+async def test_client_confirm_services(replay, fx, capture_statements):
+    client, barber = fx.clients[0], fx.barbers[0]
+    await _client_picks_services(replay, client, barber)
+
+    await _within_budget(replay, capture_statements, client_request.confirm_services_callback,
+                         replay.press(client["tg"], "confirm_services"))
+
+    [booked] = await _requests_of(barber["id"])
+    assert booked.client_id == client["id"] and booked.status == "pending"
+
+
+async def test_barber_confirm_services(replay, fx, capture_statements):
+    barber = fx.barbers[0]
+    tg = barber["tg"]
+    await replay.send(tg, "📅 Jadvalim")
+    await replay.press(tg, DayBySidCB(sid=barber["schedules"][TOMORROW]).pack())
+    await replay.press(tg, SchedPickSlotCBForBarber(day=TOMORROW.isoformat(), hm="1100").pack())
+    await replay.press(tg, f"choose_service_barber:{barber['services'][0]}")
+
+    await _within_budget(replay, capture_statements, barber_request_self.confirm_services_callback,
+                         replay.press(tg, "barber_confirm_services"))
+
+    [booked] = await _requests_of(barber["id"])
+    assert booked.status == "accept"
+
+
+async def test_my_requests(replay, fx, capture_statements):
+    client, barber = fx.clients[0], fx.barbers[0]
+    await _client_books(replay, client, barber)
+    await _seed_requests(client, barber, "pending")
+
+    await _within_budget(replay, capture_statements, client_request_info.my_requests,
+                         replay.send(client["tg"], "📋 So‘rovlarim"), repeats=False)
+
+
+async def test_my_requests_page(replay, fx, capture_statements):
+    client, barber = fx.clients[0], fx.barbers[0]
+    await _client_books(replay, client, barber)
+    await _seed_requests(client, barber, "pending")
+
+    await _within_budget(replay, capture_statements, client_request_info.my_requests_page,
+                         replay.press(client["tg"], MyRequestsPageCB(page=1).pack()), repeats=False)
+
+
+async def test_client_request_history(replay, fx, capture_statements):
+    client, barber = fx.clients[0], fx.barbers[0]
+    await _client_books(replay, client, barber)
+    await _seed_requests(client, barber, "accept")
+
+    await _within_budget(replay, capture_statements, client_request_history.client_request_history,
+                         replay.send(client["tg"], "📊 So‘rovlar natijasi"), repeats=False)
+
+
+async def test_barber_profile_info(replay, fx, capture_statements):
+    client, barber = fx.clients[0], fx.barbers[0]
+    await _seed_requests(client, barber, "accept")
+    await replay.send(client["tg"], "✂️ Barberlar")
+    await replay.press(client["tg"], f"select_barber:{barber['id']}")
+
+    await _within_budget(replay, capture_statements, barber_profile.barber_profile_info,
+                         replay.send(client["tg"], "✂️ Sartarosh haqida"), repeats=False)
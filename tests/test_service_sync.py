@@ -0,0 +1,48 @@
+"""
+Platform catalog sync (app/service/tasks.py) against a scratch database.
+"""
+import pytest
+from sqlalchemy import select, update
+
+from app.db import AsyncSessionLocal
+from app.service.models import Service
+from app.service.tasks import SERVICE_FIELDS, SyncReport, _sync_catalog
+
+pytestmark = pytest.mark.anyio
+
+PLATFORM_BASE = 7_700_000_000  # platform ids of the fixture services (telegram id range of the replay fixture)
+
+
+def _payload(row, **changes) -> dict:
+    return {"id": row.platform_id, **{f: getattr(row, f) for f in SERVICE_FIELDS}, "images": [], **changes}
+
+
+async def test_removed_service_still_offered_is_disabled(fx):
+    kept, *offered = fx.service_ids  # the fixture barber offers all three
+    async with AsyncSessionLocal() as session:
+        if (await session.execute(select(Service.id).where(Service.platform_id.is_not(None)).limit(1))).first():
+            pytest.skip("the scratch database holds a platform catalog")
+        for sid in fx.service_ids:
+            await session.execute(update(Service).where(Service.id == sid).values(platform_id=PLATFORM_BASE + sid))
+        orphan = Service(name_uz="Replay orphan", platform_id=PLATFORM_BASE)
+        session.add(orphan)
+        await session.commit()
+        kept_row = (await session.execute(select(Service).where(Service.id == kept))).scalar_one()
+
+        report = SyncReport()
+        try:
+            # the platform dropped two services a barber still offers and one nobody offers
+            await _sync_catalog(session, [_payload(kept_row, name_uz="Replay renamed")], report)
+        finally:
+            await session.rollback()
+            await session.execute(update(Service).where(Service.id.in_(fx.service_ids)).values(platform_id=None))
+            await session.commit()
+
+        rows = {r.id: r for r in (await session.execute(
+            select(Service.id, Service.name_uz, Service.disabled).where(Service.id.in_([*fx.service_ids, orphan.id]))
+        )).all()}
+
+    assert (report.services_changed, report.services_disabled, report.services_deleted) == (1, 2, 1)
+    assert rows[kept].name_uz == "Replay renamed"
+    assert all(rows[sid].disabled for sid in offered)
+    assert orphan.id not in rows